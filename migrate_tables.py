@@ -0,0 +1,90 @@
+import sqlalchemy as sa
+
+import nudge.core.context
+
+
+# brings a database created before the current schema up to date without dropping any data, and is safe to run
+# again. counts are taken from a snapshot and duplicate elements are removed, so run it while the web app and
+# the workers are stopped
+STATEMENTS = [
+    # shared subscription index version
+    """
+    CREATE TABLE IF NOT EXISTS subscription_version (
+        id INTEGER PRIMARY KEY,
+        version INTEGER NOT NULL,
+        created TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+        updated TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+        data JSONB
+    )
+    """,
+    'INSERT INTO subscription_version (id, version) VALUES (1, 0) ON CONFLICT (id) DO NOTHING',
+
+    # available element counters
+    'ALTER TABLE subscription ADD COLUMN IF NOT EXISTS available_bytes BIGINT NOT NULL DEFAULT 0',
+    'ALTER TABLE subscription ADD COLUMN IF NOT EXISTS available_elements INTEGER NOT NULL DEFAULT 0',
+    'ALTER TABLE subscription ADD COLUMN IF NOT EXISTS batch_due TIMESTAMP WITH TIME ZONE',
+
+    # an object is added to a subscription once, so redelivered copies are removed before the constraint is
+    # added. the copy that was batched first is kept, and later copies are removed from their batches
+    """
+    DELETE FROM element
+    WHERE id IN (
+        SELECT id FROM (
+            SELECT id, ROW_NUMBER() OVER (
+                PARTITION BY sub_id, bucket, key, s3_created
+                ORDER BY (state = 'AVAILABLE'), created, id
+            ) AS copy
+            FROM element
+        ) AS copies
+        WHERE copy > 1
+    )
+    """,
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'uq_element_sub_object') THEN
+            ALTER TABLE element ADD CONSTRAINT uq_element_sub_object UNIQUE (sub_id, bucket, key, s3_created);
+        END IF;
+    END
+    $$
+    """,
+
+    # indexes
+    'CREATE INDEX IF NOT EXISTS ix_element_sub_state_created ON element (sub_id, state, s3_created, id)',
+    'CREATE INDEX IF NOT EXISTS ix_element_batch_created ON element (batch_id, s3_created, id)',
+    'CREATE INDEX IF NOT EXISTS ix_batch_sub_created ON batch (sub_id, created, id)',
+    'CREATE INDEX IF NOT EXISTS ix_batch_sub_state_created ON batch (sub_id, state, created)',
+    'CREATE INDEX IF NOT EXISTS ix_subscription_bucket_state_prefix ON subscription (bucket, state, prefix)',
+    'CREATE INDEX IF NOT EXISTS ix_subscription_state ON subscription (state)',
+    'CREATE INDEX IF NOT EXISTS ix_subscription_batch_due ON subscription (batch_due) '
+    'WHERE batch_due IS NOT NULL',
+
+    # counters from the remaining available elements
+    """
+    UPDATE subscription SET
+        available_bytes = COALESCE(available.num_bytes, 0),
+        available_elements = COALESCE(available.num_elements, 0)
+    FROM subscription AS s
+    LEFT JOIN (
+        SELECT sub_id, SUM(size) AS num_bytes, COUNT(*) AS num_elements
+        FROM element
+        WHERE state = 'AVAILABLE'
+        GROUP BY sub_id
+    ) AS available ON available.sub_id = s.id
+    WHERE subscription.id = s.id
+    """,
+]
+
+
+if __name__ == '__main__':
+    ctx = nudge.core.context.NudgeCoreContext()
+
+    with ctx.app.flask_app.app_context():
+        for statement in STATEMENTS:
+            ctx.db.execute(sa.text(statement))
+
+        # the max age clock of subscriptions with available elements starts now
+        for sub in ctx.sub_srv.get_live_subscriptions():
+            ctx.sub_srv.schedule(sub)
+
+        ctx.db.commit()
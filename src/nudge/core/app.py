@@ -15,9 +15,15 @@ class App(rv.app.App):
             self._ctx.create_batch,
             self._ctx.get_batch_elems,
             self._ctx.get_sub_batches,
+            self._ctx.get_sub_elems,
             self._ctx.get_subscription,
             self._ctx.handle_object_created,
+            self._ctx.handle_objects_created,
+            self._ctx.list_subscriptions,
+            self._ctx.stream_batch_elems,
+            self._ctx.stream_sub_elems,
             self._ctx.subscribe,
+            self._ctx.sweep,
             self._ctx.unsubscribe,
         ]
 
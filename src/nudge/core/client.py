@@ -42,6 +42,58 @@ class NudgeClient:
         }
         return self._post_json('HandleObjectCreated', data)
 
+    def handle_objects_created(self, Objects):
+        """
+
+        Args:
+            Objects (list): Dicts with the same keys as the arguments of `handle_object_created`.
+        """
+        data = {
+            'Objects': Objects,
+        }
+        return self._post_json('HandleObjectsCreated', data)
+
+    def list_subscriptions(self):
+        return self._post_json('ListSubscriptions', {})
+
+    def sweep(self, Limit=100):
+        data = {
+            'Limit': Limit,
+        }
+        return self._post_json('Sweep', data)
+
+    def stream_batch_elements(self, SubscriptionId, BatchId, ContinuationToken=None):
+        """Iterate over the elements of a batch as they are received.
+
+        The ContinuationToken of the last element received resumes an interrupted stream.
+        """
+        data = {
+            'SubscriptionId': SubscriptionId,
+            'BatchId': BatchId,
+            'ContinuationToken': ContinuationToken,
+        }
+        return self._post_ndjson('StreamBatchElements', data)
+
+    def _post_ndjson(self, endpoint, data):
+        r = requests.post(self._base_url.format(endpoint=endpoint), json=data, stream=True)
+
+        if r.status_code != 200:
+            raise Exception('\n'.join([
+                f'Nudge call {endpoint} failed with code {r.status_code}',
+                json.dumps(r.json(), sort_keys=True, indent=4, separators=(',', ': ')),
+            ]))
+
+        for line in r.iter_lines():
+            if not line:
+                continue
+
+            record = json.loads(line.decode('utf-8'))
+            # errors after the response has started are sent as the last record
+            if 'Traceback' in record:
+                raise Exception('\n'.join([f'Nudge call {endpoint} failed while streaming', *record['Traceback']]))
+
+            yield record
+
     def _post_json(self, endpoint, data):
         r = requests.post(self._base_url.format(endpoint=endpoint), json=data)
 
@@ -7,6 +7,7 @@ import revolio.inject
 import revolio.config
 import revolio.db
 import revolio.logging
+import revolio.worker
 
 import nudge
 import nudge.core.app
@@ -23,9 +24,12 @@ class NudgeConfigService(rv.config.ConfigService):
 
 class NudgeCoreContext:
 
-    def __init__(self, *, flask_config=None):
-        rv.logging.init_flask(nudge)
+    def __init__(self, *, flask_config=None, def_queue=None, init_logging=True):
+        if init_logging:
+            rv.logging.init_flask(nudge)
+
         self._flask_config = flask_config or {}
+        self._def_queue = def_queue
 
     @cached_property
     def flask_config(self):
@@ -48,6 +52,13 @@ class NudgeCoreContext:
     def def_queue_url(self):
         return self.config['Worker']['Deferral']['Env']['QueueUrl']
 
+    @cached_property
+    def def_queue(self):
+        if self._def_queue is not None:
+            return self._def_queue
+
+        return rv.worker.SqsBackend(self.sqs, self.def_queue_url)
+
     entity = nudge.core.entity.Entity
 
     # inject
@@ -64,6 +75,7 @@ class NudgeCoreContext:
     # entities
 
     sub_srv = rv.inject.Inject(nudge.core.entity.SubscriptionService)
+    sub_index = rv.inject.Inject(nudge.core.entity.SubscriptionIndex)
     elem_srv = rv.inject.Inject(nudge.core.entity.ElementService)
     batch_srv = rv.inject.Inject(nudge.core.entity.BatchService)
 
@@ -75,9 +87,15 @@ class NudgeCoreContext:
     create_batch = rv.inject.Inject(nudge.core.function.CreateBatch)
     get_batch_elems = rv.inject.Inject(nudge.core.function.GetBatchElements)
     get_sub_batches = rv.inject.Inject(nudge.core.function.GetSubscriptionBatches)
+    get_sub_elems = rv.inject.Inject(nudge.core.function.GetSubscriptionElements)
     get_subscription = rv.inject.Inject(nudge.core.function.GetSubscription)
     handle_object_created = rv.inject.Inject(nudge.core.function.HandleObjectCreated)
+    handle_objects_created = rv.inject.Inject(nudge.core.function.HandleObjectsCreated)
+    list_subscriptions = rv.inject.Inject(nudge.core.function.ListSubscriptions)
+    stream_batch_elems = rv.inject.Inject(nudge.core.function.StreamBatchElements)
+    stream_sub_elems = rv.inject.Inject(nudge.core.function.StreamSubscriptionElements)
     subscribe = rv.inject.Inject(nudge.core.function.Subscribe)
+    sweep = rv.inject.Inject(nudge.core.function.Sweep)
     unsubscribe = rv.inject.Inject(nudge.core.function.Unsubscribe)
 
     # aws
@@ -10,10 +10,14 @@ _log = logging.getLogger(__name__)
 
 class DeferralSrv:
 
-    def __init__(self, sqs, def_queue_url):
+    def __init__(self, def_queue):
+        """
+
+        Args:
+            def_queue (revolio.worker.backend.QueueBackend): The queue consumed by the deferral worker.
+        """
         super().__init__()
-        self._sqs = sqs
-        self._queue_url = def_queue_url
+        self._queue = def_queue
 
     def send_call(self, func, *args, **kwargs):
         url = func.internal_url
@@ -25,10 +29,7 @@ class DeferralSrv:
             rv.util.str.log_dumps(body),
         ]))
 
-        self._sqs.send_message(
-            QueueUrl=self._queue_url,
-            MessageBody=json.dumps({
-                'Url': url,
-                'Body': body,
-            }),
-        )
+        self._queue.send(json.dumps({
+            'Url': url,
+            'Body': body,
+        }))
@@ -19,5 +19,7 @@ from nudge.core.entity.batch import (
 
 from nudge.core.entity.subscription import (
     Subscription,
+    SubscriptionIndex,
     SubscriptionService,
+    SubscriptionVersion,
 )
@@ -18,6 +18,12 @@ class BatchState(enum.Enum):
 
 class Batch(Entity):
     __tablename__ = 'batch'
+    __table_args__ = (
+        # batches are listed in (created, id) order
+        sa.Index('ix_batch_sub_created', 'sub_id', 'created', 'id'),
+        # the oldest unconsumed batch is the active batch
+        sa.Index('ix_batch_sub_state_created', 'sub_id', 'state', 'created'),
+    )
 
     id = sa.Column(
         sa.String,
@@ -72,28 +78,39 @@ class BatchService:
             .query(Batch) \
             .get(batch_id)
 
-    def get_subscription_batches(self, sub_id, *, prev_id=None, limit=None, state=None):
+    def get_subscription_batches(self, sub_id, *, prev_id=None, after=None, limit=None, state=None):
+        """Get batches for a subscription in (created, id) order.
+
+        Args:
+            prev_id (str): Only return batches following the batch with this id.
+            after (tuple): Only return batches following this (created, id).
+        """
         _log.debug('Getting batches for subscription {}'.format(sub_id))
         query = self._db \
             .query(Batch) \
             .filter(Batch.sub_id == sub_id) \
-            .order_by(Batch.created) \
-            .limit(limit)
+            .order_by(Batch.created.asc(), Batch.id.asc())
 
-        # only return batches created after the batch with prev_id
         if prev_id is not None:
-            start_point = self._db \
-                .query(Batch.created) \
+            after = self._db \
+                .query(Batch.created, Batch.id) \
                 .filter(Batch.id == prev_id) \
-                .subquery('start_point')
+                .one_or_none()
+
+            if after is None:
+                _log.debug(f'Found no batch {prev_id} for subscription {sub_id} to follow')
+                return []
 
-            query = query.filter(Batch.created > start_point)
+        # ids break ties between batches created at the same time
+        if after is not None:
+            query = query.filter(sa.tuple_(Batch.created, Batch.id) > sa.tuple_(*after))
 
         if state is not None:
             assert isinstance(state, Batch.State)
             query = query.filter(Batch.state == state.value)
 
-        batches = list(query.all())
+        # filters cannot be added after a limit
+        batches = list(query.limit(limit).all())
         _log.debug('Found batches for subscription {s} following batch {b}: {batches}'.format(
             s=sub_id,
             b=prev_id,
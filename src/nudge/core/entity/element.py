@@ -19,6 +19,13 @@ class ElementState(enum.Enum):
 
 class Element(Entity):
     __tablename__ = 'element'
+    __table_args__ = (
+        # an object is added to a subscription once, however many times it is received
+        sa.UniqueConstraint('sub_id', 'bucket', 'key', 's3_created', name='uq_element_sub_object'),
+        # elements are listed and batched in (s3_created, id) order
+        sa.Index('ix_element_sub_state_created', 'sub_id', 'state', 's3_created', 'id'),
+        sa.Index('ix_element_batch_created', 'batch_id', 's3_created', 'id'),
+    )
 
     id = sa.Column(
         sa.String,
@@ -101,36 +108,72 @@ class ElementService:
         _log.debug(f'Found batchable elements for subscription {sub_id}: {elems}')
         return elems
 
-    def get_sub_elems(self, sub_id, state, *, order_by=None, limit=None, offset=0):
+    # columns read when streaming elements, which skips creating entities
+    STREAMED_COLUMNS = [Element.id, Element.bucket, Element.key, Element.size, Element.s3_created]
+
+    def get_sub_elems(self, sub_id, state, *, order_by=None, limit=None, offset=0, after=None):
         """Get elements for a subscription.
 
+        Elements are ordered by s3_created and id unless `order_by` is given. Pages can be requested with
+        `after` the last element of the previous page, which seeks the index rather than skipping rows.
+
         :type sub_id: str
         :type state: nudge.core.entity.element.ElementState
         :type order_by:
         :type limit: int
         :type offset: int
+        :type after: tuple (s3_created, id) of the element to start after
         """
-        elems = self._db \
-            .query(Element) \
-            .filter(Element.sub_id == sub_id) \
-            .filter(Element.state == state.value) \
-            .order_by(order_by) \
-            .limit(limit) \
-            .offset(offset) \
-            .all()
-
+        query = self._sub_elems_query(self._db.query(Element), sub_id, state)
+        elems = self._page(query, order_by=order_by, limit=limit, offset=offset, after=after).all()
         return list(elems)
 
-    def get_batch_elems(self, sub_id, batch_id, *, offset=0, limit=None):
-        elems = self._db \
-            .query(Element) \
-            .filter(Element.sub_id == sub_id) \
-            .filter(Element.state == Element.State.BATCHED.value) \
-            .filter(Element.batch_id == batch_id) \
-            .limit(limit) \
-            .offset(offset) \
-            .all()
+    def stream_sub_elems(self, sub_id, state, *, after=None, chunk_size=1000):
+        """Iterate over rows of `STREAMED_COLUMNS` for a subscription's elements in (s3_created, id) order.
 
-        elems = list(elems)
+        Rows are fetched from a server-side cursor `chunk_size` at a time, so they are never all in memory.
+        """
+        query = self._sub_elems_query(self._db.query(*ElementService.STREAMED_COLUMNS), sub_id, state)
+        return self._page(query, after=after).yield_per(chunk_size)
+
+    def get_batch_elems(self, sub_id, batch_id, *, offset=0, limit=None, after=None):
+        query = self._batch_elems_query(self._db.query(Element), sub_id, batch_id)
+        elems = list(self._page(query, limit=limit, offset=offset, after=after).all())
         _log.debug(f'Found elements for batch {batch_id}: {elems}')
         return elems
+
+    def stream_batch_elems(self, sub_id, batch_id, *, after=None, chunk_size=1000):
+        """Iterate over rows of `STREAMED_COLUMNS` for a batch's elements, like `stream_sub_elems`."""
+        query = self._batch_elems_query(self._db.query(*ElementService.STREAMED_COLUMNS), sub_id, batch_id)
+        return self._page(query, after=after).yield_per(chunk_size)
+
+    @staticmethod
+    def _sub_elems_query(query, sub_id, state):
+        return query \
+            .filter(Element.sub_id == sub_id) \
+            .filter(Element.state == state.value)
+
+    @staticmethod
+    def _batch_elems_query(query, sub_id, batch_id):
+        return query \
+            .filter(Element.sub_id == sub_id) \
+            .filter(Element.state == Element.State.BATCHED.value) \
+            .filter(Element.batch_id == batch_id)
+
+    @staticmethod
+    def _page(query, *, order_by=None, limit=None, offset=0, after=None):
+        if after is not None:
+            query = query.filter(sa.tuple_(Element.s3_created, Element.id) > sa.tuple_(*after))
+
+        if order_by is None:
+            order_by = [Element.s3_created.asc(), Element.id.asc()]
+        elif not isinstance(order_by, (list, tuple)):
+            order_by = [order_by]
+
+        query = query.order_by(*order_by)
+        if limit is not None:
+            query = query.limit(limit)
+        if offset:
+            query = query.offset(offset)
+
+        return query
@@ -1,2 +1,3 @@
 from nudge.core.entity.subscription.subscription import Subscription
+from nudge.core.entity.subscription.index import SubscriptionIndex, SubscriptionVersion
 from nudge.core.entity.subscription.service import SubscriptionService
@@ -0,0 +1,185 @@
+import logging
+import threading
+
+import sqlalchemy as sa
+import sqlalchemy.dialects.postgresql
+
+import revolio as rv
+import revolio.util.regex
+
+from nudge.core.entity import Entity
+from nudge.core.entity.subscription.subscription import Subscription
+
+
+_log = logging.getLogger(__name__)
+
+
+class SubscriptionVersion(Entity):
+    """A counter incremented whenever a subscription changes, shared by every process."""
+    __tablename__ = 'subscription_version'
+
+    # single row table
+    ROW_ID = 1
+
+    id = sa.Column(
+        sa.Integer,
+        primary_key=True,
+    )
+
+    version = sa.Column(
+        sa.Integer,
+        nullable=False,
+    )
+
+    def __repr__(self):
+        return super().__repr__(version=self.version)
+
+
+class _Node:
+    __slots__ = ['children', 'subs', '_matcher']
+
+    def __init__(self):
+        self.children = {}
+        # regexes by subscription id, or None if a subscription has no regex
+        self.subs = {}
+        self._matcher = None
+
+    def match(self, remainder):
+        """Get the ids of this node's subscriptions whose regex matches the rest of a key."""
+        if self._matcher is None:
+            self._matcher = rv.util.regex.CombinedRegex(self.subs)
+
+        return self._matcher.match(remainder)
+
+    def changed(self):
+        self._matcher = None
+
+
+class SubscriptionIndex:
+    """Per-process index of active subscriptions by bucket and prefix.
+
+    Each bucket has a trie over subscription prefixes, so finding the subscriptions whose prefix starts a key
+    takes a single walk down the key. The index is tagged with the subscription version it reflects and is
+    reloaded whenever the version in the database differs, which keeps separate processes consistent.
+    Changes committed by this process are applied in place when no other process changed subscriptions first.
+    """
+
+    def __init__(self, db):
+        super().__init__()
+        self._db = db
+        self._lock = threading.Lock()
+        self._tries = {}
+        # (bucket, prefix) by subscription id
+        self._locations = {}
+        self._version = None
+
+    def find_candidates(self, bucket, key):
+        """Get the ids of active subscriptions whose bucket, prefix and regex match an object."""
+        self._ensure_current()
+
+        with self._lock:
+            node = self._tries.get(bucket)
+            sub_ids = []
+            for i in range(len(key) + 1):
+                if node is None:
+                    break
+
+                if node.subs:
+                    sub_ids.extend(node.match(key[i:]))
+
+                node = node.children.get(key[i]) if (i < len(key)) else None
+
+            return sub_ids
+
+    def notify_changed(self, sub):
+        """Record a change to a subscription in the current transaction.
+
+        The change is applied to this index once the transaction commits. Other processes reload their
+        index when they next see the new version.
+        """
+        version = self._increment_version()
+        sub_id = sub.id
+        location = (sub.bucket, sub.prefix, sub.regex) if (sub.state is Subscription.State.ACTIVE) else None
+
+        self._db.after_commit(lambda: self._apply_change(version, sub_id, location))
+        # the index may have been reloaded from this transaction's uncommitted changes
+        self._db.after_rollback(self._invalidate)
+
+    def _apply_change(self, version, sub_id, location):
+        with self._lock:
+            if self._version != version - 1:
+                # another process changed subscriptions first
+                self._version = None
+                return
+
+            self._remove(sub_id)
+            if location is not None:
+                self._add(sub_id, *location)
+
+            self._version = version
+
+    def _invalidate(self):
+        with self._lock:
+            self._version = None
+
+    def _ensure_current(self):
+        version = self._get_version()
+        if version == self._version:
+            return
+
+        _log.info(f'Reloading subscription index at version {version}')
+        subs = self._db \
+            .query(Subscription.id, Subscription.bucket, Subscription.prefix, Subscription.regex) \
+            .filter(Subscription.state == Subscription.State.ACTIVE.value) \
+            .all()
+
+        with self._lock:
+            self._tries = {}
+            self._locations = {}
+            for sub_id, bucket, prefix, regex in subs:
+                self._add(sub_id, bucket, prefix, regex)
+
+            self._version = version
+
+    def _get_version(self):
+        version = self._db \
+            .query(SubscriptionVersion.version) \
+            .filter(SubscriptionVersion.id == SubscriptionVersion.ROW_ID) \
+            .scalar()
+
+        return version or 0
+
+    def _increment_version(self):
+        table = SubscriptionVersion.__table__
+        statement = sa.dialects.postgresql.insert(table) \
+            .values(id=SubscriptionVersion.ROW_ID, version=1) \
+            .on_conflict_do_update(
+                index_elements=[table.c.id],
+                set_={'version': table.c.version + 1},
+            ) \
+            .returning(table.c.version)
+
+        return self._db.execute(statement).scalar()
+
+    def _add(self, sub_id, bucket, prefix, regex):
+        prefix = prefix or ''
+        node = self._tries.setdefault(bucket, _Node())
+        for char in prefix:
+            node = node.children.setdefault(char, _Node())
+
+        # newly created subscriptions hold the pattern string rather than a compiled regex
+        node.subs[sub_id] = rv.util.regex.compile(regex) if (regex is not None) else None
+        node.changed()
+        self._locations[sub_id] = (bucket, prefix)
+
+    def _remove(self, sub_id):
+        if sub_id not in self._locations:
+            return
+
+        bucket, prefix = self._locations.pop(sub_id)
+        node = self._tries[bucket]
+        for char in prefix:
+            node = node.children[char]
+
+        del node.subs[sub_id]
+        node.changed()
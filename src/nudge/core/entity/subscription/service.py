@@ -1,8 +1,10 @@
+import datetime as dt
 import json
 import logging
 import uuid
 
 import sqlalchemy as sa
+import sqlalchemy.dialects.postgresql
 
 from nudge.core.entity.batch import Batch
 from nudge.core.entity.element import Element
@@ -14,37 +16,65 @@ _log = logging.getLogger(__name__)
 
 class SubscriptionService:
 
-    def __init__(self, ctx, db, elem_srv, ping_srv):
+    # where candidate subscriptions for an object are found, set by the Subscriptions.Matching config
+    INDEX_MATCHING = 'Index'
+    QUERY_MATCHING = 'Query'
+
+    def __init__(self, ctx, db, elem_srv, ping_srv, sub_index, config):
         super(SubscriptionService, self).__init__()
         self._ctx = ctx
         self._db = db
         self._elem_srv = elem_srv
         self._ping_srv = ping_srv
+        self._sub_index = sub_index
+        self._matching = config.get('Subscriptions', {}).get('Matching', SubscriptionService.INDEX_MATCHING)
 
     @staticmethod
     def matches(sub, bucket, key):
-        return all([
-            bucket == sub.bucket,
-            key.startswith(sub.prefix),
-            (sub.regex is None) or sub.regex.match(key[len(sub.prefix):]),
-        ])
+        prefix = sub.prefix or ''
+        return (bucket == sub.bucket) \
+            and key.startswith(prefix) \
+            and ((sub.regex is None) or (sub.regex.match(key[len(prefix):]) is not None))
 
     def get_subscription(self, sub_id):
         return self._db \
             .query(Subscription) \
             .get(sub_id)
 
-    def find_matching_subscriptions(self, bucket, key):
-        query = self._db \
+    def lock_subscription(self, sub_id):
+        """Get a subscription, waiting for other transactions that lock it and reloading its columns."""
+        return self._db \
             .query(Subscription) \
-            .filter(Subscription.state == Subscription.State.ACTIVE.value) \
-            .filter(Subscription.bucket == bucket)
+            .populate_existing() \
+            .with_for_update() \
+            .filter(Subscription.id == sub_id) \
+            .one()
 
-        k = sa.sql.expression.bindparam('k', key)
-        query = query \
-            .filter(k.startswith(Subscription.prefix))
+    def get_live_subscriptions(self):
+        """Get the subscriptions that are active or will become active once backfilled."""
+        subs = self._db \
+            .query(Subscription) \
+            .filter(Subscription.state.in_([
+                Subscription.State.ACTIVE.value,
+                Subscription.State.BACKFILLING.value,
+            ])) \
+            .all()
+
+        return list(subs)
+
+    def notify_changed(self, sub):
+        """Update the subscription index after a subscription is created or changes state."""
+        self._sub_index.notify_changed(sub)
+
+    def find_matching_subscriptions(self, bucket, key):
+        if self._matching == SubscriptionService.QUERY_MATCHING:
+            query = self._query_candidates(bucket, key)
+        else:
+            query = self._index_candidates(bucket, key)
 
-        subs = list(filter(lambda s: self.matches(s, bucket, key), query.all()))
+        # the regex is always checked here as python patterns are not valid postgres patterns
+        # with the index this also rechecks subscriptions that changed since it was loaded
+        subs = [] if (query is None) else list(filter(lambda s: self.matches(s, bucket, key), query.all()))
 
         _log.debug('Found subscriptions matching bucket="{b}" key="{k}": {s}'.format(
             b=bucket,
@@ -54,38 +84,298 @@ class SubscriptionService:
 
         return subs
 
-    def evaluate(self, sub):
+    def _index_candidates(self, bucket, key):
+        sub_ids = self._sub_index.find_candidates(bucket, key)
+        if not sub_ids:
+            return None
+
+        return self._db \
+            .query(Subscription) \
+            .filter(Subscription.id.in_(sub_ids)) \
+            .filter(Subscription.state == Subscription.State.ACTIVE.value)
+
+    def _query_candidates(self, bucket, key):
+        # every prefix of the key, so that the prefix is an indexed equality test
+        prefixes = sa.sql.expression.bindparam(
+            'prefixes',
+            [key[:i] for i in range(len(key) + 1)],
+            type_=sa.dialects.postgresql.ARRAY(sa.String),
+        )
+
+        return self._db \
+            .query(Subscription) \
+            .filter(Subscription.bucket == bucket) \
+            .filter(Subscription.state == Subscription.State.ACTIVE.value) \
+            .filter(sa.or_(
+                Subscription.prefix == sa.any_(prefixes),
+                Subscription.prefix.is_(None),
+            ))
+
+    def add_elements(self, sub, elems):
+        """Add new available elements to a subscription and count them towards its trigger.
+
+        Elements for objects that were already added to the subscription are skipped.
+
+        Returns:
+            list: The elements that were added.
+        """
+        for elem in elems:
+            assert elem.sub_id == sub.id
+            assert elem.bucket == sub.bucket
+            elem.id = elem.id or str(uuid.uuid4())
+            elem.state = Element.State.AVAILABLE
+
+        added_ids = set(self.bulk_add_elements(sub, [
+            (elem.id, elem.key, elem.size, elem.s3_created)
+            for elem in elems
+        ]))
+
+        return [self._db.add_inserted(elem) for elem in elems if elem.id in added_ids]
+
+    def bulk_add_elements(self, sub, rows):
+        """Add new available elements to a subscription without creating entities.
+
+        Rows for objects that were already added to the subscription are skipped by the unique constraint on
+        elements, so redelivered objects are never counted twice.
+
+        Args:
+            rows (list): (id, key, size, s3_created) tuples for objects in the subscription's bucket.
+
+        Returns:
+            list: The ids of the elements that were added.
+        """
+        sizes = {elem_id: size for elem_id, _, size, _ in rows}
+        added_ids = [
+            elem_id for (elem_id,) in self._db.bulk_insert(
+                Element.__table__,
+                ['id', 'sub_id', 'state', 'bucket', 'key', 'size', 's3_created'],
+                [
+                    (elem_id, sub.id, Element.State.AVAILABLE, sub.bucket, key, size, s3_created)
+                    for elem_id, key, size, s3_created in rows
+                ],
+                skip_conflicts=True,
+                returning=['id'],
+            )
+        ]
+
+        if len(added_ids) < len(rows):
+            _log.info(f'Skipped {len(rows) - len(added_ids)} elements already added to {sub}')
+
+        if added_ids:
+            self._change_available(sub, sum(sizes[elem_id] for elem_id in added_ids), len(added_ids))
+
+        return added_ids
+
+    def get_available(self, sub_id):
+        """Get the number of bytes and the number of elements available to batch for a subscription."""
+        return self._db \
+            .query(Subscription.available_bytes, Subscription.available_elements) \
+            .filter(Subscription.id == sub_id) \
+            .one()
+
+    def find_due_subscriptions(self, *, limit=100):
+        """Get active subscriptions whose oldest available element has passed its trigger's max age, or
+        whose last evaluation left batchable elements behind.
+
+        The most overdue subscriptions come first. They are not locked, as `evaluate` locks each one.
+        """
+        subs = self._db \
+            .query(Subscription) \
+            .filter(Subscription.batch_due <= sa.func.now()) \
+            .filter(Subscription.state == Subscription.State.ACTIVE.value) \
+            .order_by(Subscription.batch_due.asc()) \
+            .limit(limit) \
+            .all()
+
+        return list(subs)
+
+    def schedule(self, sub):
+        """Set when a subscription is due to batch after its trigger changes."""
+        self._change_available(sub, 0, 0)
+
+    def evaluate(self, sub, *, max_batches=10):
+        """Create batches for as long as a subscription's available elements meet its trigger.
+
+        A backlog is drained into several batches, bounded by the trigger's max batch size, with a
+        notification sent for each. Notifications are sent before the transaction commits, so at most
+        `max_batches` are created at a time. A subscription with a remaining backlog is marked due, so the
+        sweeper carries on draining it without waiting for more elements to be added.
+
+        Returns:
+            list: The batches created.
+        """
         _log.info(f'Evaluating {sub}')
 
         if sub.trigger is None:
             _log.info('No trigger attached')
-            return
+            return []
+
+        # concurrent evaluations of the same subscription would race to batch the same elements
+        if not self._db.try_advisory_xact_lock(f'evaluate-subscription-{sub.id}'):
+            # the other transaction cannot see elements added by this one, so the sweeper evaluates it again
+            _log.info(f'{sub} is being evaluated by another transaction, leaving it to be swept')
+            self._set_batch_due(sub, True)
+            return []
+
+        batches = []
+        while True:
+            available_bytes, available_elems, due, scheduled = self._get_trigger_state(sub)
+            ready = sub.trigger.is_ready(available_bytes, available_elems, due)
+            if (not ready) or (len(batches) >= max_batches):
+                break
+
+            _log.info(f'{sub} is ready to batch with {available_bytes} bytes in {available_elems} elements')
+            batch = self._create_and_send_batch(sub)
+            if batch is None:
+                # the remaining elements are locked by another transaction
+                break
+
+            batches.append(batch)
+
+        if ready:
+            _log.info(f'Created {len(batches)} batches for {sub}, leaving the rest to be swept')
+            self._set_batch_due(sub, True)
+        elif scheduled and (sub.trigger.max_age is None):
+            # without a max age the subscription was only due to continue an earlier evaluation
+            self._set_batch_due(sub, False)
+
+        if not batches:
+            _log.info(f'{sub} not ready to batch')
 
-        elems = self._elem_srv.get_batchable_sub_elems(sub.id)
-        batch_size = sum(e.size for e in elems)
-        num_elems = len(elems)
+        return batches
 
-        if batch_size >= sub.trigger.threshold:
-            _log.info(f'{sub} is ready to batch by passing threshold of {sub.trigger.threshold} with {num_elems} elements: {elems}')
-            return self._create_and_send_batch(sub, elems)
+    def _get_trigger_state(self, sub):
+        """Get a subscription's available bytes and elements, whether it is due to batch and whether it has
+        a due time at all.
+        """
+        available_bytes, available_elems, due, scheduled = self._db \
+            .query(
+                Subscription.available_bytes,
+                Subscription.available_elements,
+                Subscription.batch_due <= sa.func.now(),
+                Subscription.batch_due.isnot(None),
+            ) \
+            .filter(Subscription.id == sub.id) \
+            .one()
 
-        _log.info(f'{sub} not ready to batch')
-        return None
+        # without a max age the due time only asks the sweeper to evaluate the subscription again
+        due = bool(due) and (sub.trigger.max_age is not None)
+        return available_bytes, available_elems, due, scheduled
 
-    def _create_and_send_batch(self, sub, elems):
-        batch = self._db.add(Batch(
-            id=str(uuid.uuid4()),
+    def _set_batch_due(self, sub, due):
+        """Mark a subscription as due to be swept now, or not due at all."""
+        table = Subscription.__table__
+        self._db.execute(
+            table.update()
+                .where(table.c.id == sub.id)
+                .values(batch_due=sa.func.now() if due else None)
+        )
+        self._db.expire(sub, ['batch_due'])
+
+    def create_batch(self, sub, *, limit=4096, max_bytes=None):
+        """Batch the oldest available elements of a subscription, returning None if there are none.
+
+        Elements are moved into the batch by a single statement. Elements locked by another transaction are
+        skipped rather than waited for.
+
+        Args:
+            limit (int): The most elements to batch.
+            max_bytes (int): The most bytes to batch, except that the oldest element is always batched.
+        """
+        batch_id = str(uuid.uuid4())
+        table = Element.__table__
+
+        columns = [table.c.id] if (max_bytes is None) else [table.c.id, table.c.size, table.c.s3_created]
+        batchable = sa.select(columns) \
+            .where(table.c.sub_id == sub.id) \
+            .where(table.c.state == Element.State.AVAILABLE) \
+            .order_by(table.c.s3_created.asc(), table.c.id.asc()) \
+            .limit(limit) \
+            .with_for_update(skip_locked=True)
+
+        if max_bytes is not None:
+            # postgres does not allow window functions alongside FOR UPDATE, so the locked rows are a subquery
+            locked = batchable.alias('locked')
+            running = sa.select([
+                locked.c.id,
+                sa.func.sum(locked.c.size).over(
+                    order_by=[locked.c.s3_created.asc(), locked.c.id.asc()],
+                ).label('running_bytes'),
+                sa.func.row_number().over(
+                    order_by=[locked.c.s3_created.asc(), locked.c.id.asc()],
+                ).label('position'),
+            ]).alias('running')
+            batchable = sa.select([running.c.id]) \
+                .where(sa.or_(running.c.running_bytes <= max_bytes, running.c.position == 1))
+
+        # new elements must be written before they can be batched
+        self._db.flush()
+        sizes = dict(
+            self._db.execute(
+                table.update()
+                    .where(table.c.id.in_(batchable))
+                    .values(state=Element.State.BATCHED, batch_id=batch_id)
+                    .returning(table.c.id, table.c.size)
+            ).fetchall()
+        )
+
+        if not sizes:
+            return None
+
+        _log.info(f'Batched {len(sizes)} elements for {sub}')
+        self._change_available(sub, -sum(sizes.values()), -len(sizes))
+        # elements loaded earlier in the transaction are updated in place rather than reloaded one by one
+        self._db.set_loaded(Element, sizes, state=Element.State.BATCHED, batch_id=batch_id)
+
+        return self._db.add(Batch(
+            id=batch_id,
             state=Batch.State.UNCONSUMED,
             sub_id=sub.id,
+            # the transaction start time would be shared by every batch drained from a backlog at once
+            created=sa.func.clock_timestamp(),
         ))
 
-        for elem in elems:
-            assert elem.sub_id == sub.id
-            assert elem.state == Element.State.AVAILABLE
-            elem.state = Element.State.BATCHED
-            elem.batch_id = batch.id
+    def _change_available(self, sub, num_bytes, num_elems):
+        # a single statement so that concurrent transactions cannot lose each other's changes
+        table = Subscription.__table__
+        max_age = sub.trigger.max_age if (sub.trigger is not None) else None
 
-        self._db.flush()
+        if max_age is None:
+            batch_due = None
+        else:
+            # the first available element starts the clock, which runs until no elements are left
+            # the due time is kept when a batch is taken, although the remaining elements are newer, so a
+            # subscription may be due early but is never late
+            batch_due = sa.case(
+                [(
+                    table.c.available_elements + num_elems > 0,
+                    sa.func.coalesce(
+                        table.c.batch_due,
+                        sa.func.now() + sa.literal(dt.timedelta(seconds=max_age), sa.Interval),
+                    ),
+                )],
+                else_=None,
+            )
+
+        self._db.execute(
+            table.update()
+                .where(table.c.id == sub.id)
+                .values(
+                    available_bytes=table.c.available_bytes + num_bytes,
+                    available_elements=table.c.available_elements + num_elems,
+                    batch_due=batch_due,
+                )
+        )
+        self._db.expire(sub, ['available_bytes', 'available_elements', 'batch_due'])
+
+    def _create_and_send_batch(self, sub):
+        batch = self.create_batch(
+            sub,
+            limit=sub.trigger.max_batch_elements or 4096,
+            max_bytes=sub.trigger.max_batch_bytes,
+        )
+        if batch is None:
+            return None
 
         if sub.trigger.endpoint is not None:
             _log.info('Sending {} trigger message'.format(sub))
@@ -19,6 +19,18 @@ class SubscriptionState(enum.Enum):
 
 class Subscription(Entity):
     __tablename__ = 'subscription'
+    __table_args__ = (
+        # matching an object looks up active subscriptions by bucket and every prefix of its key
+        sa.Index('ix_subscription_bucket_state_prefix', 'bucket', 'state', 'prefix'),
+        # live subscriptions are listed and loaded into the subscription index by state
+        sa.Index('ix_subscription_state', 'state'),
+        # the sweeper looks up due subscriptions, which are few compared to all subscriptions
+        sa.Index(
+            'ix_subscription_batch_due',
+            'batch_due',
+            postgresql_where=sa.text('batch_due IS NOT NULL'),
+        ),
+    )
 
     id = sa.Column(
         sa.String,
@@ -59,5 +71,27 @@ class Subscription(Entity):
         sa.String,
     )
 
+    # totals of the elements that are available to batch, maintained as elements are added and batched
+    available_bytes = sa.Column(
+        sa.BigInteger,
+        default=0,
+        server_default='0',
+        nullable=False,
+    )
+
+    available_elements = sa.Column(
+        sa.Integer,
+        default=0,
+        server_default='0',
+        nullable=False,
+    )
+
+    # when the oldest available element passes the trigger's max age, or when an evaluation that left
+    # batchable elements behind should be continued by the sweeper
+    batch_due = sa.Column(
+        sa.DateTime(timezone=True),
+        nullable=True,
+    )
+
     def __repr__(self):
         return super().__repr__(id=self.id)
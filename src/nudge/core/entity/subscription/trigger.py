@@ -20,11 +20,33 @@ class SubscriptionTrigger(rv.serializable.Serializable):
     )
 
     threshold = rv.serializable.fields.Int(
-        # 0 byte threshold
-        # every file creates a new batch
+        # with no condition at all every file creates a new batch
         help='The number of bytes required for a subscription to create a new batch.',
         optional=True,
-        default=0,
+    )
+
+    max_age = rv.serializable.fields.Int(
+        help='The number of seconds an element can be available before a new batch is created.',
+        optional=True,
+        min=0,
+    )
+
+    max_count = rv.serializable.fields.Int(
+        help='The number of elements required for a subscription to create a new batch.',
+        optional=True,
+        min=1,
+    )
+
+    max_batch_bytes = rv.serializable.fields.Int(
+        help='The most bytes in a batch. A batch always has at least one element.',
+        optional=True,
+        min=1,
+    )
+
+    max_batch_elements = rv.serializable.fields.Int(
+        help='The most elements in a batch.',
+        optional=True,
+        min=1,
     )
 
     custom = rv.serializable.fields.Str(
@@ -38,3 +60,24 @@ class SubscriptionTrigger(rv.serializable.Serializable):
         ]),
         optional=True,
     )
+
+    @property
+    def byte_threshold(self):
+        """The byte threshold, or None if only the age and count conditions apply."""
+        if (self.threshold is None) and (self.max_age is None) and (self.max_count is None):
+            return 0
+
+        return self.threshold
+
+    def is_ready(self, available_bytes, available_elems, due):
+        """Whether a subscription with the given available elements should create a new batch.
+
+        Args:
+            due (bool): Whether the subscription's oldest available element is older than `max_age`.
+        """
+        if available_elems == 0:
+            return False
+
+        return due \
+            or ((self.max_count is not None) and (available_elems >= self.max_count)) \
+            or ((self.byte_threshold is not None) and (available_bytes >= self.byte_threshold))
@@ -4,7 +4,13 @@ from nudge.core.function.consume import Consume
 from nudge.core.function.create_batch import CreateBatch
 from nudge.core.function.get_batch_elems import GetBatchElements
 from nudge.core.function.get_sub_batches import GetSubscriptionBatches
+from nudge.core.function.get_sub_elems import GetSubscriptionElements
 from nudge.core.function.get_subscription import GetSubscription
 from nudge.core.function.handle_obj_created import HandleObjectCreated
+from nudge.core.function.handle_objs_created import HandleObjectsCreated
+from nudge.core.function.list_subs import ListSubscriptions
+from nudge.core.function.stream_batch_elems import StreamBatchElements
+from nudge.core.function.stream_sub_elems import StreamSubscriptionElements
 from nudge.core.function.subscribe import Subscribe
+from nudge.core.function.sweep import Sweep
 from nudge.core.function.unsubscribe import Unsubscribe
@@ -33,7 +33,7 @@ class AttachTrigger(rv.function.Function):
 
         # make call
 
-        batch = self(
+        batches = self(
             sub_id=request.subscription_id,
             trigger=request.trigger,
         )
@@ -41,7 +41,9 @@ class AttachTrigger(rv.function.Function):
         # format response
 
         return {
-            'BatchId': batch.id if (batch is not None) else None,
+            # the first batch, for callers from before a backlog could be drained into several batches
+            'BatchId': batches[0].id if batches else None,
+            'BatchIds': [batch.id for batch in batches],
         }
 
     @autocommit
@@ -55,9 +57,10 @@ class AttachTrigger(rv.function.Function):
             raise Exception('Subscription already has a trigger')
 
         sub.trigger = trigger
+        self._sub_srv.schedule(sub)
 
         if sub.state is Subscription.State.BACKFILLING:
             _log.info(f'{sub} is backfilling and will be evaluated when complete')
-            return None
+            return []
 
         return self._sub_srv.evaluate(sub)
@@ -1,17 +1,28 @@
 import logging
+import uuid
 
 import revolio as rv
 import revolio.serializable
 from revolio.function import validate
 from revolio.sqlalchemy import autocommit
 
-from nudge.core.entity import Subscription, Element
+from nudge.core.entity import Subscription
 
 
 _log = logging.getLogger(__name__)
 
 
 class Backfill(rv.function.Function):
+    """Add the existing objects under a subscription's prefix as elements, one listing page per call.
+
+    With a delimiter the prefix is first listed with that delimiter, and each common prefix found becomes a
+    partition that is listed by its own chain of deferred calls, so partitions are backfilled concurrently.
+    Listings that have not finished are tracked in the subscription's data, and the subscription becomes
+    active once every listing has finished.
+    """
+
+    # key of the progress in the subscription's data
+    PROGRESS_KEY = 'Backfill'
 
     def __init__(self, ctx, db, sub_srv, s3, deferral):
         super().__init__(ctx)
@@ -20,61 +31,86 @@ class Backfill(rv.function.Function):
         self._s3 = s3
         self._deferral = deferral
 
-    def format_request(self, sub_id, *, token=None):
+    def format_request(self, sub_id, *, token=None, partition=None, delimiter=None):
         return {
             'SubscriptionId': sub_id,
             'ContinuationToken': token,
+            'Partition': partition,
+            'Delimiter': delimiter,
         }
 
     @validate(
         subscription_id=rv.serializable.fields.Str(),
         continuation_token=rv.serializable.fields.Str(optional=True),
+        partition=rv.serializable.fields.Str(optional=True),
+        delimiter=rv.serializable.fields.Str(optional=True),
     )
     def handle_request(self, request):
 
         # make call
 
-        elems, backfill_complete = self(
+        elem_ids, backfill_complete = self(
             sub_id=request.subscription_id,
             token=request.continuation_token,
+            partition=request.partition,
+            delimiter=request.delimiter,
         )
 
         # format response
 
         return {
-            'ElementIds': [e.id for e in elems],
+            'ElementIds': elem_ids,
             'BackfillComplete': backfill_complete,
         }
 
     @autocommit
-    def __call__(self, sub_id, *, token=None):
+    def __call__(self, sub_id, *, token=None, partition=None, delimiter=None):
+        """
+
+        Args:
+            partition (str): The prefix of the partition to list, or None to list the subscription's prefix.
+            delimiter (str): The delimiter splitting the subscription's prefix into partitions, if any.
+        """
         sub = self._sub_srv.get_subscription(sub_id)
 
         if sub.state is not Subscription.State.BACKFILLING:
             raise Exception(f'Subscription is in state {sub.state.value}')
 
+        listing = partition if (partition is not None) else (sub.prefix or '')
+        split = (partition is None) and (delimiter is not None)
+
         r = self._s3.list_objects_v2(
             Bucket=sub.bucket,
-            Prefix=sub.prefix,
+            Prefix=listing,
             MaxKeys=1000,  # max allowed by api
+            **(dict(Delimiter=delimiter) if split else {}),
             **(dict(ContinuationToken=token) if (token is not None) else {})
         )
 
-        backfill_complete = not r.get('IsTruncated', False)
-        if not backfill_complete:
+        # listing s3 happens before the lock so that partitions are listed concurrently
+        # the lock makes the deferred calls below wait for this call's progress to be committed
+        sub = self._sub_srv.lock_subscription(sub_id)
+        progress = (sub.data or {}).get(Backfill.PROGRESS_KEY, {'Pending': [listing], 'Done': []})
+        pending, done = list(progress['Pending']), list(progress['Done'])
+
+        listing_complete = not r.get('IsTruncated', False)
+        if not listing_complete:
             next_token = r['NextContinuationToken']
-            _log.info(f'Sending deferred {sub} backfill continuation call with token {next_token}')
-            self._deferral.send_call(self, sub.id, token=next_token)
+            _log.info(f'Sending deferred {sub} backfill continuation call for "{listing}" with token {next_token}')
+            self._deferral.send_call(self, sub.id, token=next_token, partition=partition, delimiter=delimiter)
 
-        elems = [
-            self._db.add(Element(
-                sub_id=sub.id,
-                state=Element.State.AVAILABLE,
-                bucket=sub.bucket,
-                key=obj_data['Key'],
-                size=obj_data['Size'],
-                s3_created=obj_data['LastModified'],
-            ))
+        # a retried call does not restart partitions that have already been listed
+        partitions = [
+            p['Prefix'] for p in r.get('CommonPrefixes', [])
+            if (p['Prefix'] not in pending) and (p['Prefix'] not in done)
+        ]
+        for p in partitions:
+            _log.info(f'Sending deferred {sub} backfill call for partition "{p}"')
+            self._deferral.send_call(self, sub.id, partition=p)
+
+        # a page is inserted in one statement rather than flushed as an entity per object
+        rows = [
+            (str(uuid.uuid4()), obj_data['Key'], obj_data['Size'], obj_data['LastModified'])
             for obj_data in r.get('Contents', [])
             if self._sub_srv.matches(
                 sub=sub,
@@ -82,10 +118,21 @@ class Backfill(rv.function.Function):
                 key=obj_data['Key'],
             )
         ]
+        elem_ids = self._sub_srv.bulk_add_elements(sub, rows)
+
+        pending.extend(partitions)
+        if listing_complete and (listing in pending):
+            pending.remove(listing)
+            done.append(listing)
+
+        sub.data = dict(sub.data or {}, **{Backfill.PROGRESS_KEY: {'Pending': pending, 'Done': done}})
+        _log.info(f'{sub} has {len(pending)} backfill listings pending')
 
+        backfill_complete = not pending
         if backfill_complete:
             _log.info('{} backfilling is complete'.format(sub))
             sub.state = Subscription.State.ACTIVE
+            self._sub_srv.notify_changed(sub)
             self._sub_srv.evaluate(sub)
 
-        return elems, backfill_complete
+        return elem_ids, backfill_complete
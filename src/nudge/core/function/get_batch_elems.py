@@ -1,5 +1,6 @@
 import revolio as rv
 import revolio.serializable
+import revolio.util.cursor
 from revolio.function import validate
 from revolio.sqlalchemy import autocommit
 
@@ -11,12 +12,13 @@ class GetBatchElements(rv.function.Function):
         self._elem_srv = elem_srv
         self._db = db
 
-    def format_request(self, sub_id, batch_id, *, limit=None, offset=0):
+    def format_request(self, sub_id, batch_id, *, limit=None, offset=0, token=None):
         return {
             'SubscriptionId': sub_id,
             'BatchId': batch_id,
             'Limit': limit,
             'Offset': offset,
+            'ContinuationToken': token,
         }
 
     @validate(
@@ -24,6 +26,7 @@ class GetBatchElements(rv.function.Function):
         batch_id=rv.serializable.fields.Str(),
         limit=rv.serializable.fields.Int(optional=True, default=None, min=1),
         offset=rv.serializable.fields.Int(optional=True, default=0, min=0),
+        continuation_token=rv.serializable.fields.Str(optional=True),
     )
     def handle_request(self, request):
 
@@ -33,9 +36,11 @@ class GetBatchElements(rv.function.Function):
             batch_id=request.batch_id,
             limit=request.limit,
             offset=request.offset,
+            token=request.continuation_token,
         )
 
         # format response
+        full_page = (request.limit is not None) and (len(elems) == request.limit)
         return {
             'SubscriptionId': request.subscription_id,
             'BatchId': request.batch_id,
@@ -49,13 +54,15 @@ class GetBatchElements(rv.function.Function):
                 }
                 for elem in elems
             ],
+            'NextContinuationToken': rv.util.cursor.encode(elems[-1].s3_created, elems[-1].id) if full_page else None,
         }
 
     @autocommit
-    def __call__(self, sub_id, batch_id, *, limit=None, offset=0):
+    def __call__(self, sub_id, batch_id, *, limit=None, offset=0, token=None):
         return self._elem_srv.get_batch_elems(
             sub_id=sub_id,
             batch_id=batch_id,
             limit=limit,
             offset=offset,
+            after=rv.util.cursor.decode(token) if (token is not None) else None,
         )
@@ -1,5 +1,6 @@
 import revolio as rv
 import revolio.serializable
+import revolio.util.cursor
 from revolio.function import validate
 from revolio.sqlalchemy import autocommit
 
@@ -11,15 +12,19 @@ class GetSubscriptionBatches(rv.function.Function):
         self._batch_srv = batch_srv
         self._db = db
 
-    def format_request(self, sub_id, *, prev_id=False):
+    def format_request(self, sub_id, *, prev_id=None, limit=None, token=None):
         return {
             'SubscriptionId': sub_id,
             'PreviousBatchId': prev_id,
+            'Limit': limit,
+            'ContinuationToken': token,
         }
 
     @validate(
         subscription_id=rv.serializable.fields.Str(),
         previous_batch_id=rv.serializable.fields.Str(optional=True),
+        limit=rv.serializable.fields.Int(optional=True, default=None, min=1),
+        continuation_token=rv.serializable.fields.Str(optional=True),
     )
     def handle_request(self, request):
 
@@ -28,10 +33,13 @@ class GetSubscriptionBatches(rv.function.Function):
         batches = self(
             sub_id=request.subscription_id,
             prev_id=request.previous_batch_id,
+            limit=request.limit,
+            token=request.continuation_token,
         )
 
         # format response
 
+        full_page = (request.limit is not None) and (len(batches) == request.limit)
         return {
             'Batches': [
                 {
@@ -40,11 +48,14 @@ class GetSubscriptionBatches(rv.function.Function):
                 }
                 for batch in batches
             ],
+            'NextContinuationToken': rv.util.cursor.encode(batches[-1].created, batches[-1].id) if full_page else None,
         }
 
     @autocommit
-    def __call__(self, sub_id, *, prev_id=None):
+    def __call__(self, sub_id, *, prev_id=None, limit=None, token=None):
         return self._batch_srv.get_subscription_batches(
             sub_id=sub_id,
             prev_id=prev_id,
+            after=rv.util.cursor.decode(token) if (token is not None) else None,
+            limit=limit,
         )
@@ -1,19 +1,25 @@
 import revolio as rv
 import revolio.serializable
+import revolio.util.cursor
 from revolio.function import validate
 from revolio.sqlalchemy import autocommit
 
+from nudge.core.entity import Element
+
 
 class GetSubscriptionElements(rv.function.Function):
     """Get elements belonging to a subscription.
 
     params:
         SubscriptionId (str)
+        State (str)
         Limit (int)
         Offset (int)
+        ContinuationToken (str): The NextContinuationToken of the previous page.
     returns:
         SubscriptionId (str)
         Elements (list[Element])
+        NextContinuationToken (str): Set when the page is full.
     """
 
     def __init__(self, ctx, elem_srv, db):
@@ -21,28 +27,35 @@ class GetSubscriptionElements(rv.function.Function):
         self._elem_srv = elem_srv
         self._db = db
 
-    def format_request(self, sub_id, *, limit=None, offset=0):
+    def format_request(self, sub_id, *, state=Element.State.AVAILABLE, limit=None, offset=0, token=None):
         return {
             'SubscriptionId': sub_id,
+            'State': state.name,
             'Limit': limit,
             'Offset': offset,
+            'ContinuationToken': token,
         }
 
     @validate(
         subscription_id=rv.serializable.fields.Str(),
+        state=rv.serializable.fields.Enum(Element.State, optional=True, default=Element.State.AVAILABLE),
         limit=rv.serializable.fields.Int(optional=True, default=None, min=1),
         offset=rv.serializable.fields.Int(optional=True, default=0, min=0),
+        continuation_token=rv.serializable.fields.Str(optional=True),
     )
     def handle_request(self, request):
 
         # make call
         elems = self(
             sub_id=request.subscription_id,
+            state=request.state,
             limit=request.limit,
             offset=request.offset,
+            token=request.continuation_token,
         )
 
         # format response
+        full_page = (request.limit is not None) and (len(elems) == request.limit)
         return {
             'SubscriptionId': request.subscription_id,
             'Elements': [
@@ -55,12 +68,15 @@ class GetSubscriptionElements(rv.function.Function):
                 }
                 for elem in elems
             ],
+            'NextContinuationToken': rv.util.cursor.encode(elems[-1].s3_created, elems[-1].id) if full_page else None,
         }
 
     @autocommit
-    def __call__(self, sub_id, *, offset=0, limit=None):
+    def __call__(self, sub_id, *, state=Element.State.AVAILABLE, offset=0, limit=None, token=None):
         return self._elem_srv.get_sub_elems(
             sub_id=sub_id,
+            state=state,
             limit=limit,
             offset=offset,
+            after=rv.util.cursor.decode(token) if (token is not None) else None,
         )
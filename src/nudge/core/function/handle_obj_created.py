@@ -1,3 +1,5 @@
+import logging
+
 import revolio as rv
 import revolio.function
 import revolio.serializable
@@ -7,6 +9,9 @@ from revolio.sqlalchemy import autocommit
 from nudge.core.entity import Element
 
 
+_log = logging.getLogger(__name__)
+
+
 class HandleObjectCreated(rv.function.Function):
 
     def __init__(self, ctx, db, sub_srv, batch_srv, elem_srv):
@@ -55,19 +60,32 @@ class HandleObjectCreated(rv.function.Function):
 
     @autocommit
     def __call__(self, bucket, key, size, created):
-        return [
+        """Return (element, batch) pairs for the subscriptions the object was added to.
+
+        Subscriptions that already have the object are left out.
+        """
+        # the subscriptions' rows are locked in a consistent order so that concurrent calls cannot deadlock
+        subs = sorted(self._sub_srv.find_matching_subscriptions(bucket, key), key=lambda sub: sub.id)
+        results = [
             self._handle_matching_sub(sub, bucket=bucket, key=key, size=size, created=created)
-            for sub in self._sub_srv.find_matching_subscriptions(bucket, key)
+            for sub in subs
         ]
 
+        return [result for result in results if result is not None]
+
     def _handle_matching_sub(self, sub, bucket, key, size, created):
-        elem = self._db.add(Element(
+        elems = self._sub_srv.add_elements(sub, [Element(
             sub_id=sub.id,
             bucket=bucket,
             key=key,
             size=size,
             s3_created=created,
-        ))
+        )])
+
+        if not elems:
+            _log.info(f'Object s3://{bucket}/{key} was already added to {sub}')
+            return None
 
-        batch = self._sub_srv.evaluate(sub)
-        return elem, batch
+        (elem,) = elems
+        batches = {batch.id: batch for batch in self._sub_srv.evaluate(sub)}
+        return elem, batches.get(elem.batch_id)
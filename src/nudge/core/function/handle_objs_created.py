@@ -0,0 +1,106 @@
+import revolio as rv
+import revolio.function
+import revolio.serializable
+from revolio.function import validate
+from revolio.sqlalchemy import autocommit
+
+from nudge.core.entity import Element
+
+
+class CreatedObject(rv.serializable.Serializable):
+
+    bucket = rv.serializable.fields.Str()
+    key = rv.serializable.fields.Str()
+    size = rv.serializable.fields.Int()
+    created = rv.serializable.fields.DateTime()
+
+
+class HandleObjectsCreated(rv.function.Function):
+    """Handle many created objects in a single transaction.
+
+    Each matching subscription is evaluated once after all of the objects have been added, so a burst of
+    objects crossing a threshold several times creates one batch rather than several.
+    """
+
+    Object = CreatedObject
+
+    def __init__(self, ctx, db, sub_srv, batch_srv, elem_srv):
+        super().__init__(ctx)
+        self._db = db
+        self._sub_srv = sub_srv
+        self._batch_srv = batch_srv
+        self._elem_srv = elem_srv
+
+    def format_request(self, objects):
+        return {
+            'Objects': [obj.serialize() for obj in objects],
+        }
+
+    @validate(
+        objects=rv.serializable.fields.List(rv.serializable.fields.Nested(CreatedObject)),
+    )
+    def handle_request(self, request):
+
+        # make call
+
+        results = self(
+            objects=request.objects,
+        )
+
+        # format response
+
+        return {
+            'Objects': [
+                {
+                    'MatchingSubscriptions': {
+                        elem.sub_id: {
+                            'ElementId': elem.id,
+                            'BatchId': None if (batch is None) else batch.id,
+                        }
+                        for elem, batch in obj_results
+                    },
+                }
+                for obj_results in results
+            ],
+        }
+
+    @autocommit
+    def __call__(self, objects):
+        """Return a list of (element, batch) pairs for each object, in the order the objects were given.
+
+        Subscriptions that already have an object are left out of its pairs.
+        """
+        subs = {}
+        sub_elems = {}
+        elems = []
+        for obj in objects:
+            obj_elems = []
+            for sub in self._sub_srv.find_matching_subscriptions(obj.bucket, obj.key):
+                elem = Element(
+                    sub_id=sub.id,
+                    bucket=obj.bucket,
+                    key=obj.key,
+                    size=obj.size,
+                    s3_created=obj.created,
+                )
+                subs[sub.id] = sub
+                sub_elems.setdefault(sub.id, []).append(elem)
+                obj_elems.append(elem)
+
+            elems.append(obj_elems)
+
+        # counted once per subscription, with the subscriptions' rows locked in a consistent order so that
+        # concurrent calls cannot deadlock
+        added = set()
+        for sub_id in sorted(sub_elems):
+            added.update(self._sub_srv.add_elements(subs[sub_id], sub_elems[sub_id]))
+
+        # subscriptions that already had every object are not evaluated again
+        batches = {}
+        for sub_id in sorted({elem.sub_id for elem in added}):
+            batches.update((batch.id, batch) for batch in self._sub_srv.evaluate(subs[sub_id]))
+
+        return [
+            [(elem, batches.get(elem.batch_id)) for elem in obj_elems if elem in added]
+            for obj_elems in elems
+        ]
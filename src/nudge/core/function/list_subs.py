@@ -0,0 +1,41 @@
+import revolio as rv
+from revolio.sqlalchemy import autocommit
+
+
+class ListSubscriptions(rv.function.Function):
+    """List the subscriptions that new objects can be matched against.
+
+    Backfilling subscriptions are included because they become active without another change.
+    """
+
+    def __init__(self, ctx, sub_srv):
+        super().__init__(ctx)
+        self._sub_srv = sub_srv
+
+    def format_request(self):
+        return {}
+
+    def handle_request(self, request):
+
+        # make call
+
+        subs = self()
+
+        # format response
+
+        return {
+            'Subscriptions': [
+                {
+                    'Id': sub.id,
+                    'State': sub.state.value,
+                    'Bucket': sub.bucket,
+                    'Prefix': sub.prefix,
+                    'Regex': sub.regex.pattern if (sub.regex is not None) else None,
+                }
+                for sub in subs
+            ],
+        }
+
+    @autocommit
+    def __call__(self):
+        return self._sub_srv.get_live_subscriptions()
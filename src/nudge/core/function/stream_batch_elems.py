@@ -0,0 +1,63 @@
+import revolio as rv
+import revolio.function
+import revolio.serializable
+import revolio.util.cursor
+from revolio.function import validate
+
+
+class StreamBatchElements(rv.function.StreamingFunction):
+    """Stream every element of a batch as newline-delimited JSON, in the format of `GetBatchElements`.
+
+    Memory use does not depend on the size of the batch. Each element carries the ContinuationToken that
+    resumes an interrupted stream after it.
+    """
+
+    def __init__(self, ctx, elem_srv, db):
+        super().__init__(ctx)
+        self._elem_srv = elem_srv
+        self._db = db
+
+    def format_request(self, sub_id, batch_id, *, token=None):
+        return {
+            'SubscriptionId': sub_id,
+            'BatchId': batch_id,
+            'ContinuationToken': token,
+        }
+
+    @validate(
+        subscription_id=rv.serializable.fields.Str(),
+        batch_id=rv.serializable.fields.Str(),
+        continuation_token=rv.serializable.fields.Str(optional=True),
+    )
+    def handle_request(self, request):
+
+        # make call
+        rows = self(
+            sub_id=request.subscription_id,
+            batch_id=request.batch_id,
+            token=request.continuation_token,
+        )
+
+        # format response
+        return (
+            {
+                'Id': elem_id,
+                'Bucket': bucket,
+                'Key': key,
+                'Size': size,
+                'Created': s3_created.strftime('%Y-%m-%d %H:%M:%S'),
+                'ContinuationToken': rv.util.cursor.encode(s3_created, elem_id),
+            }
+            for elem_id, bucket, key, size, s3_created in rows
+        )
+
+    def __call__(self, sub_id, batch_id, *, token=None):
+        return self._elem_srv.stream_batch_elems(
+            sub_id=sub_id,
+            batch_id=batch_id,
+            after=rv.util.cursor.decode(token) if (token is not None) else None,
+        )
+
+    def close_stream(self):
+        # the rows are read as they are sent, so the transaction ends with the stream
+        self._db.commit()
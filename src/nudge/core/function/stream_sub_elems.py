@@ -0,0 +1,65 @@
+import revolio as rv
+import revolio.function
+import revolio.serializable
+import revolio.util.cursor
+from revolio.function import validate
+
+from nudge.core.entity import Element
+
+
+class StreamSubscriptionElements(rv.function.StreamingFunction):
+    """Stream every element of a subscription in a state as newline-delimited JSON.
+
+    Elements are in the format of `GetSubscriptionElements`, and memory use does not depend on their number.
+    Each element carries the ContinuationToken that resumes an interrupted stream after it.
+    """
+
+    def __init__(self, ctx, elem_srv, db):
+        super().__init__(ctx)
+        self._elem_srv = elem_srv
+        self._db = db
+
+    def format_request(self, sub_id, *, state=Element.State.AVAILABLE, token=None):
+        return {
+            'SubscriptionId': sub_id,
+            'State': state.name,
+            'ContinuationToken': token,
+        }
+
+    @validate(
+        subscription_id=rv.serializable.fields.Str(),
+        state=rv.serializable.fields.Enum(Element.State, optional=True, default=Element.State.AVAILABLE),
+        continuation_token=rv.serializable.fields.Str(optional=True),
+    )
+    def handle_request(self, request):
+
+        # make call
+        rows = self(
+            sub_id=request.subscription_id,
+            state=request.state,
+            token=request.continuation_token,
+        )
+
+        # format response
+        return (
+            {
+                'Id': elem_id,
+                'Bucket': bucket,
+                'Key': key,
+                'Size': size,
+                'Created': s3_created.strftime('%Y-%m-%d %H:%M:%S'),
+                'ContinuationToken': rv.util.cursor.encode(s3_created, elem_id),
+            }
+            for elem_id, bucket, key, size, s3_created in rows
+        )
+
+    def __call__(self, sub_id, *, state=Element.State.AVAILABLE, token=None):
+        return self._elem_srv.stream_sub_elems(
+            sub_id=sub_id,
+            state=state,
+            after=rv.util.cursor.decode(token) if (token is not None) else None,
+        )
+
+    def close_stream(self):
+        # the rows are read as they are sent, so the transaction ends with the stream
+        self._db.commit()
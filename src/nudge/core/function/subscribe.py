@@ -14,19 +14,22 @@ _log = logging.getLogger(__name__)
 
 class Subscribe(rv.function.Function):
 
-    def __init__(self, ctx, db, deferral, iris, config):
+    def __init__(self, ctx, db, deferral, iris, config, sub_srv):
         super().__init__(ctx)
         self._db = db
+        self._sub_srv = sub_srv
         self._deferral = deferral
         self._iris = iris
         self._config = config
 
-    def format_request(self, bucket, *, prefix=None, regex=None, backfill=False, trigger=None):
+    def format_request(self, bucket, *, prefix=None, regex=None, backfill=False, backfill_delimiter=None,
+                       trigger=None):
         return {
             'Bucket': bucket,
             'Prefix': prefix,
             'Regex': regex,
             'Backfill': backfill,
+            'BackfillDelimiter': backfill_delimiter,
             'Trigger': trigger.serialize(key_format=KeyFormat.Camel) if (trigger is not None) else None,
         }
 
@@ -35,6 +38,7 @@ class Subscribe(rv.function.Function):
         prefix=rv.serializable.fields.Str(optional=True),
         regex=rv.serializable.fields.Str(optional=True),
         backfill=rv.serializable.fields.Bool(optional=True, default=False),
+        backfill_delimiter=rv.serializable.fields.Str(optional=True),
         trigger=rv.serializable.fields.Nested(Subscription.Trigger, optional=True),
     )
     def handle_request(self, request):
@@ -46,6 +50,7 @@ class Subscribe(rv.function.Function):
             prefix=request.prefix,
             regex=request.regex,
             backfill=request.backfill,
+            backfill_delimiter=request.backfill_delimiter,
             trigger=request.trigger,
         )
 
@@ -56,7 +61,7 @@ class Subscribe(rv.function.Function):
         }
 
     @autocommit
-    def __call__(self, bucket, *, prefix=None, regex=None, backfill=False, trigger=None):
+    def __call__(self, bucket, *, prefix=None, regex=None, backfill=False, backfill_delimiter=None, trigger=None):
         sub = self._db.add(Subscription(
             id=str(uuid.uuid4()),
             state=Subscription.State.ACTIVE,
@@ -71,8 +76,9 @@ class Subscribe(rv.function.Function):
         if backfill:
             sub.state = Subscription.State.BACKFILLING
             self._db.flush()
-            self._deferral.send_call(self._ctx.backfill, sub.id)
+            self._deferral.send_call(self._ctx.backfill, sub.id, delimiter=backfill_delimiter)
 
+        self._sub_srv.notify_changed(sub)
         return sub
 
     def _ensure_listening(self, sub):
@@ -0,0 +1,60 @@
+import logging
+
+import revolio as rv
+import revolio.serializable
+from revolio.function import validate
+from revolio.sqlalchemy import autocommit
+
+
+_log = logging.getLogger(__name__)
+
+
+class Sweep(rv.function.Function):
+    """Batch subscriptions whose oldest available element has passed its trigger's max age, or whose
+    backlog was left partly drained.
+
+    Evaluation otherwise only happens when elements are added, so this is called periodically to bound the
+    time an element waits for a batch.
+    """
+
+    def __init__(self, ctx, db, sub_srv):
+        super().__init__(ctx)
+        self._db = db
+        self._sub_srv = sub_srv
+
+    def format_request(self, limit=100):
+        return {
+            'Limit': limit,
+        }
+
+    @validate(
+        limit=rv.serializable.fields.Int(optional=True, default=100, min=1),
+    )
+    def handle_request(self, request):
+
+        # make call
+
+        subs, batches = self(
+            limit=request.limit,
+        )
+
+        # format response
+
+        return {
+            'SubscriptionIds': [sub.id for sub in subs],
+            'BatchIds': [batch.id for batch in batches],
+        }
+
+    @autocommit
+    def __call__(self, limit=100):
+        subs = self._sub_srv.find_due_subscriptions(limit=limit)
+        _log.info(f'Found {len(subs)} due subscriptions')
+
+        batches = []
+        for sub in subs:
+            # each subscription is committed on its own, so its locks are only held while it is batched and
+            # its batches are committed soon after their notifications are sent
+            batches.extend(self._sub_srv.evaluate(sub))
+            self._db.commit()
+
+        return subs, batches
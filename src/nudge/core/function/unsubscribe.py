@@ -45,6 +45,7 @@ class Unsubscribe(rv.function.Function):
         self._sub_srv.assert_active(sub)
 
         sub.state = Subscription.State.INACTIVE
+        self._sub_srv.notify_changed(sub)
 
         _log.info(f'Removing iris listener {sub.iris_id}')
         self._iris.remove_listener(
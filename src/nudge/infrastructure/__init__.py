@@ -21,6 +21,7 @@ class NudgeCommandContext(rv.manager.context.RevolioCommandContext):
         NGX = ('web', 'ngx')
         S3E = ('wrk', 's3e')
         DEF = ('wrk', 'def')
+        SWP = ('wrk', 'swp')
 
 
 class NudgeDevCommandContext(NudgeCommandContext):
@@ -84,6 +84,7 @@ class DeferralWorkerResources(ResourceGroup):
                         prefix=DeferralWorker.ENV_VAR_PREFIX,
                         variables={
                              DeferralWorker.QUEUE_URL_VAR: self.config['Env']['QueueUrl'],
+                             DeferralWorker.BATCH_SIZE_VAR: DeferralWorker.MAX_BATCH_SIZE,
                         },
                     ),
             )],
@@ -1,3 +1,5 @@
+import json
+
 from cached_property import cached_property
 
 import troposphere as ts
@@ -11,6 +13,7 @@ from revolio.architecture.stack import resource, ResourceGroup, parameter
 import revolio.manager.util
 
 import nudge.infrastructure
+from nudge.core.context import NudgeConfigService
 from nudge.worker.s3 import S3EventsWorker
 
 
@@ -24,6 +27,10 @@ class S3EventsWorkerResources(ResourceGroup):
     def log_group_name(self):
         return self.config['LogGroupName']
 
+    @cached_property
+    def dispatch(self):
+        return self.config['Env'].get('Dispatch', S3EventsWorker.HTTP_DISPATCH)
+
     def __init__(self, ctx, env, cluster):
         super().__init__(ctx, env.config['Worker']['S3Events'], prefix='S3EventsWorker')
         self.env = env
@@ -115,11 +122,20 @@ class S3EventsWorkerResources(ResourceGroup):
                     prefix=S3EventsWorker.ENV_VAR_PREFIX,
                     variables={
                         S3EventsWorker.QUEUE_URL_VAR: self.config['Env']['QueueUrl'],
+                        S3EventsWorker.BATCH_SIZE_VAR: S3EventsWorker.MAX_BATCH_SIZE,
                         S3EventsWorker.HOST_VAR: self.config['Env']['NudgeHost'],
                         S3EventsWorker.PORT_VAR: self.config['Env']['NudgePort'],
                         S3EventsWorker.VERSION_VAR: self.config['Env']['NudgeVersion'],
+                        S3EventsWorker.DISPATCH_VAR: self.dispatch,
+                        S3EventsWorker.PREFILTER_TTL_VAR: self.config['Env'].get('PrefilterTtl'),
                     },
-                ),
+                ) + [
+                    # read by the nudge context when dispatching in process
+                    ts.ecs.Environment(
+                        Name=f'{NudgeConfigService.ENV_VAR_PREFIX}_{NudgeConfigService.S3_CONFIG_URI}',
+                        Value=json.dumps(self.env.web.s3_config_uri),
+                    ),
+                ],
             )],
         )
 
@@ -0,0 +1,82 @@
+from cached_property import cached_property
+
+import troposphere as ts
+import troposphere.ecs
+import troposphere.logs
+
+import revolio as rv
+from revolio.architecture.stack import resource, ResourceGroup, parameter
+import revolio.manager.util
+
+import nudge.infrastructure
+from nudge.worker.sweeper import SweeperWorker
+
+
+class SweeperWorkerResources(ResourceGroup):
+
+    @cached_property
+    def log_group_name(self):
+        return self.config['LogGroupName']
+
+    def __init__(self, ctx, env, cluster):
+        super().__init__(ctx, env.config['Worker']['Sweeper'], prefix='SweeperWorker')
+        self.env = env
+        self.ecs_cluster = cluster
+
+    @resource
+    def log_group(self):
+        return ts.logs.LogGroup(
+            self._get_logical_id('LogGroup'),
+            LogGroupName=self.log_group_name,
+            RetentionInDays=14,
+        )
+
+    @parameter
+    def image(self):
+        return ts.Parameter(
+            self._get_logical_id('Image'),
+            Type='String',
+        )
+
+    @image.value
+    def image_value(self):
+        return rv.manager.util.get_latest_image_tag(
+            self.env.config['Ecr']['Repo']['Url'],
+            *nudge.infrastructure.NudgeCommandContext.Component.SWP.value,
+        )
+
+    @resource
+    def ecs_task_def(self):
+        return ts.ecs.TaskDefinition(
+            self._get_logical_id('TaskDefinition'),
+            ContainerDefinitions=[ts.ecs.ContainerDefinition(
+                    Name='swp',
+                    Image=ts.Ref(self.image),
+                    Cpu=64,
+                    Memory=256,
+                    LogConfiguration=rv.manager.util.aws_logs_config(self.log_group_name),
+                    Environment=rv.manager.util.env(
+                        prefix=SweeperWorker.ENV_VAR_PREFIX,
+                        variables={
+                            SweeperWorker.HOST_VAR: self.config['Env']['NudgeHost'],
+                            SweeperWorker.PORT_VAR: self.config['Env']['NudgePort'],
+                            SweeperWorker.VERSION_VAR: self.config['Env']['NudgeVersion'],
+                            SweeperWorker.INTERVAL_VAR: self.config['Env'].get('Interval', 60),
+                        },
+                    ),
+            )],
+        )
+
+    @resource
+    def ecs_service(self):
+        return ts.ecs.Service(
+            self._get_logical_id('EcsService'),
+            Cluster=ts.Ref(self.ecs_cluster),
+            # overdue subscriptions are locked while swept so more sweepers only add throughput
+            DesiredCount=1,
+            TaskDefinition=ts.Ref(self.ecs_task_def),
+            DeploymentConfiguration=ts.ecs.DeploymentConfiguration(
+                MaximumPercent=200,
+                MinimumHealthyPercent=0,
+            ),
+        )
@@ -4,7 +4,9 @@ import awacs.autoscaling
 import awacs.aws
 import awacs.ecs
 import awacs.helpers.trust
+import awacs.kms
 import awacs.logs
+import awacs.s3
 import awacs.sqs
 import troposphere as ts
 
@@ -13,6 +15,8 @@ from revolio.architecture.stack import resource_group
 
 from nudge.infrastructure.resources.deferral import DeferralWorkerResources
 from nudge.infrastructure.resources.s3_events import S3EventsWorkerResources
+from nudge.infrastructure.resources.sweeper import SweeperWorkerResources
+from nudge.worker.s3 import S3EventsWorker
 
 
 class WorkerResources(EcsResources):
@@ -37,9 +41,27 @@ class WorkerResources(EcsResources):
             self.ecs_cluster,
         )
 
+    @resource_group
+    def swp_worker(self):
+        return SweeperWorkerResources(
+            self._ctx,
+            self.env,
+            self.ecs_cluster,
+        )
+
     @property
     def profile_role_statements(self):
+        statements = {}
+        if self.s3e_worker.dispatch == S3EventsWorker.LOCAL_DISPATCH:
+            # send trigger messages when dispatching in process, as the web role does
+            statements['access-all-sqs'] = awacs.aws.Statement(
+                Effect='Allow',
+                Action=[awacs.sqs.Action('*')],
+                Resource=['*'],
+            )
+
         return collections.ChainMap(
+            statements,
             {
                 # poll s3 events queue
                 'sqs': awacs.aws.Statement(
@@ -50,6 +72,17 @@ class WorkerResources(EcsResources):
                         ts.GetAtt(self.def_worker.queue, 'Arn'),
                     ],
                 ),
+                # pull s3 config when dispatching in process
+                'access-secrets-bucket': awacs.aws.Statement(
+                    Effect='Allow',
+                    Action=[awacs.s3.Action('Get*')],
+                    Resource=[ts.Join('', ['arn:aws:s3:::', ts.Ref(self.env.secrets.bucket), '*'])],
+                ),
+                'use-secrets-kms-key': awacs.aws.Statement(
+                    Effect='Allow',
+                    Action=[awacs.kms.Action('Decrypt')],
+                    Resource=[ts.GetAtt(self.env.secrets.key, 'Arn')],
+                ),
             },
             super().profile_role_statements,
         )
@@ -16,8 +16,8 @@ class DeferralWorker(rv.worker.SqsWorker):
 
     ENV_VAR_PREFIX = 'NDG_WRK_DEF'
 
-    def __init__(self):
-        super(DeferralWorker, self).__init__(nudge.__name__)
+    def __init__(self, *, queue=None):
+        super(DeferralWorker, self).__init__(nudge.__name__, queue=queue)
 
     def _handle_message(self, msg):
         url = msg['Url']
@@ -31,4 +31,4 @@ class DeferralWorker(rv.worker.SqsWorker):
 
 
 if __name__ == '__main__':
-    DeferralWorker().run()
+    rv.worker.Supervisor(DeferralWorker()).run()
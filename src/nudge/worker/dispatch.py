@@ -0,0 +1,68 @@
+import abc
+import logging
+
+
+_log = logging.getLogger(__name__)
+
+
+class Dispatcher(metaclass=abc.ABCMeta):
+    """Calls nudge functions on behalf of a worker."""
+
+    @abc.abstractmethod
+    def handle_objects_created(self, objects):
+        """
+
+        Args:
+            objects (list): Dicts with Bucket, Key, Size and Created keys, as sent to the web api.
+        """
+        pass
+
+    @abc.abstractmethod
+    def list_subscriptions(self):
+        """Return the ListSubscriptions response."""
+        pass
+
+
+class HttpDispatcher(Dispatcher):
+    """Call functions through the nudge web api."""
+
+    def __init__(self, client):
+        """
+
+        Args:
+            client (nudge.core.client.NudgeClient): The client for the web api.
+        """
+        super().__init__()
+        self._client = client
+
+    def handle_objects_created(self, objects):
+        return self._client.handle_objects_created(Objects=objects)
+
+    def list_subscriptions(self):
+        return self._client.list_subscriptions()
+
+
+class LocalDispatcher(Dispatcher):
+    """Call functions in this process, skipping the web api.
+
+    Each call runs in its own app context so that its database session is removed, and any failed transaction
+    rolled back, when the call returns.
+    """
+
+    def __init__(self, ctx):
+        """
+
+        Args:
+            ctx (nudge.core.context.NudgeCoreContext): The context whose functions are called.
+        """
+        super().__init__()
+        self._ctx = ctx
+
+    def handle_objects_created(self, objects):
+        with self._ctx.app.flask_app.app_context():
+            # reuse the request validation of the web api
+            return self._ctx.handle_objects_created.handle_request({'Objects': objects})
+
+    def list_subscriptions(self):
+        with self._ctx.app.flask_app.app_context():
+            return self._ctx.list_subscriptions.handle_request({})
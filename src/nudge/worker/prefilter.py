@@ -0,0 +1,80 @@
+import json
+import logging
+import re
+import threading
+import time
+import traceback
+
+from nudge.core.entity import Subscription, SubscriptionService
+
+
+_log = logging.getLogger(__name__)
+
+
+class SubscriptionFilter:
+    """Discard objects that cannot match any subscription before they are sent to nudge.
+
+    Matching uses a snapshot of the live subscriptions that is reloaded once it is `ttl` seconds old, so a new
+    subscription may miss objects created within `ttl` seconds of it becoming active. Until a snapshot has been
+    loaded every object is allowed through.
+    """
+
+    def __init__(self, load, ttl, *, clock=time.monotonic):
+        """
+
+        Args:
+            load (callable): Returns a ListSubscriptions response.
+            ttl (float): The number of seconds a snapshot is used for.
+            clock (callable): Returns the current time in seconds.
+        """
+        super().__init__()
+        self._load = load
+        self._ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._subs = None
+        self._loaded_at = None
+
+    def matches(self, bucket, key):
+        subs = self._snapshot()
+        if subs is None:
+            return True
+
+        return any(SubscriptionService.matches(sub, bucket, key) for sub in subs.get(bucket, []))
+
+    def _snapshot(self):
+        with self._lock:
+            now = self._clock()
+            if (self._loaded_at is None) or (now - self._loaded_at >= self._ttl):
+                # failures are retried after another ttl rather than on every object
+                self._loaded_at = now
+                try:
+                    self._subs = self._build(self._load()['Subscriptions'])
+                except Exception:
+                    _log.error('\r'.join([
+                        'Error loading subscriptions, keeping previous snapshot',
+                        json.dumps(traceback.format_exc()),
+                    ]))
+
+            return self._subs
+
+    @staticmethod
+    def _build(subs):
+        by_bucket = {}
+        for sub in subs:
+            try:
+                regex = re.compile(sub['Regex']) if (sub['Regex'] is not None) else None
+            except re.error:
+                # let nudge decide rather than dropping objects
+                _log.warning(f'Invalid regex for subscription {sub["Id"]}')
+                regex = None
+
+            by_bucket.setdefault(sub['Bucket'], []).append(Subscription(
+                id=sub['Id'],
+                bucket=sub['Bucket'],
+                prefix=sub['Prefix'],
+                regex=regex,
+            ))
+
+        _log.info(f'Loaded {len(subs)} subscriptions across {len(by_bucket)} buckets')
+        return by_bucket
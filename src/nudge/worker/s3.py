@@ -8,12 +8,24 @@ import revolio.worker
 
 import nudge
 from nudge.core.client import NudgeClient
+from nudge.core.context import NudgeCoreContext
+from nudge.worker.dispatch import HttpDispatcher, LocalDispatcher
+from nudge.worker.prefilter import SubscriptionFilter
 
 
 _log = logging.getLogger(__name__)
 
 
 class S3EventsWorker(rv.worker.SqsWorker):
+    """Send S3 object created events to nudge.
+
+    By default events are sent to the web api at HOST, PORT and VERSION. With DISPATCH set to "local" the
+    worker instead loads the nudge config from NDG_APP_S3_CONFIG_URI and calls nudge functions in process,
+    using its own database connection pool of POOL_SIZE connections.
+
+    With PREFILTER_TTL set, records that cannot match a live subscription are discarded before being sent.
+    The subscriptions are reloaded every PREFILTER_TTL seconds.
+    """
 
     ENV_VAR_PREFIX = 'NDG_WRK_S3E'
 
@@ -21,8 +33,39 @@ class S3EventsWorker(rv.worker.SqsWorker):
     PORT_VAR = 'PORT'
     VERSION_VAR = 'VERSION'
 
-    def __init__(self):
-        super(S3EventsWorker, self).__init__(nudge.__name__)
+    DISPATCH_VAR = 'DISPATCH'
+    POOL_SIZE_VAR = 'POOL_SIZE'
+    MAX_OVERFLOW_VAR = 'MAX_OVERFLOW'
+    PREFILTER_TTL_VAR = 'PREFILTER_TTL'
+
+    HTTP_DISPATCH = 'http'
+    LOCAL_DISPATCH = 'local'
+
+    def __init__(self, *, queue=None):
+        super(S3EventsWorker, self).__init__(nudge.__name__, queue=queue)
+        self._discarded = self.metrics.counter(
+            'worker_records_discarded_total',
+            'S3 records discarded for matching no subscription',
+        )
+
+    @cached_property
+    def _dispatcher(self):
+        dispatch = self.get_env_var(S3EventsWorker.DISPATCH_VAR, default=S3EventsWorker.HTTP_DISPATCH)
+        if dispatch == S3EventsWorker.HTTP_DISPATCH:
+            return HttpDispatcher(self._nudge_client)
+
+        if dispatch == S3EventsWorker.LOCAL_DISPATCH:
+            return LocalDispatcher(self._nudge_ctx)
+
+        raise Exception(f'Unknown dispatch mode {dispatch}')
+
+    @cached_property
+    def _prefilter(self):
+        ttl = self.get_env_var(S3EventsWorker.PREFILTER_TTL_VAR, default=None)
+        if ttl is None:
+            return None
+
+        return SubscriptionFilter(self._dispatcher.list_subscriptions, ttl)
 
     @cached_property
     def _nudge_client(self):
@@ -32,7 +75,44 @@ class S3EventsWorker(rv.worker.SqsWorker):
             api_version=self.get_env_var(S3EventsWorker.VERSION_VAR),
         )
 
+    @cached_property
+    def _nudge_ctx(self):
+        # built lazily so that each supervised process opens its own connections
+        return NudgeCoreContext(
+            flask_config={
+                # one connection for each thread handling messages
+                'SQLALCHEMY_POOL_SIZE': self.get_env_var(S3EventsWorker.POOL_SIZE_VAR, default=self._concurrency),
+                'SQLALCHEMY_MAX_OVERFLOW': self.get_env_var(S3EventsWorker.MAX_OVERFLOW_VAR, default=0),
+            },
+            # the worker captures the nudge logs itself
+            init_logging=False,
+        )
+
     def _handle_message(self, msg):
+        self._send_objects(self._get_created_objects(msg))
+
+    def _handle_batch(self, msgs):
+        # records from every message in the batch are handled in one call
+        self._send_objects([obj for msg in msgs for obj in self._get_created_objects(msg)])
+
+    def _send_objects(self, objects):
+        if self._prefilter is not None:
+            matching = [obj for obj in objects if self._prefilter.matches(obj['Bucket'], obj['Key'])]
+            if len(matching) < len(objects):
+                _log.info(f'Discarding {len(objects) - len(matching)} S3 objects matching no subscription')
+                self._discarded.inc(len(objects) - len(matching))
+            objects = matching
+
+        if not objects:
+            return
+
+        for obj in objects:
+            _log.info(f'Sending S3 object s3://{obj["Bucket"]}/{obj["Key"]}')
+
+        self._dispatcher.handle_objects_created(objects)
+
+    @staticmethod
+    def _get_created_objects(msg):
         # if msg['Event'] == 's3:TestEvent':
         #     _log.info('Received test event message for bucket {}'.format(msg['Bucket']))
         #     return
@@ -41,24 +121,18 @@ class S3EventsWorker(rv.worker.SqsWorker):
         if msg.get('Type') == 'Notification':
             msg = json.loads(msg['Message'])
 
-        for record in msg.get('Records', []):
-            if 'ObjectCreated' in record['eventName']:
-
-                bucket = record['s3']['bucket']['name']
-                key = record['s3']['object']['key']
-                size = record['s3']['object']['size']
+        return [
+            {
+                'Bucket': record['s3']['bucket']['name'],
+                'Key': record['s3']['object']['key'],
+                'Size': record['s3']['object']['size'],
                 # remove milliseconds and add space between date and time
-                created = record['eventTime'][:-len('.000Z')].replace('T', ' ')
-
-                _log.info(f'Sending S3 object s3://{bucket}/{key}')
-
-                self._nudge_client.handle_object_created(
-                    Bucket=bucket,
-                    Key=key,
-                    Size=size,
-                    Created=created,
-                )
+                'Created': record['eventTime'][:-len('.000Z')].replace('T', ' '),
+            }
+            for record in msg.get('Records', [])
+            if 'ObjectCreated' in record['eventName']
+        ]
 
 
 if __name__ == '__main__':
-    S3EventsWorker().run()
+    rv.worker.Supervisor(S3EventsWorker()).run()
@@ -0,0 +1,68 @@
+import logging
+
+from cached_property import cached_property
+
+import revolio as rv
+import revolio.worker
+
+import nudge
+from nudge.core.client import NudgeClient
+
+
+_log = logging.getLogger(__name__)
+
+
+class SweeperWorker(rv.worker.Worker):
+    """Periodically batch subscriptions whose available elements have passed their trigger's max age.
+
+    Calls the nudge Sweep api at HOST, PORT and VERSION every INTERVAL seconds, up to LIMIT subscriptions at
+    a time. Sweeps are repeated without waiting while they find LIMIT subscriptions. Each subscription is
+    evaluated under its own lock, so several sweepers can run at once. Counts of the subscriptions swept and
+    batches created are exported with the worker metrics.
+    """
+
+    ENV_VAR_PREFIX = 'NDG_WRK_SWP'
+
+    HOST_VAR = 'HOST'
+    PORT_VAR = 'PORT'
+    VERSION_VAR = 'VERSION'
+
+    INTERVAL_VAR = 'INTERVAL'
+    LIMIT_VAR = 'LIMIT'
+
+    def __init__(self):
+        super(SweeperWorker, self).__init__(nudge.__name__)
+        self._swept = self.metrics.counter('worker_subscriptions_swept_total', 'Overdue subscriptions swept')
+        self._batched = self.metrics.counter('worker_batches_created_total', 'Batches created by sweeps')
+
+    @cached_property
+    def _nudge_client(self):
+        return NudgeClient(
+            self.get_env_var(SweeperWorker.HOST_VAR),
+            port=self.get_env_var(SweeperWorker.PORT_VAR),
+            api_version=self.get_env_var(SweeperWorker.VERSION_VAR),
+        )
+
+    @cached_property
+    def _interval(self):
+        return self.get_env_var(SweeperWorker.INTERVAL_VAR, default=60)
+
+    @cached_property
+    def _limit(self):
+        return self.get_env_var(SweeperWorker.LIMIT_VAR, default=100)
+
+    def _task(self):
+        result = self._nudge_client.sweep(Limit=self._limit)
+        num_subs = len(result['SubscriptionIds'])
+        num_batches = len(result['BatchIds'])
+
+        _log.info(f'Swept {num_subs} subscriptions, creating {num_batches} batches')
+        self._swept.inc(num_subs)
+        self._batched.inc(num_batches)
+
+        if num_subs < self._limit:
+            self._sleep(self._interval)
+
+
+if __name__ == '__main__':
+    SweeperWorker().run()
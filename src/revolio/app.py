@@ -1,10 +1,14 @@
 import abc
+import itertools
 import json
 import logging
 import traceback
 
 import flask
 
+import revolio as rv
+import revolio.function
+
 
 _log = logging.getLogger(__name__)
 
@@ -77,8 +81,12 @@ class App(metaclass=abc.ABCMeta):
 
         _log.info('Handling request: {}'.format(f.name))
 
+        streaming = isinstance(f, rv.function.StreamingFunction)
+
         try:
             code, result = 200, f.handle_request(request)
+            if streaming:
+                result = self._prefetch(result)
         except:
             e = traceback.format_exc()
             _log.warning(e)
@@ -86,4 +94,36 @@ class App(metaclass=abc.ABCMeta):
                 'Traceback': e.split('\n'),
             }
 
+        if streaming:
+            if code == 200:
+                return self._stream_response(f, result)
+
+            f.close_stream()
+
         return json.dumps(result), code
+
+    @staticmethod
+    def _prefetch(records):
+        """Produce the first record now, while an error can still change the response status."""
+        records = iter(records)
+        for first in records:
+            return itertools.chain([first], records)
+
+        return iter([])
+
+    @staticmethod
+    def _stream_response(f, records):
+        def generate():
+            try:
+                for record in records:
+                    yield json.dumps(record) + '\n'
+            except:
+                # the status has already been sent, so the error is the last record
+                e = traceback.format_exc()
+                _log.warning(e)
+                yield json.dumps({'Traceback': e.split('\n')}) + '\n'
+            finally:
+                f.close_stream()
+
+        # the request context, and with it the database session, lives until the stream ends
+        return flask.Response(flask.stream_with_context(generate()), mimetype='application/x-ndjson')
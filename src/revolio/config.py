@@ -48,6 +48,9 @@ class ConfigService(metaclass=abc.ABCMeta):
     def __getitem__(self, key):
         return self._config[key]
 
+    def get(self, key, default=None):
+        return self._config.get(key, default)
+
 
 _s3_uri_re = re.compile(r'\As3://(?P<Bucket>.*?)/(?P<Key>.*)\Z')
 
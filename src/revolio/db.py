@@ -1,12 +1,22 @@
+import functools
+import hashlib
 import logging
 
 import flask_sqlalchemy
 import sqlalchemy as sa
+import sqlalchemy.dialects.postgresql
+import sqlalchemy.event
+import sqlalchemy.orm
+import sqlalchemy.orm.attributes
 import sqlalchemy.orm.exc
+import sqlalchemy.orm.util
 
 
 _log = logging.getLogger(__name__)
 
+# key of the session info holding callbacks for the end of the transaction
+_CALLBACKS = 'revolio.db.callbacks'
+
 
 class Database:
 
@@ -60,12 +70,104 @@ class Database:
     def query(self, *args, **kwargs):
         return self._session.query(*args, **kwargs)
 
+    def execute(self, statement, params=None):
+        """Execute a core statement in the current transaction."""
+        return self._session.execute(statement, params)
+
+    def bulk_insert(self, table, columns, rows, *, page_size=1000, skip_conflicts=False, returning=None):
+        """Insert rows of values for the given columns with one multi-row INSERT per page of rows.
+
+        Python-side column defaults are applied to each row. Unlike `add` the ORM is bypassed, so no
+        entities are created in the session.
+
+        Args:
+            skip_conflicts (bool): Skip rows that violate a unique constraint, with ON CONFLICT DO NOTHING.
+            returning (list): Names of columns to return for each inserted row.
+
+        Returns:
+            list: The returned columns of the inserted rows, if any were requested.
+        """
+        rows = list(rows)
+        _log.info(f'Inserting {len(rows)} rows into {table.name}')
+
+        inserted = []
+        for i in range(0, len(rows), page_size):
+            statement = sa.dialects.postgresql.insert(table) if skip_conflicts else table.insert()
+            statement = statement.values([dict(zip(columns, row)) for row in rows[i:i + page_size]])
+            if skip_conflicts:
+                statement = statement.on_conflict_do_nothing()
+            if returning:
+                statement = statement.returning(*[table.c[name] for name in returning])
+
+            result = self.execute(statement)
+            if returning:
+                inserted.extend(result)
+
+        return inserted
+
+    def add_inserted(self, entity):
+        """Add an entity to the session whose row was already inserted, e.g. by `bulk_insert`.
+
+        Unlike `add` the entity is not inserted again when the session is flushed.
+        """
+        sa.orm.make_transient_to_detached(entity)
+        self._session.add(entity)
+        return entity
+
     def flush(self):
         self._session.flush()
 
+    def expire(self, entity, attribute_names=None):
+        """Reload attributes of an entity on next access, e.g. after its row was changed by a core statement."""
+        self._session.expire(entity, attribute_names)
+
+    def set_loaded(self, model, ids, **values):
+        """Set column values on any loaded entities with the given ids, after a core statement set them.
+
+        The entities are neither reloaded nor marked as changed, and entities that are not loaded are left
+        alone.
+        """
+        for id in ids:
+            entity = self._session.identity_map.get(sa.orm.util.identity_key(model, id))
+            if entity is None:
+                continue
+
+            for name, value in values.items():
+                sa.orm.attributes.set_committed_value(entity, name, value)
+
     def rollback(self):
         self._session.rollback()
 
+    def after_commit(self, callback):
+        """Call a function once the current transaction commits, and not at all if it rolls back.
+
+        The function runs after the commit and must not use the database.
+        """
+        self._get_callbacks()['commit'].append(callback)
+
+    def after_rollback(self, callback):
+        """Call a function if the current transaction ends without committing."""
+        self._get_callbacks()['rollback'].append(callback)
+
+    def _get_callbacks(self):
+        session = self._session()
+        if _CALLBACKS not in session.info:
+            session.info[_CALLBACKS] = {'commit': [], 'rollback': []}
+            sa.event.listen(session, 'after_commit', functools.partial(_run_callbacks, 'commit'))
+            sa.event.listen(session, 'after_transaction_end', _end_transaction)
+
+        return session.info[_CALLBACKS]
+
+    def try_advisory_xact_lock(self, name):
+        """Take a postgres advisory lock until the end of the transaction without waiting for it.
+
+        Returns whether the lock was taken. Every process derives the same lock key from the name.
+        """
+        key = int.from_bytes(hashlib.sha1(name.encode('utf-8')).digest()[:8], 'big', signed=True)
+        return self.execute(
+            sa.select([sa.func.pg_try_advisory_xact_lock(sa.bindparam('key', key, type_=sa.BigInteger))])
+        ).scalar()
+
     def get_or_create(self, model, **kwargs):
         try:
             return self._session \
@@ -74,3 +176,17 @@ class Database:
                 .one()
         except sa.orm.exc.NoResultFound:
             return self.add(model(**kwargs))
+
+
+def _run_callbacks(kind, session):
+    callbacks = session.info[_CALLBACKS]
+    to_run = callbacks[kind]
+    callbacks['commit'], callbacks['rollback'] = [], []
+    for callback in to_run:
+        callback()
+
+
+def _end_transaction(session, transaction):
+    # committed transactions already ran their callbacks, and nested transactions are part of their parent
+    if transaction.parent is None:
+        _run_callbacks('rollback', session)
@@ -72,3 +72,21 @@ class Function(metaclass=abc.ABCMeta):
             host=self._ctx.config['Web']['Internal']['RecordSetName'],
             path=self.url_path,
         )
+
+
+class StreamingFunction(Function):
+    """A function whose response is written as newline-delimited JSON while it is produced.
+
+    `handle_request` validates the request and returns an iterable of JSON-serializable records, which is
+    consumed as the response is sent. The first record is produced before the response starts, so errors in
+    setting up the stream are still reported with an error status. `close_stream` is called once the
+    response has ended, either way.
+    """
+
+    @abc.abstractmethod
+    def handle_request(self, request):
+        return iter([])
+
+    def close_stream(self):
+        """Release anything held while the records were produced, e.g. end a database transaction."""
+        pass
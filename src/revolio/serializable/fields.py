@@ -215,6 +215,30 @@ class Nested(Field):
         return self._cls.deserialize(value, key_format=key_format)
 
 
+class List(Field):
+
+    def __init__(self, field, **kwargs):
+        """
+
+        Args:
+            field (Field): The field used to validate and (de)serialize each item.
+        """
+        super().__init__(**kwargs)
+        assert isinstance(field, Field)
+        self._field = field
+
+    def validate(self, value):
+        assert isinstance(value, list)
+        for item in value:
+            self._field.validate(item)
+
+    def serialize(self, value, **kwargs):
+        return [self._field.serialize(item, **kwargs) for item in value]
+
+    def deserialize(self, value, key_format):
+        return [self._field.deserialize(item, key_format=key_format) for item in value]
+
+
 class ObjectEnum(Field):
 
     # todo: implicit nested schema for docs
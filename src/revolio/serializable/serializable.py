@@ -1,4 +1,5 @@
 import collections
+import collections.abc
 import enum
 
 import sqlalchemy as sa
@@ -141,7 +142,7 @@ class Serializable:
             data (Collections.Mapping): The data to deserialize.
             key_format (KeyFormat): The format of field keys in the serialized data.
         """
-        if not isinstance(data, collections.Mapping):
+        if not isinstance(data, collections.abc.Mapping):
             raise Exception('Object to deserialize must be a mapping')
 
         cls._check_extra_fields(data, key_format)
@@ -1,9 +1,11 @@
 import enum
-import re
 
 import sqlalchemy as sa
 import sqlalchemy.dialects.postgresql
 
+import revolio as rv
+import revolio.util.regex
+
 from revolio.serializable import Serializable, KeyFormat
 from revolio.serializable.fields import ObjectEnum
 from revolio.serializable.serializable import format_key
@@ -26,7 +28,8 @@ class Regex(sa.types.TypeDecorator):
         if value is None:
             return None
 
-        return re.compile(value)
+        # rows with the same pattern share a compiled regex
+        return rv.util.regex.compile(value)
 
 
 def serializable(cls):
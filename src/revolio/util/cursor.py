@@ -0,0 +1,21 @@
+import base64
+import datetime as dt
+import json
+
+
+_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+
+def encode(created, id):
+    """Encode the sort key of the last row of a page as an opaque token for requesting the next page."""
+    data = json.dumps([created.strftime(_DATETIME_FORMAT), id])
+    return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+
+def decode(token):
+    """Decode a token made by `encode` back into a (created, id) sort key."""
+    try:
+        created, id = json.loads(base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8'))
+        return dt.datetime.strptime(created, _DATETIME_FORMAT), id
+    except (ValueError, TypeError):
+        raise Exception(f'Invalid continuation token {token}')
@@ -0,0 +1,82 @@
+import functools
+import logging
+import re
+
+
+_log = logging.getLogger(__name__)
+
+# patterns that depend on group numbering or names cannot be combined
+_unsafe_re = re.compile(r'\\[1-9]|\(\?P=|\(\?\(')
+
+_DEFAULT_FLAGS = re.compile('').flags
+
+
+@functools.lru_cache(maxsize=4096)
+def compile(pattern):
+    """Compile a pattern, sharing the result between every caller with the same pattern.
+
+    Unlike the `re` module cache this is not cleared when it fills up with many distinct patterns.
+    """
+    return re.compile(pattern)
+
+
+class CombinedRegex:
+    """Match a string against many patterns with a single call into the regex engine.
+
+    Each pattern becomes an optional lookahead with a named group. The groups that take part in a match
+    give the patterns that match the start of the string, like `re.match`. Patterns that rely on group
+    numbers or names, or set global flags, are matched separately.
+    """
+
+    def __init__(self, patterns):
+        """
+
+        Args:
+            patterns (dict): Patterns or compiled regexes by key. A pattern of None matches any string.
+        """
+        super().__init__()
+        self._always = []
+        self._separate = []
+        combinable = []
+
+        for key, pattern in patterns.items():
+            if pattern is None:
+                self._always.append(key)
+                continue
+
+            regex = compile(pattern) if isinstance(pattern, str) else pattern
+            if regex.groupindex or (regex.flags != _DEFAULT_FLAGS) or _unsafe_re.search(regex.pattern):
+                self._separate.append((key, regex))
+            else:
+                combinable.append((key, regex))
+
+        self._keys = {}
+        self._combined = None
+        if len(combinable) > 1:
+            self._keys = {f'_{i}': key for i, (key, _) in enumerate(combinable)}
+            try:
+                self._combined = re.compile(''.join(
+                    f'(?:(?=(?P<{name}>{regex.pattern})))?'
+                    for name, (_, regex) in zip(self._keys, combinable)
+                ))
+            except (re.error, RecursionError, OverflowError):
+                _log.warning(f'Unable to combine {len(combinable)} patterns, matching them separately')
+                self._keys = {}
+
+        if self._combined is None:
+            self._separate.extend(combinable)
+
+    def match(self, string):
+        """Get the keys of every pattern that matches the start of the string."""
+        keys = list(self._always)
+
+        if self._combined is not None:
+            m = self._combined.match(string)
+            keys.extend(
+                self._keys[name]
+                for name, value in m.groupdict().items()
+                if value is not None
+            )
+
+        keys.extend(key for key, regex in self._separate if regex.match(string))
+        return keys
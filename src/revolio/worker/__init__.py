@@ -0,0 +1,6 @@
+from revolio.worker.backend import QueueBackend, SqsBackend, MemoryBackend
+from revolio.worker.metrics import WorkerMetrics, MetricsServer, MetricsReporter
+from revolio.worker.retry import CircuitBreaker, QuarantineSink, QueueQuarantineSink
+from revolio.worker.worker import BaseWorker, Worker, BaseSqsWorker, SqsWorker, InFlightMessages, Wrapper
+from revolio.worker.aio import AsyncSqsWorker
+from revolio.worker.supervisor import Supervisor
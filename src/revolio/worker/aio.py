@@ -0,0 +1,231 @@
+import abc
+import asyncio
+import functools
+import json
+import logging
+import signal
+import traceback
+import uuid
+import weakref
+
+from revolio.worker.retry import backoff
+from revolio.worker.worker import BaseSqsWorker, InFlightMessages
+
+
+_log = logging.getLogger(__name__)
+
+
+def _current_task():
+    try:
+        try:
+            return asyncio.current_task()
+        except AttributeError:
+            # python < 3.7
+            return asyncio.Task.current_task()
+    except RuntimeError:
+        # no running event loop, e.g. inside an executor thread
+        return None
+
+
+class AsyncSqsWorker(BaseSqsWorker):
+    """An SQS worker that overlaps polling, handling and deleting messages on an event loop.
+
+    Subclasses implement a coroutine `_handle_message`. Blocking calls can be moved off the loop with
+    `_run_in_executor`. Configuration uses the same environment variables as `SqsWorker`, with
+    CONCURRENCY limiting the number of messages handled at once.
+
+    The first SIGTERM or SIGINT stops polling and waits up to DRAIN_TIMEOUT seconds for in-flight messages
+    to be handled. Handlers still running at the deadline, or when a second signal arrives, are cancelled.
+    Messages that were received but not handled are released back to the queue.
+    """
+
+    def __init__(self, namespace, *, queue=None):
+        super().__init__(namespace, queue=queue)
+        self._task_transaction_ids = weakref.WeakKeyDictionary()
+        self._handlers = set()
+        self._cancelled = []
+        self._signals_received = 0
+
+    @property
+    def transaction_id(self):
+        task = _current_task()
+        if (task is not None) and (task in self._task_transaction_ids):
+            return self._task_transaction_ids[task]
+
+        return super().transaction_id
+
+    @transaction_id.setter
+    def transaction_id(self, value):
+        task = _current_task()
+        if task is None:
+            BaseSqsWorker.transaction_id.fset(self, value)
+        else:
+            self._task_transaction_ids[task] = value
+
+    def run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(self._run())
+        finally:
+            loop.close()
+
+    async def _run_in_executor(self, func, *args, **kwargs):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+    async def _run(self):
+        loop = asyncio.get_event_loop()
+
+        # try to allow for graceful shutdown
+        for sig in [signal.SIGTERM, signal.SIGINT]:
+            loop.add_signal_handler(sig, self._on_signal, sig)
+
+        self._start_metrics()
+
+        in_flight = InFlightMessages()
+        slots = asyncio.Semaphore(self._concurrency)
+        heartbeat = asyncio.ensure_future(self._run_heartbeat_async(in_flight))
+
+        _log.info('Started worker: %s' % type(self).__name__)
+        try:
+            errors = 0
+            while not self.stopping:
+                self.transaction_id = str(uuid.uuid4())
+                try:
+                    await self._poll(in_flight, slots)
+                    errors = 0
+                except Exception:
+                    _log.error(json.dumps(traceback.format_exc()))
+
+                    # avoid a hot loop while something is persistently broken
+                    errors += 1
+                    await self._sleep_async(backoff(errors, base=1, max=60))
+
+            await self._drain_async(in_flight)
+        finally:
+            heartbeat.cancel()
+            for sig in [signal.SIGTERM, signal.SIGINT]:
+                loop.remove_signal_handler(sig)
+
+    def _on_signal(self, signum):
+        _log.info('Signal received: %s' % signum)
+        self._signals_received += 1
+        self._signal_received.value = True
+
+        if self._signals_received > 1:
+            self._cancel_handlers()
+
+    def _cancel_handlers(self):
+        _log.info(f'Cancelling {len(self._handlers)} in-flight messages')
+        for handler in self._handlers:
+            handler.cancel()
+
+    async def _drain_async(self, in_flight):
+        """Finish in-flight messages within the drain timeout and release the rest."""
+        released = in_flight.release_pending()
+
+        if self._handlers:
+            _log.info(f'Waiting up to {self._drain_timeout}s for {len(self._handlers)} in-flight messages')
+            _, running = await asyncio.wait(self._handlers, timeout=self._drain_timeout)
+
+            if running:
+                _log.warning('Drain timeout exceeded with messages still being handled')
+                self._cancel_handlers()
+                await asyncio.wait(running)
+
+        # cancelled handlers complete their messages as failed, which stops them being held
+        released.extend(self._cancelled)
+        await self._run_in_executor(self._release_messages, released)
+        await self._run_in_executor(self._delete_messages, in_flight.pop_completed())
+
+    async def _sleep_async(self, seconds):
+        """Sleep for up to `seconds`, waking early if a shutdown signal is received."""
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + seconds
+        while (not self.stopping) and (loop.time() < deadline):
+            await asyncio.sleep(min(1, deadline - loop.time()))
+
+    async def _poll(self, in_flight, slots):
+        await self._run_in_executor(self._delete_messages, in_flight.pop_completed())
+
+        paused = self._breaker.open_for()
+        if paused > 0:
+            _log.warning(f'Pausing polling for {paused:.0f}s after repeated failures')
+            await self._sleep_async(paused)
+            return
+
+        capacity = self._max_in_flight - len(in_flight)
+        if capacity <= 0:
+            # wait for a handler to finish before polling again
+            if self._handlers:
+                await asyncio.wait(self._handlers, return_when=asyncio.FIRST_COMPLETED)
+            return
+
+        msgs = await self._run_in_executor(self._get_messages, max_messages=min(self._batch_size, capacity))
+        for msg in msgs:
+            in_flight.add(msg)
+            handler = asyncio.ensure_future(self._process_in_flight_async(msg, in_flight, slots))
+            self._handlers.add(handler)
+            handler.add_done_callback(self._handlers.discard)
+
+    async def _process_in_flight_async(self, msg, in_flight, slots):
+        async with slots:
+            # released while waiting for a slot
+            if not in_flight.start(msg):
+                return
+
+            success = False
+            try:
+                success = await self._process_message_async(msg)
+            except asyncio.CancelledError:
+                self._cancelled.append(msg)
+                raise
+            finally:
+                in_flight.complete(msg, success)
+
+    async def _process_message_async(self, msg):
+        """Handle a single message and return whether it can be deleted."""
+        m_id = msg['MessageId']
+        body = msg['Body']
+
+        # each message is logged under its own transaction
+        self.transaction_id = str(uuid.uuid4())
+
+        pretty_msg = json.dumps(msg, sort_keys=True, indent=4, separators=(',', ': '))
+        _log.info(f'Received message {pretty_msg}')
+
+        try:
+            with self.metrics.handle_seconds.time():
+                await self._handle_message(json.loads(body))
+        except asyncio.CancelledError:
+            _log.warning(f'Cancelled processing message {m_id}')
+            raise
+        except Exception:
+            error = traceback.format_exc()
+            _log.error('\r'.join([
+                f'Error processing message {m_id}',
+                error,
+            ]))
+            self.metrics.failed.inc()
+            self._breaker.record_failure()
+            return await self._run_in_executor(self._handle_failure, msg, error)
+
+        self.metrics.handled.inc()
+        self._breaker.record_success()
+        return True
+
+    async def _run_heartbeat_async(self, in_flight):
+        while True:
+            await asyncio.sleep(self._heartbeat_interval)
+            try:
+                msgs = in_flight.messages()
+                if msgs:
+                    _log.debug(f'Extending visibility of {len(msgs)} in-flight messages')
+                    await self._run_in_executor(self._extend_visibility, msgs)
+            except Exception:
+                _log.error(json.dumps(traceback.format_exc()))
+
+    @abc.abstractmethod
+    async def _handle_message(self, msg):
+        pass
@@ -0,0 +1,255 @@
+import abc
+import collections
+import logging
+import threading
+import time
+import uuid
+
+
+_log = logging.getLogger(__name__)
+
+
+class QueueBackend(metaclass=abc.ABCMeta):
+    """A message queue with SQS semantics.
+
+    Received messages are dicts in the shape returned by SQS `receive_message`, including the
+    `ApproximateReceiveCount` attribute. Batch operations return a dict of failed receipt handles to
+    error codes.
+    """
+
+    @abc.abstractmethod
+    def receive(self, max_messages, wait_seconds):
+        return []
+
+    @abc.abstractmethod
+    def delete(self, receipts):
+        return {}
+
+    @abc.abstractmethod
+    def change_visibility(self, receipts, timeout):
+        return {}
+
+    @abc.abstractmethod
+    def send(self, body, attributes=None):
+        """Send a message body with optional attributes and return the new message id.
+
+        Attribute values are strings, or numbers which are sent with the Number data type.
+        """
+        pass
+
+
+class SqsBackend(QueueBackend):
+
+    # batch apis accept at most 10 entries
+    MAX_BATCH_SIZE = 10
+
+    def __init__(self, sqs_client, queue_url):
+        super().__init__()
+        self._sqs_client = sqs_client
+        self._queue_url = queue_url
+
+    @property
+    def queue_url(self):
+        return self._queue_url
+
+    def receive(self, max_messages, wait_seconds):
+        r = self._sqs_client.receive_message(
+            QueueUrl=self._queue_url,
+            MaxNumberOfMessages=max_messages,
+            WaitTimeSeconds=wait_seconds,
+            AttributeNames=['ApproximateReceiveCount'],
+        )
+
+        return r.get('Messages', [])
+
+    def delete(self, receipts):
+        failures = self._batch(
+            self._sqs_client.delete_message_batch,
+            [{'ReceiptHandle': receipt} for receipt in receipts],
+        )
+
+        # sender faults (e.g. an expired receipt handle) will fail again if retried
+        for receipt, (code, sender_fault) in list(failures.items()):
+            if not sender_fault:
+                _log.warning(f'Retrying delete of message after batch failure: {code}')
+                self._sqs_client.delete_message(
+                    QueueUrl=self._queue_url,
+                    ReceiptHandle=receipt,
+                )
+                del failures[receipt]
+
+        return {receipt: code for receipt, (code, _) in failures.items()}
+
+    def change_visibility(self, receipts, timeout):
+        failures = self._batch(
+            self._sqs_client.change_message_visibility_batch,
+            [{'ReceiptHandle': receipt, 'VisibilityTimeout': timeout} for receipt in receipts],
+        )
+
+        return {receipt: code for receipt, (code, _) in failures.items()}
+
+    def send(self, body, attributes=None):
+        r = self._sqs_client.send_message(
+            QueueUrl=self._queue_url,
+            MessageBody=body,
+            MessageAttributes={
+                name: _message_attribute(value)
+                for name, value in (attributes or {}).items()
+            },
+        )
+
+        return r['MessageId']
+
+    def _batch(self, call, entries):
+        failures = {}
+        for i in range(0, len(entries), SqsBackend.MAX_BATCH_SIZE):
+            chunk = entries[i:i + SqsBackend.MAX_BATCH_SIZE]
+            r = call(
+                QueueUrl=self._queue_url,
+                Entries=[dict(entry, Id=str(j)) for j, entry in enumerate(chunk)],
+            )
+
+            for failure in r.get('Failed', []):
+                receipt = chunk[int(failure['Id'])]['ReceiptHandle']
+                failures[receipt] = (failure['Code'], failure.get('SenderFault', False))
+
+        return failures
+
+
+def _message_attribute(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {'DataType': 'Number', 'StringValue': str(value)}
+
+    return {'DataType': 'String', 'StringValue': value}
+
+
+_StoredMessage = collections.namedtuple('_StoredMessage', [
+    'id',
+    'body',
+    'attributes',
+    'receipt',
+    'receive_count',
+    'visible_at',
+])
+
+
+class MemoryBackend(QueueBackend):
+    """An in-process queue that honours visibility timeouts and receive counts.
+
+    Intended for tests and local throughput benchmarks of the worker loop.
+    """
+
+    def __init__(self, *, visibility_timeout=30, clock=time.monotonic):
+        super().__init__()
+        self._visibility_timeout = visibility_timeout
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._msgs = collections.OrderedDict()
+        # only the receipt from the latest receive of a message is valid
+        self._receipts = {}
+
+    def __len__(self):
+        with self._cond:
+            return len(self._msgs)
+
+    @property
+    def visible_count(self):
+        with self._cond:
+            return len(self._visible())
+
+    def receive(self, max_messages, wait_seconds):
+        deadline = self._clock() + wait_seconds
+
+        with self._cond:
+            while True:
+                visible = self._visible(limit=max_messages)
+                remaining = deadline - self._clock()
+                if visible or (remaining <= 0):
+                    break
+
+                self._cond.wait(timeout=min(remaining, self._until_next_visible()))
+
+            return [self._receive(m) for m in visible]
+
+    def delete(self, receipts):
+        with self._cond:
+            failures = {}
+            for receipt in receipts:
+                m = self._by_receipt(receipt)
+                if m is None:
+                    failures[receipt] = 'ReceiptHandleIsInvalid'
+                else:
+                    del self._msgs[m.id]
+                    del self._receipts[receipt]
+
+            return failures
+
+    def change_visibility(self, receipts, timeout):
+        with self._cond:
+            failures = {}
+            for receipt in receipts:
+                m = self._by_receipt(receipt)
+                if m is None:
+                    failures[receipt] = 'ReceiptHandleIsInvalid'
+                else:
+                    self._msgs[m.id] = m._replace(visible_at=self._clock() + timeout)
+
+            self._cond.notify_all()
+            return failures
+
+    def send(self, body, attributes=None):
+        with self._cond:
+            m_id = str(uuid.uuid4())
+            self._msgs[m_id] = _StoredMessage(
+                id=m_id,
+                body=body,
+                attributes=dict(attributes or {}),
+                receipt=None,
+                receive_count=0,
+                visible_at=self._clock(),
+            )
+
+            self._cond.notify_all()
+            return m_id
+
+    def _visible(self, limit=None):
+        now = self._clock()
+        visible = []
+        for m in self._msgs.values():
+            if m.visible_at <= now:
+                visible.append(m)
+                if len(visible) == limit:
+                    break
+
+        return visible
+
+    def _until_next_visible(self):
+        if not self._msgs:
+            return float('inf')
+
+        return max(0, min(m.visible_at for m in self._msgs.values()) - self._clock())
+
+    def _by_receipt(self, receipt):
+        m_id = self._receipts.get(receipt)
+        return self._msgs[m_id] if (m_id is not None) else None
+
+    def _receive(self, m):
+        self._receipts.pop(m.receipt, None)
+        m = m._replace(
+            receipt=str(uuid.uuid4()),
+            receive_count=m.receive_count + 1,
+            visible_at=self._clock() + self._visibility_timeout,
+        )
+        self._msgs[m.id] = m
+        self._receipts[m.receipt] = m.id
+
+        return {
+            'MessageId': m.id,
+            'ReceiptHandle': m.receipt,
+            'Body': m.body,
+            'Attributes': {'ApproximateReceiveCount': str(m.receive_count)},
+            'MessageAttributes': {
+                name: _message_attribute(value)
+                for name, value in m.attributes.items()
+            },
+        }
@@ -0,0 +1,229 @@
+import bisect
+import collections
+import http.server
+import json
+import logging
+import sys
+import threading
+import time
+import traceback
+
+
+_log = logging.getLogger(__name__)
+
+
+class Counter:
+
+    def __init__(self, name, description):
+        super().__init__()
+        self.name = name
+        self.description = description
+        self._lock = threading.Lock()
+        self._value = 0
+
+    @property
+    def value(self):
+        return self._value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def snapshot(self):
+        return self._value
+
+    def render(self):
+        return [
+            f'# HELP {self.name} {self.description}',
+            f'# TYPE {self.name} counter',
+            f'{self.name} {self._value}',
+        ]
+
+
+class Histogram:
+    """Cumulative histogram of observed durations in seconds."""
+
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self, name, description, buckets=DEFAULT_BUCKETS):
+        super().__init__()
+        self.name = name
+        self.description = description
+        self._buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # the last count is for observations above every bucket
+        self._counts = [0] * (len(self._buckets) + 1)
+        self._sum = 0
+
+    @property
+    def count(self):
+        return sum(self._counts)
+
+    def observe(self, value):
+        with self._lock:
+            self._counts[bisect.bisect_left(self._buckets, value)] += 1
+            self._sum += value
+
+    def time(self):
+        """Context manager that observes the duration of its block."""
+        return _Timer(self)
+
+    def snapshot(self):
+        with self._lock:
+            count = sum(self._counts)
+            return {
+                'count': count,
+                'sum': self._sum,
+                'mean': (self._sum / count) if count else 0,
+            }
+
+    def render(self):
+        with self._lock:
+            lines = [
+                f'# HELP {self.name} {self.description}',
+                f'# TYPE {self.name} histogram',
+            ]
+
+            cumulative = 0
+            for bound, count in zip(self._buckets, self._counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+
+            cumulative += self._counts[-1]
+            lines.extend([
+                f'{self.name}_bucket{{le="+Inf"}} {cumulative}',
+                f'{self.name}_sum {self._sum}',
+                f'{self.name}_count {cumulative}',
+            ])
+
+            return lines
+
+
+class _Timer:
+
+    def __init__(self, histogram):
+        super().__init__()
+        self._histogram = histogram
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._histogram.observe(time.monotonic() - self._start)
+
+
+class WorkerMetrics:
+    """Throughput and latency of a worker's poll and handle loop."""
+
+    def __init__(self, prefix='worker'):
+        super().__init__()
+        self._metrics = collections.OrderedDict()
+
+        self.polls = self._add(Counter(f'{prefix}_polls_total', 'Receive calls made'))
+        self.empty_polls = self._add(Counter(f'{prefix}_empty_polls_total', 'Receive calls that returned no messages'))
+        self.received = self._add(Counter(f'{prefix}_messages_received_total', 'Messages received'))
+        self.handled = self._add(Counter(f'{prefix}_messages_handled_total', 'Messages handled successfully'))
+        self.failed = self._add(Counter(f'{prefix}_messages_failed_total', 'Messages whose handler raised'))
+        self.deleted = self._add(Counter(f'{prefix}_messages_deleted_total', 'Messages deleted from the queue'))
+        self.released = self._add(Counter(f'{prefix}_messages_released_total', 'Messages released unprocessed'))
+        self.quarantined = self._add(Counter(f'{prefix}_messages_quarantined_total', 'Messages quarantined'))
+        self.poll_seconds = self._add(Histogram(f'{prefix}_poll_seconds', 'Receive call latency'))
+        self.handle_seconds = self._add(Histogram(f'{prefix}_handle_seconds', 'Per-message handling latency'))
+
+    def counter(self, name, description):
+        """Add a counter for a worker-specific event."""
+        return self._add(Counter(name, description))
+
+    def histogram(self, name, description, **kwargs):
+        """Add a histogram for a worker-specific duration."""
+        return self._add(Histogram(name, description, **kwargs))
+
+    def _add(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    @property
+    def empty_poll_ratio(self):
+        polls = self.polls.value
+        return (self.empty_polls.value / polls) if polls else 0
+
+    def snapshot(self):
+        snapshot = collections.OrderedDict(
+            (name, metric.snapshot()) for name, metric in self._metrics.items()
+        )
+        snapshot['empty_poll_ratio'] = self.empty_poll_ratio
+        return snapshot
+
+    def render(self):
+        """The metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsServer:
+    """Serve worker metrics over HTTP from a daemon thread."""
+
+    def __init__(self, metrics, port, host='0.0.0.0'):
+        super().__init__()
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # scrapes would otherwise be written to stderr
+                pass
+
+        self._server = http.server.HTTPServer((host, port), Handler)
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def start(self):
+        thread = threading.Thread(target=self._server.serve_forever, name='metrics', daemon=True)
+        thread.start()
+        _log.info(f'Serving metrics on port {self.port}')
+        return thread
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class MetricsReporter:
+    """Write a JSON snapshot of worker metrics to stdout at a fixed interval."""
+
+    def __init__(self, metrics, interval, stream=None):
+        super().__init__()
+        self._metrics = metrics
+        self._interval = interval
+        self._stream = stream or sys.stdout
+
+    def start(self):
+        thread = threading.Thread(target=self._run, name='metrics', daemon=True)
+        thread.start()
+        return thread
+
+    def report(self):
+        self._stream.write(json.dumps({'metrics': self._metrics.snapshot()}) + '\n')
+        self._stream.flush()
+
+    def _run(self):
+        while True:
+            time.sleep(self._interval)
+            try:
+                self.report()
+            except Exception:
+                _log.error(json.dumps(traceback.format_exc()))
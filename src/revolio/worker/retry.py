@@ -0,0 +1,84 @@
+import abc
+import logging
+import threading
+import time
+
+
+_log = logging.getLogger(__name__)
+
+
+def backoff(attempt, base, max):
+    """Exponential backoff in whole seconds for the given 1-indexed attempt."""
+    return int(min(base * (2 ** (attempt - 1)), max))
+
+
+class CircuitBreaker:
+    """Pause work while a downstream dependency keeps failing.
+
+    The breaker opens after `threshold` consecutive failures and stays open for `cooldown` seconds. Work
+    resumes once the cooldown passes, but the next failure reopens the breaker until a success closes it.
+    """
+
+    def __init__(self, threshold, cooldown):
+        super().__init__()
+        self._threshold = threshold
+        self._cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened = None
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self._threshold:
+                if self._opened is None:
+                    _log.warning(f'Circuit opened after {self._failures} consecutive failures')
+                self._opened = time.monotonic()
+
+    def open_for(self):
+        """The number of seconds until work should resume, or 0 if the breaker is not open."""
+        with self._lock:
+            if self._opened is None:
+                return 0
+
+            return max(0, self._opened + self._cooldown - time.monotonic())
+
+
+class QuarantineSink(metaclass=abc.ABCMeta):
+    """Destination for messages that have exhausted their retry budget."""
+
+    @abc.abstractmethod
+    def put(self, msg, error):
+        """Store the received message along with the last error raised while handling it."""
+        pass
+
+
+class QueueQuarantineSink(QuarantineSink):
+    """Quarantine messages by sending them to another queue."""
+
+    # message attributes count towards the message size limit
+    MAX_ERROR_LENGTH = 1024
+
+    def __init__(self, queue):
+        """
+
+        Args:
+            queue (revolio.worker.backend.QueueBackend): The quarantine queue.
+        """
+        super().__init__()
+        self._queue = queue
+
+    def put(self, msg, error):
+        self._queue.send(
+            msg['Body'],
+            attributes={
+                'SourceMessageId': msg['MessageId'],
+                'ReceiveCount': int(msg.get('Attributes', {}).get('ApproximateReceiveCount', 1)),
+                'Error': error[-QueueQuarantineSink.MAX_ERROR_LENGTH:] or 'Unknown',
+            },
+        )
@@ -0,0 +1,111 @@
+import functools
+import json
+import logging
+import os
+import signal
+import time
+import traceback
+
+from revolio.worker.worker import Wrapper
+
+
+_log = logging.getLogger(__name__)
+
+
+class Supervisor:
+    """Run a worker in several forked processes and restart any that exit.
+
+    The worker is built in the parent and each child calls its `run` method, so the worker must not open
+    connections before `run`. SIGTERM and SIGINT are forwarded to every child to trigger its graceful
+    shutdown, after which the supervisor waits for the children to exit.
+    """
+
+    PROCESSES_VAR = 'PROCESSES'
+
+    def __init__(self, worker, *, processes=None, restart_delay=1):
+        """
+
+        Args:
+            worker (revolio.worker.BaseWorker): The worker to run in each child process.
+            processes (int): The number of child processes. Defaults to the worker's PROCESSES env var or 1.
+            restart_delay (float): Seconds to wait before replacing a child that exited.
+        """
+        super().__init__()
+        self._worker = worker
+        self._processes = processes if (processes is not None) \
+            else worker.get_env_var(Supervisor.PROCESSES_VAR, default=1)
+        self._restart_delay = restart_delay
+        # process indexes by pid
+        self._children = {}
+
+    def run(self):
+        signal_received = Wrapper(False)
+        partial = functools.partial(self._forward_signal, signal_received)
+
+        for sig in [signal.SIGTERM, signal.SIGINT]:
+            signal.signal(sig, partial)
+
+        _log.info(f'Starting {self._processes} {type(self._worker).__name__} processes')
+        for index in range(self._processes):
+            self._spawn(index)
+
+        while self._children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+
+            if pid not in self._children:
+                continue
+
+            index = self._children.pop(pid)
+            if signal_received.value:
+                _log.info(f'Worker process {pid} exited with status {status}')
+                continue
+
+            _log.warning(f'Worker process {pid} exited unexpectedly with status {status}; restarting')
+            time.sleep(self._restart_delay)
+
+            # a signal received while waiting was not forwarded to the replacement
+            if signal_received.value:
+                _log.info(f'Not restarting worker process {index} after signal')
+                continue
+
+            self._spawn(index)
+
+        _log.info('All worker processes have exited')
+
+    def _spawn(self, index):
+        pid = os.fork()
+        if pid != 0:
+            _log.info(f'Started worker process {pid}')
+            self._children[pid] = index
+            return
+
+        # child process
+        # exit immediately on signals received before the worker installs its own handlers
+        for sig in [signal.SIGTERM, signal.SIGINT]:
+            signal.signal(sig, signal.SIG_DFL)
+
+        self._worker.process_index = index
+
+        code = 0
+        try:
+            self._worker.run()
+        except BaseException:
+            _log.error(json.dumps(traceback.format_exc()))
+            code = 1
+        finally:
+            # skip the parent's cleanup handlers
+            os._exit(code)
+
+    # noinspection PyUnusedLocal
+    def _forward_signal(self, signal_received, signum, frame):
+        _log.info('Signal received: %s' % signum)
+        signal_received.value = True
+
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
@@ -0,0 +1,650 @@
+import concurrent.futures
+import functools
+import json
+import abc
+import logging
+import os
+import threading
+import time
+import traceback
+import signal
+import uuid
+
+import boto3
+from cached_property import cached_property
+
+import revolio as rv
+import revolio.logging
+from revolio.worker.backend import SqsBackend
+from revolio.worker.metrics import WorkerMetrics, MetricsServer, MetricsReporter
+from revolio.worker.retry import backoff, CircuitBreaker, QueueQuarantineSink
+
+
+_log = logging.getLogger(__name__)
+
+# constant to differentiate between a missing default and a default of None
+_NO_DEFAULT = object()
+
+
+class BaseWorker(metaclass=abc.ABCMeta):
+    """Configuration, logging, metrics and shutdown signalling shared by every kind of worker."""
+
+    # metrics
+    METRICS_PORT_VAR = 'METRICS_PORT'
+    METRICS_INTERVAL_VAR = 'METRICS_INTERVAL'
+
+    def __init__(self, namespace):
+        super().__init__()
+        # messages may be handled on several threads at once
+        self._local = threading.local()
+        self._signal_received = Wrapper(False)
+        self.metrics = WorkerMetrics()
+        # set by the supervisor in each child process
+        self.process_index = 0
+
+        handler = logging.StreamHandler()
+        handler.addFilter(rv.logging.WorkerRequestIdFilter(self))
+        handler.setLevel(logging.DEBUG)
+
+        for name in [namespace, revolio.__name__, 'sqlalchemy.engine']:
+            logger = logging.getLogger(name)
+            logger.setLevel(logging.DEBUG)
+            logger.addHandler(handler)
+
+    @property
+    @abc.abstractmethod
+    def ENV_VAR_PREFIX(self):
+        return 'REVOLIO'
+
+    def get_env_var_name(self, key):
+        return f'{self.ENV_VAR_PREFIX}_{key}'
+
+    def get_env_var(self, key, default=_NO_DEFAULT):
+        name = self.get_env_var_name(key)
+        if (name not in os.environ) and (default is not _NO_DEFAULT):
+            return default
+
+        return json.loads(os.environ[name])
+
+    @property
+    def transaction_id(self):
+        return getattr(self._local, 'transaction_id', None)
+
+    @transaction_id.setter
+    def transaction_id(self, value):
+        self._local.transaction_id = value
+
+    @property
+    def stopping(self):
+        """Whether a shutdown signal has been received."""
+        return self._signal_received.value
+
+    def _sleep(self, seconds):
+        """Sleep for up to `seconds`, waking early if a shutdown signal is received."""
+        deadline = time.monotonic() + seconds
+        while (not self.stopping) and (time.monotonic() < deadline):
+            time.sleep(min(1, deadline - time.monotonic()))
+
+    @cached_property
+    def _metrics_port(self):
+        """The port to serve metrics on over HTTP, if any. Supervised processes use consecutive ports."""
+        return self.get_env_var(BaseWorker.METRICS_PORT_VAR, default=None)
+
+    @cached_property
+    def _metrics_interval(self):
+        """The number of seconds between metrics snapshots written to stdout, if any."""
+        return self.get_env_var(BaseWorker.METRICS_INTERVAL_VAR, default=None)
+
+    def _start_metrics(self):
+        """Start exporting `metrics`, if configured."""
+        if self._metrics_port is not None:
+            # each supervised process serves on its own port
+            MetricsServer(self.metrics, self._metrics_port + self.process_index).start()
+
+        if self._metrics_interval is not None:
+            MetricsReporter(self.metrics, self._metrics_interval).start()
+
+
+class Worker(BaseWorker):
+    """A worker that repeats `_task` on the main thread until a shutdown signal is received."""
+
+    def run(self):
+        partial = functools.partial(_handler, self._signal_received)
+
+        # try to allow for graceful shutdown
+        for sig in [signal.SIGTERM, signal.SIGINT]:
+            signal.signal(sig, partial)
+
+        self._start_metrics()
+
+        _log.info('Started worker: %s' % type(self).__name__)
+        errors = 0
+        while not self.stopping:
+            try:
+                self.transaction_id = str(uuid.uuid4())
+                self._task()
+                errors = 0
+            except Exception:
+                _log.error(json.dumps(traceback.format_exc()))
+
+                # avoid a hot loop while something is persistently broken
+                errors += 1
+                self._sleep(backoff(errors, base=1, max=60))
+
+        self._shutdown()
+
+    @abc.abstractmethod
+    def _task(self):
+        pass
+
+    def _shutdown(self):
+        """Clean up after the last task once a shutdown signal has been received."""
+        pass
+
+
+class Wrapper(object):
+    def __init__(self, value):
+        self.value = value
+
+
+# noinspection PyUnusedLocal
+def _handler(signal_received, signum, frame):
+    _log.info('Signal received: %s' % signum)
+    signal_received.value = True
+
+
+class BaseSqsWorker(BaseWorker):
+    """Configuration and queue operations shared by workers that consume an SQS queue."""
+
+    QUEUE_URL_VAR = 'QUEUE_URL'
+    BATCH_SIZE_VAR = 'BATCH_SIZE'
+
+    # concurrent mode
+    CONCURRENCY_VAR = 'CONCURRENCY'
+    MAX_IN_FLIGHT_VAR = 'MAX_IN_FLIGHT'
+    HEARTBEAT_INTERVAL_VAR = 'HEARTBEAT_INTERVAL'
+    VISIBILITY_TIMEOUT_VAR = 'VISIBILITY_TIMEOUT'
+
+    # shutdown
+    DRAIN_TIMEOUT_VAR = 'DRAIN_TIMEOUT'
+
+    # retries
+    MAX_RECEIVES_VAR = 'MAX_RECEIVES'
+    BACKOFF_BASE_VAR = 'BACKOFF_BASE'
+    BACKOFF_MAX_VAR = 'BACKOFF_MAX'
+    QUARANTINE_QUEUE_URL_VAR = 'QUARANTINE_QUEUE_URL'
+    BREAKER_THRESHOLD_VAR = 'BREAKER_THRESHOLD'
+    BREAKER_COOLDOWN_VAR = 'BREAKER_COOLDOWN'
+
+    # receive_message and delete_message_batch accept at most 10 messages
+    MAX_BATCH_SIZE = 10
+
+    def __init__(self, namespace, *, queue=None):
+        """
+
+        Args:
+            namespace (str): The logger namespace to capture.
+            queue (revolio.worker.backend.QueueBackend): The queue to consume. Defaults to the SQS queue at
+                the worker's QUEUE_URL env var.
+        """
+        super().__init__(namespace)
+        self._queue_backend = queue
+
+    @cached_property
+    def _queue_url(self):
+        return self.get_env_var(BaseSqsWorker.QUEUE_URL_VAR)
+
+    @cached_property
+    def _queue_region(self):
+        # https://sqs.{region}.amazonaws.com/{account_id}/{name}
+        return self._queue_url.split('.', 2)[1]
+
+    @cached_property
+    def _sqs_client(self):
+        return boto3.client('sqs', region_name=self._queue_region)
+
+    @cached_property
+    def _queue(self):
+        if self._queue_backend is not None:
+            return self._queue_backend
+
+        return SqsBackend(self._sqs_client, self._queue_url)
+
+    @cached_property
+    def _batch_size(self):
+        batch_size = self.get_env_var(BaseSqsWorker.BATCH_SIZE_VAR, default=1)
+        if not (1 <= batch_size <= BaseSqsWorker.MAX_BATCH_SIZE):
+            raise Exception(f'Batch size must be between 1 and {BaseSqsWorker.MAX_BATCH_SIZE}, got {batch_size}')
+
+        return batch_size
+
+    @cached_property
+    def _concurrency(self):
+        """The number of threads handling messages. Messages are handled on the polling thread if 1."""
+        return self.get_env_var(BaseSqsWorker.CONCURRENCY_VAR, default=1)
+
+    @cached_property
+    def _max_in_flight(self):
+        """The number of messages that can be received but not yet deleted at once."""
+        return self.get_env_var(BaseSqsWorker.MAX_IN_FLIGHT_VAR, default=self._concurrency + self._batch_size)
+
+    @cached_property
+    def _heartbeat_interval(self):
+        return self.get_env_var(BaseSqsWorker.HEARTBEAT_INTERVAL_VAR, default=60)
+
+    @cached_property
+    def _visibility_timeout(self):
+        """The visibility timeout set on in-flight messages by each heartbeat."""
+        return self.get_env_var(BaseSqsWorker.VISIBILITY_TIMEOUT_VAR, default=300)
+
+    @cached_property
+    def _drain_timeout(self):
+        """The number of seconds to wait for in-flight messages after a shutdown signal before releasing them."""
+        return self.get_env_var(BaseSqsWorker.DRAIN_TIMEOUT_VAR, default=20)
+
+    @cached_property
+    def _max_receives(self):
+        """The number of times a message can be received before it is quarantined.
+
+        The default is below the redrive limit of 3 receives on nudge's queues, so a failing message is
+        quarantined before it can be moved to a dead-letter queue.
+        """
+        return self.get_env_var(BaseSqsWorker.MAX_RECEIVES_VAR, default=2)
+
+    @cached_property
+    def _backoff_base(self):
+        return self.get_env_var(BaseSqsWorker.BACKOFF_BASE_VAR, default=5)
+
+    @cached_property
+    def _backoff_max(self):
+        return self.get_env_var(BaseSqsWorker.BACKOFF_MAX_VAR, default=300)
+
+    @cached_property
+    def _quarantine(self):
+        """The sink for messages that exceed their retry budget, if configured."""
+        queue_url = self.get_env_var(BaseSqsWorker.QUARANTINE_QUEUE_URL_VAR, default=None)
+        if queue_url is None:
+            return None
+
+        return QueueQuarantineSink(SqsBackend(self._sqs_client, queue_url))
+
+    @cached_property
+    def _breaker(self):
+        return CircuitBreaker(
+            threshold=self.get_env_var(BaseSqsWorker.BREAKER_THRESHOLD_VAR, default=5),
+            cooldown=self.get_env_var(BaseSqsWorker.BREAKER_COOLDOWN_VAR, default=30),
+        )
+
+    def _get_messages(self, max_messages=None):
+        _log.debug('Polling for messages')
+        with self.metrics.poll_seconds.time():
+            msgs = self._queue.receive(
+                max_messages=max_messages or self._batch_size,
+                wait_seconds=20,
+            )
+
+        self.metrics.polls.inc()
+        self.metrics.received.inc(len(msgs))
+        if not msgs:
+            self.metrics.empty_polls.inc()
+
+        return msgs
+
+    def _delete_messages(self, msgs):
+        if not msgs:
+            return
+
+        _log.debug('Deleting messages {}'.format([msg['MessageId'] for msg in msgs]))
+        failures = self._queue.delete([msg['ReceiptHandle'] for msg in msgs])
+        self.metrics.deleted.inc(len(msgs) - len(failures))
+        self._log_failures('delete', msgs, failures)
+
+    def _extend_visibility(self, msgs):
+        self._change_visibility(msgs, self._visibility_timeout)
+
+    def _release_messages(self, msgs):
+        """Make received messages visible again so that another worker can pick them up immediately."""
+        if msgs:
+            _log.info('Releasing unprocessed messages {}'.format([msg['MessageId'] for msg in msgs]))
+            self._change_visibility(msgs, 0)
+            self.metrics.released.inc(len(msgs))
+
+    def _change_visibility(self, msgs, timeout):
+        failures = self._queue.change_visibility([msg['ReceiptHandle'] for msg in msgs], timeout)
+        self._log_failures('change visibility of', msgs, failures)
+
+    @staticmethod
+    def _log_failures(action, msgs, failures):
+        for msg in msgs:
+            if msg['ReceiptHandle'] in failures:
+                _log.warning(f'Failed to {action} message {msg["MessageId"]}: {failures[msg["ReceiptHandle"]]}')
+
+    def _handle_failure(self, msg, error):
+        """Apply the retry budget to a failed message and return whether it can be deleted.
+
+        Messages within their budget are hidden for an exponentially increasing backoff. Messages past their
+        budget are moved to the quarantine sink when one is configured, otherwise they are left for the queue's
+        redrive policy.
+        """
+        m_id = msg['MessageId']
+        receive_count = int(msg.get('Attributes', {}).get('ApproximateReceiveCount', 1))
+
+        try:
+            if (receive_count >= self._max_receives) and (self._quarantine is not None):
+                _log.error(f'Quarantining message {m_id} after {receive_count} receives')
+                self._quarantine.put(msg, error)
+                self.metrics.quarantined.inc()
+                return True
+
+            timeout = backoff(receive_count, base=self._backoff_base, max=self._backoff_max)
+            _log.info(f'Retrying message {m_id} in {timeout}s after {receive_count} receives')
+            self._change_visibility([msg], timeout)
+        except Exception:
+            _log.error('\r'.join([
+                f'Error applying retry policy to message {m_id}',
+                traceback.format_exc(),
+            ]))
+
+        return False
+
+    @abc.abstractmethod
+    def _handle_message(self, msg):
+        pass
+
+
+class SqsWorker(BaseSqsWorker, Worker):
+    """Consume an SQS queue, handling messages on the polling thread or on a pool of threads."""
+
+    # subclasses that can handle several messages at once define `_handle_batch(msgs)`
+    # it is used for each received batch when messages are handled on the polling thread
+    _handle_batch = None
+
+    @cached_property
+    def _executor(self):
+        return concurrent.futures.ThreadPoolExecutor(max_workers=self._concurrency)
+
+    @cached_property
+    def _in_flight(self):
+        return InFlightMessages()
+
+    @cached_property
+    def _heartbeat(self):
+        thread = threading.Thread(target=self._run_heartbeat, name='heartbeat', daemon=True)
+        thread.start()
+        return thread
+
+    @cached_property
+    def _deadline(self):
+        thread = threading.Thread(target=self._run_deadline, name='deadline', daemon=True)
+        thread.start()
+        return thread
+
+    def _run_heartbeat(self):
+        while True:
+            time.sleep(self._heartbeat_interval)
+            try:
+                msgs = self._in_flight.messages()
+                if msgs:
+                    _log.debug(f'Extending visibility of {len(msgs)} in-flight messages')
+                    self._extend_visibility(msgs)
+            except Exception:
+                _log.error(json.dumps(traceback.format_exc()))
+
+    def _run_deadline(self):
+        """Release the messages held by the polling thread if they are not handled within the drain timeout."""
+        while not self.stopping:
+            time.sleep(1)
+
+        time.sleep(self._drain_timeout)
+        self._release_unfinished()
+
+    def _release_unfinished(self):
+        # handlers cannot be interrupted, so the worker exits once they return, but their messages can
+        # already be received elsewhere
+        unfinished = self._in_flight.release_unfinished()
+        if unfinished:
+            _log.warning(f'Drain timeout exceeded, releasing {len(unfinished)} messages still being handled')
+            self._release_messages(unfinished)
+
+    def _wait_for_breaker(self):
+        paused = self._breaker.open_for()
+        if paused > 0:
+            _log.warning(f'Pausing polling for {paused:.0f}s after repeated failures')
+            self._sleep(paused)
+
+    def _task(self):
+        self._wait_for_breaker()
+        if self.stopping:
+            return
+
+        if self._concurrency > 1:
+            return self._task_concurrent()
+
+        # the deadline thread is started on first use
+        if not self._deadline.is_alive():
+            raise Exception('Deadline thread has stopped')
+
+        msgs = self._get_messages()
+        for msg in msgs:
+            self._in_flight.add(msg)
+
+        self._process_messages(msgs)
+        # messages released at the drain deadline are no longer held
+        self._delete_messages(self._in_flight.pop_completed())
+
+    def _process_messages(self, msgs):
+        """Handle received messages on the polling thread, completing them in `_in_flight`."""
+        if (self._handle_batch is not None) and (len(msgs) > 1):
+            if self._process_batch(msgs):
+                for msg in msgs:
+                    self._in_flight.complete(msg, True)
+                return
+
+        for msg in msgs:
+            if self.stopping:
+                self._release_messages(self._in_flight.release_pending())
+                break
+
+            # released at the drain deadline while an earlier message was handled
+            if self._in_flight.start(msg):
+                self._in_flight.complete(msg, self._process_message(msg))
+
+    def _process_batch(self, msgs):
+        """Handle messages together with `_handle_batch` and return whether they can all be deleted.
+
+        If the batch fails, the messages are handled one at a time so that a single bad message only fails
+        itself.
+        """
+        self.transaction_id = str(uuid.uuid4())
+        _log.info('Received messages {}'.format([msg['MessageId'] for msg in msgs]))
+
+        try:
+            with self.metrics.handle_seconds.time():
+                self._handle_batch([json.loads(msg['Body']) for msg in msgs])
+        except Exception:
+            _log.warning('\r'.join([
+                f'Error processing batch of {len(msgs)} messages, retrying them individually',
+                traceback.format_exc(),
+            ]))
+            return False
+
+        self.metrics.handled.inc(len(msgs))
+        self._breaker.record_success()
+        return True
+
+    def _task_concurrent(self):
+        # the heartbeat thread is started on first use
+        if not self._heartbeat.is_alive():
+            raise Exception('Heartbeat thread has stopped')
+
+        # waiting in short steps notices a shutdown signal while the worker is at capacity
+        while not self._in_flight.wait_for_capacity(self._max_in_flight, timeout=1):
+            if self.stopping:
+                return
+
+        self._delete_messages(self._in_flight.pop_completed())
+
+        # a long poll now would delay the drain
+        if self.stopping:
+            return
+
+        capacity = self._max_in_flight - len(self._in_flight)
+        for msg in self._get_messages(max_messages=min(self._batch_size, capacity)):
+            self._in_flight.add(msg)
+            self._executor.submit(self._process_in_flight, msg)
+
+    def _process_in_flight(self, msg):
+        # released while waiting for a thread
+        if not self._in_flight.start(msg):
+            return
+
+        success = False
+        try:
+            success = self._process_message(msg)
+        finally:
+            self._in_flight.complete(msg, success)
+
+    def _shutdown(self):
+        if self._concurrency > 1:
+            self._drain()
+
+    def _drain(self):
+        """Finish in-flight messages within the drain timeout and release the rest."""
+        self._release_messages(self._in_flight.release_pending())
+
+        _log.info(f'Waiting up to {self._drain_timeout}s for {len(self._in_flight)} in-flight messages')
+        if not self._in_flight.wait_for_handlers(timeout=self._drain_timeout):
+            self._release_unfinished()
+
+        self._delete_messages(self._in_flight.pop_completed())
+        self._executor.shutdown(wait=False)
+
+    def _process_message(self, msg):
+        """Handle a single message and return whether it can be deleted.
+
+        Failed messages are either quarantined or left on the queue to be redelivered after a backoff.
+        """
+        m_id = msg['MessageId']
+        body = msg['Body']
+
+        # each message is logged under its own transaction
+        self.transaction_id = str(uuid.uuid4())
+
+        pretty_msg = json.dumps(msg, sort_keys=True, indent=4, separators=(',', ': '))
+        _log.info(f'Received message {pretty_msg}')
+
+        try:
+            with self.metrics.handle_seconds.time():
+                self._handle_message(json.loads(body))
+        except Exception:
+            error = traceback.format_exc()
+            _log.error('\r'.join([
+                f'Error processing message {m_id}',
+                error,
+            ]))
+            self.metrics.failed.inc()
+            self._breaker.record_failure()
+            return self._handle_failure(msg, error)
+
+        self.metrics.handled.inc()
+        self._breaker.record_success()
+        return True
+
+
+class InFlightMessages:
+    """Thread-safe record of messages that have been received but not yet deleted."""
+
+    def __init__(self):
+        super().__init__()
+        self._cond = threading.Condition()
+        self._msgs = {}
+        self._started = set()
+        self._completed = []
+
+    def __len__(self):
+        with self._cond:
+            return len(self._msgs)
+
+    def add(self, msg):
+        with self._cond:
+            self._msgs[msg['MessageId']] = msg
+
+    def start(self, msg):
+        """Mark a message as being handled and return whether it is still held."""
+        with self._cond:
+            if msg['MessageId'] not in self._msgs:
+                return False
+
+            self._started.add(msg['MessageId'])
+            return True
+
+    def complete(self, msg, success):
+        """Mark a message as handled.
+
+        Successful messages are held until popped for deletion. Failed messages are released immediately.
+        Messages that are no longer held, e.g. because they were released at the drain deadline, are ignored.
+        """
+        with self._cond:
+            self._started.discard(msg['MessageId'])
+            if msg['MessageId'] in self._msgs:
+                if success:
+                    self._completed.append(msg)
+                else:
+                    del self._msgs[msg['MessageId']]
+
+            self._cond.notify_all()
+
+    def messages(self):
+        with self._cond:
+            return list(self._msgs.values())
+
+    def pop_completed(self):
+        with self._cond:
+            completed, self._completed = self._completed, []
+            for msg in completed:
+                del self._msgs[msg['MessageId']]
+
+            return completed
+
+    def release_pending(self):
+        """Stop holding messages that have not started being handled and return them."""
+        with self._cond:
+            completed = {msg['MessageId'] for msg in self._completed}
+            pending = [
+                msg for m_id, msg in self._msgs.items()
+                if (m_id not in self._started) and (m_id not in completed)
+            ]
+
+            for msg in pending:
+                del self._msgs[msg['MessageId']]
+
+            self._cond.notify_all()
+            return pending
+
+    def release_unfinished(self):
+        """Stop holding messages that have not been handled, including those being handled, and return them."""
+        with self._cond:
+            completed = {msg['MessageId'] for msg in self._completed}
+            unfinished = [msg for m_id, msg in self._msgs.items() if m_id not in completed]
+
+            for msg in unfinished:
+                del self._msgs[msg['MessageId']]
+
+            self._cond.notify_all()
+            return unfinished
+
+    def wait_for_handlers(self, timeout=None):
+        """Block until no messages are being handled and return whether that happened before the timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._started, timeout=timeout)
+
+    def wait_for_capacity(self, max_in_flight, timeout=None):
+        """Block until fewer than `max_in_flight` messages are held or some are ready to be deleted, and
+        return whether that happened before the timeout.
+        """
+        with self._cond:
+            has_capacity = self._cond.wait_for(
+                lambda: (len(self._msgs) < max_in_flight) or self._completed,
+                timeout=timeout,
+            )
+            return bool(has_capacity)
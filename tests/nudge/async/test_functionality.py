@@ -59,6 +59,7 @@ def test_functionality(nudge):
 
     assert elem1.state == Element.State.AVAILABLE
     assert batch1 is None
+    assert tuple(nudge.sub_srv.get_available(sub.id)) == (25, 1)
 
     ((elem2, batch2),) = nudge.handle_object_created(
         bucket=b,
@@ -69,6 +70,7 @@ def test_functionality(nudge):
 
     assert elem2.state == elem1.state == Element.State.BATCHED
     assert isinstance(batch2, Batch)
+    assert tuple(nudge.sub_srv.get_available(sub.id)) == (0, 0)
 
     nudge.consume(sub.id, batch2.id)
     assert elem2.state == elem1.state == Element.State.CONSUMED
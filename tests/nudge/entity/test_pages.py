@@ -0,0 +1,93 @@
+import datetime as dt
+
+import sqlalchemy as sa
+import sqlalchemy.dialects.postgresql
+import sqlalchemy.orm
+
+import revolio as rv
+import revolio.util.cursor
+
+from nudge.core.entity import Batch, BatchService, Element, ElementService
+
+
+CREATED = dt.datetime(2017, 5, 15)
+
+
+class RecordingQuery(sa.orm.Query):
+    """A query that records its statement instead of executing it."""
+
+    statements = []
+
+    def all(self):
+        RecordingQuery.statements.append(self.statement)
+        return []
+
+    def one_or_none(self):
+        RecordingQuery.statements.append(self.statement)
+        return None
+
+
+class FakeDb:
+
+    def query(self, *entities):
+        return RecordingQuery(entities)
+
+
+def _executed(func):
+    RecordingQuery.statements.clear()
+    result = func()
+
+    sqls = []
+    for statement in RecordingQuery.statements:
+        compiled = statement.compile(dialect=sa.dialects.postgresql.dialect())
+        sqls.append((' '.join(str(compiled).split()), compiled.params))
+
+    return result, sqls
+
+
+def test_element_pages_seek_after_the_token():
+    after = rv.util.cursor.decode(rv.util.cursor.encode(CREATED, 'elem-1'))
+    elem_srv = ElementService(FakeDb())
+
+    _, [(sql, params)] = _executed(lambda: elem_srv.get_sub_elems(
+        'sub-1', Element.State.AVAILABLE, limit=2, after=after,
+    ))
+
+    assert '(element.s3_created, element.id) > (%(param_1)s, %(param_2)s)' in sql
+    assert sql.endswith('ORDER BY element.s3_created ASC, element.id ASC LIMIT %(param_3)s')
+    assert 'OFFSET' not in sql
+    assert (params['param_1'], params['param_2'], params['param_3']) == (CREATED, 'elem-1', 2)
+
+
+def test_batch_element_pages_seek_after_the_token():
+    elem_srv = ElementService(FakeDb())
+
+    _, [(sql, params)] = _executed(lambda: elem_srv.get_batch_elems(
+        'sub-1', 'batch-1', limit=2, after=(CREATED, 'elem-1'),
+    ))
+
+    assert 'element.batch_id = %(batch_id_1)s' in sql
+    assert '(element.s3_created, element.id) > (%(param_1)s, %(param_2)s)' in sql
+    assert sql.endswith('ORDER BY element.s3_created ASC, element.id ASC LIMIT %(param_3)s')
+
+
+def test_batch_pages_seek_after_the_previous_batch():
+    batch_srv = BatchService(None, FakeDb(), None, None)
+
+    _, [(sql, params)] = _executed(lambda: batch_srv.get_subscription_batches(
+        'sub-1', after=(CREATED, 'batch-1'), limit=2, state=Batch.State.UNCONSUMED,
+    ))
+
+    assert '(batch.created, batch.id) > (%(param_1)s, %(param_2)s)' in sql
+    assert 'ORDER BY batch.created ASC, batch.id ASC LIMIT %(param_3)s' in sql
+    assert (params['param_1'], params['param_2'], params['param_3']) == (CREATED, 'batch-1', 2)
+
+
+def test_no_batches_follow_an_unknown_batch():
+    batch_srv = BatchService(None, FakeDb(), None, None)
+
+    batches, sqls = _executed(lambda: batch_srv.get_subscription_batches('sub-1', prev_id='unknown'))
+
+    assert batches == []
+    # only the previous batch is looked up
+    assert len(sqls) == 1
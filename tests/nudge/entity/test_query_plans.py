@@ -0,0 +1,246 @@
+"""Check that service queries on large tables are planned as scans of the indexes meant for them.
+
+The planner is left free to choose sequential scans, so the tables are seeded with enough rows that it only
+avoids one when an index fits the query.
+
+The tests recreate every table in the database at QUERY_PLAN_DATABASE_URI, so it must be a disposable local
+postgres database. They are skipped when it is not set.
+"""
+import datetime as dt
+import json
+import os
+
+import flask
+import pytest
+import sqlalchemy as sa
+import sqlalchemy.event
+
+import revolio as rv
+import revolio.db
+
+from nudge.core.entity import (
+    Batch,
+    BatchService,
+    Element,
+    ElementService,
+    Entity,
+    Subscription,
+    SubscriptionIndex,
+    SubscriptionService,
+)
+from nudge.core.ping import PingService
+
+
+pytestmark = pytest.mark.skipif(
+    'QUERY_PLAN_DATABASE_URI' not in os.environ,
+    reason='QUERY_PLAN_DATABASE_URI is not set',
+)
+
+# tables that grow with traffic, which must never be read by a sequential scan
+LARGE_TABLES = {'element', 'batch', 'subscription'}
+
+# enough rows that the planner prefers a selective index to a sequential scan
+NUM_SUBS = 10000
+NUM_ACTIVE_SUBS = 20
+NUM_BATCHES = 50000
+NUM_ELEMS = 200000
+
+CREATED = dt.datetime(2017, 5, 15)
+
+
+class Plans:
+    """Records the query plan of every statement executed on an engine."""
+
+    def __init__(self, engine):
+        super().__init__()
+        self.plans = []
+        sa.event.listen(engine, 'before_cursor_execute', self._explain)
+
+    def _explain(self, conn, cursor, statement, parameters, context, executemany):
+        if executemany or not statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE', 'WITH')):
+            return
+
+        # a separate cursor in the same transaction, which bypasses these events
+        explain_cursor = conn.connection.cursor()
+        explain_cursor.execute(f'EXPLAIN (FORMAT JSON) {statement}', parameters)
+        ((plan,),) = explain_cursor.fetchall()
+        explain_cursor.close()
+
+        self.plans.append((statement, plan[0]['Plan']))
+
+    def scans(self, func):
+        """Call `func` and return the large tables it scanned sequentially and the indexes it used."""
+        start = len(self.plans)
+        func()
+
+        plans = [plan for _, plan in self.plans[start:]]
+        assert plans, 'No statements were planned'
+
+        seq_scans = {table for plan in plans for table in _find_sequential_scans(plan)} & LARGE_TABLES
+        indexes = {index for plan in plans for index in _find_indexes(plan)}
+        return seq_scans, indexes
+
+
+def _find_sequential_scans(plan):
+    if plan['Node Type'] == 'Seq Scan':
+        yield plan['Relation Name']
+
+    for child in plan.get('Plans', []):
+        yield from _find_sequential_scans(child)
+
+
+def _find_indexes(plan):
+    if 'Index Name' in plan:
+        yield plan['Index Name']
+
+    for child in plan.get('Plans', []):
+        yield from _find_indexes(child)
+
+
+def _assert_uses(plans, func, *indexes):
+    """Check that the statements executed by `func` use every one of `indexes` and scan no large table."""
+    seq_scans, used = plans.scans(func)
+
+    assert seq_scans == set()
+    assert set(indexes) <= used, f'{used} does not include {indexes}'
+
+
+@pytest.fixture(scope='module')
+def app():
+    app = flask.Flask(__name__)
+    db = rv.db.Database(json.loads(os.environ['QUERY_PLAN_DATABASE_URI']), Entity)
+    db.init_app(app)
+
+    with app.app_context():
+        db.recreate_tables()
+        _seed(db)
+        yield app, db
+
+
+@pytest.fixture
+def db(app):
+    app, db = app
+    with app.app_context():
+        plans = Plans(db._engine)
+        yield db, plans
+        db.rollback()
+        sa.event.remove(db._engine, 'before_cursor_execute', plans._explain)
+
+
+def _seed(db):
+    for i in range(NUM_SUBS):
+        active = i < NUM_ACTIVE_SUBS
+        db.add(Subscription(
+            id=f'sub-{i}',
+            state=Subscription.State.ACTIVE if active else Subscription.State.INACTIVE,
+            bucket=f'bucket-{i % 10}',
+            prefix=f'p/{i}/',
+            trigger=Subscription.Trigger(threshold=1000, max_age=60) if active else None,
+        ))
+
+    db.bulk_insert(
+        Batch.__table__,
+        ['id', 'sub_id', 'state'],
+        [(f'batch-{i}', f'sub-{i % NUM_SUBS}', Batch.State.CONSUMED) for i in range(NUM_BATCHES)],
+    )
+
+    db.bulk_insert(
+        Element.__table__,
+        ['id', 'sub_id', 'state', 'batch_id', 'bucket', 'key', 'size', 's3_created'],
+        [
+            (
+                f'elem-{i}',
+                f'sub-{i % NUM_BATCHES % NUM_SUBS}',
+                Element.State.AVAILABLE if (i % 10 == 0) else Element.State.BATCHED,
+                None if (i % 10 == 0) else f'batch-{i % NUM_BATCHES}',
+                f'bucket-{i % NUM_BATCHES % NUM_SUBS % 10}',
+                f'p/{i % NUM_BATCHES % NUM_SUBS}/{i}',
+                100,
+                CREATED + dt.timedelta(seconds=i),
+            )
+            for i in range(NUM_ELEMS)
+        ],
+    )
+
+    db.commit()
+    db.execute(sa.text('ANALYZE'))
+    db.commit()
+
+
+def _services(db, matching=SubscriptionService.INDEX_MATCHING):
+    elem_srv = ElementService(db)
+    sub_srv = SubscriptionService(
+        ctx=None,
+        db=db,
+        elem_srv=elem_srv,
+        ping_srv=PingService(),
+        sub_index=SubscriptionIndex(db),
+        config={'Subscriptions': {'Matching': matching}},
+    )
+    batch_srv = BatchService(None, db, elem_srv, sub_srv)
+    return elem_srv, batch_srv, sub_srv
+
+
+def test_element_queries(db):
+    db, plans = db
+    elem_srv, _, _ = _services(db)
+
+    _assert_uses(plans, lambda: elem_srv.get_elements(['elem-1', 'elem-2']), 'element_pkey')
+    _assert_uses(plans, lambda: elem_srv.get_batchable_sub_elems('sub-10'), 'ix_element_sub_state_created')
+    _assert_uses(
+        plans,
+        lambda: elem_srv.get_sub_elems('sub-10', Element.State.AVAILABLE, limit=10, after=(CREATED, 'elem-10')),
+        'ix_element_sub_state_created',
+    )
+    _assert_uses(plans, lambda: elem_srv.get_batch_elems('sub-11', 'batch-11', limit=10), 'ix_element_batch_created')
+    _assert_uses(
+        plans,
+        lambda: list(elem_srv.stream_batch_elems('sub-11', 'batch-11')),
+        'ix_element_batch_created',
+    )
+
+
+def test_batch_queries(db):
+    db, plans = db
+    _, batch_srv, _ = _services(db)
+
+    _assert_uses(plans, lambda: batch_srv.get_active_batch('sub-1'), 'ix_batch_sub_state_created')
+    _assert_uses(plans, lambda: batch_srv.get_subscription_batches('sub-1', limit=10), 'ix_batch_sub_created')
+    # the previous batch is looked up by id
+    _assert_uses(
+        plans,
+        lambda: batch_srv.get_subscription_batches('sub-1', prev_id='batch-1', limit=10),
+        'batch_pkey',
+        'ix_batch_sub_created',
+    )
+
+
+@pytest.mark.parametrize('matching, index', [
+    (SubscriptionService.INDEX_MATCHING, 'subscription_pkey'),
+    (SubscriptionService.QUERY_MATCHING, 'ix_subscription_bucket_state_prefix'),
+])
+def test_subscription_queries(db, matching, index):
+    db, plans = db
+    _, _, sub_srv = _services(db, matching)
+
+    # a subscription with available elements
+    sub = sub_srv.get_subscription('sub-10')
+
+    _assert_uses(plans, lambda: sub_srv.get_live_subscriptions(), 'ix_subscription_state')
+    _assert_uses(plans, lambda: sub_srv.find_matching_subscriptions('bucket-0', 'p/10/file'), index)
+    _assert_uses(plans, lambda: sub_srv.find_due_subscriptions(), 'ix_subscription_batch_due')
+    _assert_uses(
+        plans,
+        lambda: sub_srv.add_elements(sub, [
+            Element(sub_id=sub.id, bucket=sub.bucket, key='p/10/new', size=100, s3_created=CREATED),
+        ]),
+        'subscription_pkey',
+    )
+    _assert_uses(plans, lambda: sub_srv.get_available(sub.id), 'subscription_pkey')
+    _assert_uses(plans, lambda: sub_srv.evaluate(sub), 'subscription_pkey')
+    _assert_uses(
+        plans,
+        lambda: sub_srv.create_batch(sub, max_bytes=1000),
+        'ix_element_sub_state_created',
+        'element_pkey',
+    )
@@ -0,0 +1,129 @@
+import collections
+
+from nudge.core.entity import Subscription, SubscriptionIndex
+
+
+FakeSub = collections.namedtuple('FakeSub', ['id', 'state', 'bucket', 'prefix', 'regex'])
+
+
+class FakeQuery:
+
+    def __init__(self, rows):
+        self._rows = rows
+
+    def filter(self, *args):
+        return self
+
+    def all(self):
+        return self._rows
+
+
+class FakeDb:
+
+    def __init__(self, subs):
+        self.subs = subs
+        self.loads = 0
+        self._on_commit = []
+        self._on_rollback = []
+
+    def query(self, *columns):
+        self.loads += 1
+        return FakeQuery([(s.id, s.bucket, s.prefix, s.regex) for s in self.subs])
+
+    def after_commit(self, callback):
+        self._on_commit.append(callback)
+
+    def after_rollback(self, callback):
+        self._on_rollback.append(callback)
+
+    def commit(self):
+        self._end(self._on_commit)
+
+    def rollback(self):
+        self._end(self._on_rollback)
+
+    def _end(self, callbacks):
+        self._on_commit, self._on_rollback = [], []
+        for callback in callbacks:
+            callback()
+
+
+class MemoryVersionIndex(SubscriptionIndex):
+    """An index whose shared version is kept in memory rather than in the database."""
+
+    def __init__(self, db):
+        super().__init__(db)
+        self.db_version = 0
+
+    def _get_version(self):
+        return self.db_version
+
+    def _increment_version(self):
+        self.db_version += 1
+        return self.db_version
+
+
+def _sub(sub_id, bucket, prefix, regex=None, state=Subscription.State.ACTIVE):
+    return FakeSub(sub_id, state, bucket, prefix, regex)
+
+
+def test_find_candidates():
+    db = FakeDb([
+        _sub('root', 'b', None),
+        _sub('ab', 'b', 'a/b/'),
+        _sub('abc', 'b', 'a/b/c', r'.*\.csv'),
+        _sub('ax', 'b', 'a/x'),
+        _sub('other', 'other', 'a/'),
+    ])
+    index = MemoryVersionIndex(db)
+
+    assert sorted(index.find_candidates('b', 'a/b/c/file.csv')) == ['ab', 'abc', 'root']
+    assert sorted(index.find_candidates('b', 'a/b/c/file.txt')) == ['ab', 'root']
+    assert index.find_candidates('b', 'z') == ['root']
+    assert index.find_candidates('missing', 'a/b/c') == []
+    assert db.loads == 1
+
+
+def test_changes_are_applied_in_place():
+    db = FakeDb([_sub('ab', 'b', 'a/b/')])
+    index = MemoryVersionIndex(db)
+    index.find_candidates('b', 'a/b/file')
+
+    index.notify_changed(_sub('ac', 'b', 'a/c/'))
+    index.notify_changed(_sub('ab', 'b', 'a/b/', state=Subscription.State.INACTIVE))
+    db.commit()
+
+    assert index.find_candidates('b', 'a/c/file') == ['ac']
+    assert index.find_candidates('b', 'a/b/file') == []
+    assert db.loads == 1
+
+
+def test_rolled_back_changes_are_not_applied():
+    db = FakeDb([_sub('ab', 'b', 'a/b/')])
+    index = MemoryVersionIndex(db)
+    index.find_candidates('b', 'a/b/file')
+
+    index.notify_changed(_sub('ac', 'b', 'a/c/'))
+    index.db_version -= 1
+    db.rollback()
+
+    # another process commits a change, bringing the database to the same version
+    db.subs.append(_sub('ad', 'b', 'a/d/'))
+    index.db_version += 1
+
+    assert index.find_candidates('b', 'a/c/file') == []
+    assert index.find_candidates('b', 'a/d/file') == ['ad']
+    assert db.loads == 2
+
+
+def test_changes_from_other_processes_reload():
+    db = FakeDb([_sub('ab', 'b', 'a/b/')])
+    index = MemoryVersionIndex(db)
+    index.find_candidates('b', 'a/b/file')
+
+    # another process adds a subscription
+    db.subs.append(_sub('ac', 'b', 'a/c/'))
+    index.db_version += 1
+
+    assert index.find_candidates('b', 'a/c/file') == ['ac']
+    assert db.loads == 2
@@ -0,0 +1,158 @@
+import re
+
+from nudge.core.entity import Subscription, SubscriptionService
+from nudge.core.entity.element import Element
+
+
+def _sub(prefix, regex=None):
+    return Subscription(bucket='b', prefix=prefix, regex=re.compile(regex) if (regex is not None) else None)
+
+
+def test_matches():
+    assert SubscriptionService.matches(_sub('a/'), 'b', 'a/file')
+    assert SubscriptionService.matches(_sub(None), 'b', 'a/file')
+    assert SubscriptionService.matches(_sub('a/', r'.*\.csv'), 'b', 'a/file.csv')
+
+    assert not SubscriptionService.matches(_sub('a/'), 'other', 'a/file')
+    assert not SubscriptionService.matches(_sub('a/'), 'b', 'c/file')
+    assert not SubscriptionService.matches(_sub('a/', r'.*\.csv'), 'b', 'a/file.txt')
+    # the regex applies to the key after the prefix
+    assert not SubscriptionService.matches(_sub('a/', r'a/'), 'b', 'a/file')
+
+
+class FakeDb:
+    """Inserts element rows unless an element for the same subscription and object was already inserted."""
+
+    def __init__(self):
+        self.objects = set()
+        self.attached = []
+
+    def bulk_insert(self, table, columns, rows, *, skip_conflicts=False, returning=None):
+        assert skip_conflicts and (returning == ['id'])
+
+        inserted = []
+        for row in rows:
+            values = dict(zip(columns, row))
+            obj = (values['sub_id'], values['bucket'], values['key'], values['s3_created'])
+            if obj not in self.objects:
+                self.objects.add(obj)
+                inserted.append((values['id'],))
+
+        return inserted
+
+    def add_inserted(self, entity):
+        self.attached.append(entity)
+        return entity
+
+
+def _sub_srv(db):
+    sub_srv = SubscriptionService(None, db, None, None, None, {})
+    sub_srv.changes = []
+    sub_srv._change_available = lambda sub, num_bytes, num_elems: sub_srv.changes.append((num_bytes, num_elems))
+    return sub_srv
+
+
+def test_bulk_add_elements_counts_only_new_elements():
+    sub = Subscription(id='s', bucket='b', prefix='a/')
+    sub_srv = _sub_srv(FakeDb())
+
+    assert sub_srv.bulk_add_elements(sub, [('1', 'a/0', 10, 0), ('2', 'a/1', 20, 0)]) == ['1', '2']
+    # a redelivered object, one newer object with the same key and a duplicate within the rows
+    assert sub_srv.bulk_add_elements(sub, [
+        ('3', 'a/0', 10, 0),
+        ('4', 'a/0', 40, 1),
+        ('5', 'a/2', 50, 0),
+        ('6', 'a/2', 50, 0),
+    ]) == ['4', '5']
+    assert sub_srv.bulk_add_elements(sub, [('7', 'a/1', 20, 0)]) == []
+
+    # each call counts its new elements once, and calls that add nothing change nothing
+    assert sub_srv.changes == [(30, 2), (90, 2)]
+
+
+def test_add_elements_returns_only_new_elements():
+    sub = Subscription(id='s', bucket='b', prefix='a/')
+    db = FakeDb()
+    sub_srv = _sub_srv(db)
+
+    def elem(key):
+        return Element(sub_id=sub.id, bucket=sub.bucket, key=key, size=10, s3_created=0)
+
+    first = sub_srv.add_elements(sub, [elem('a/0')])
+    added = sub_srv.add_elements(sub, [elem('a/0'), elem('a/1')])
+
+    assert [e.key for e in added] == ['a/1']
+    assert all(e.state is Element.State.AVAILABLE for e in first + added)
+    assert db.attached == first + added
+    assert sub_srv.changes == [(10, 1), (10, 1)]
+
+
+class BacklogSubscriptionService(SubscriptionService):
+    """Batches a backlog of equally sized elements without a database."""
+
+    class Db:
+
+        def __init__(self):
+            self.locked = False
+
+        def try_advisory_xact_lock(self, key):
+            return not self.locked
+
+    def __init__(self, elems, size, *, scheduled=False):
+        super().__init__(None, BacklogSubscriptionService.Db(), None, None, None, {})
+        self.elems = elems
+        self.size = size
+        self.scheduled = scheduled
+
+    def _get_trigger_state(self, sub):
+        return self.elems * self.size, self.elems, False, self.scheduled
+
+    def _set_batch_due(self, sub, due):
+        self.scheduled = due
+
+    def _create_and_send_batch(self, sub):
+        batched = min(self.elems, sub.trigger.max_batch_elements)
+        self.elems -= batched
+        return batched
+
+
+def _backlog_sub():
+    return Subscription(id='s', trigger=Subscription.Trigger(threshold=100, max_batch_elements=10))
+
+
+def test_evaluate_drains_backlog_into_bounded_batches():
+    sub_srv = BacklogSubscriptionService(elems=25, size=10)
+
+    # batches are created while the remaining elements still meet the threshold
+    assert sub_srv.evaluate(_backlog_sub()) == [10, 10]
+    assert sub_srv.elems == 5
+    assert not sub_srv.scheduled
+
+
+def test_evaluate_leaves_large_backlog_for_later():
+    sub_srv = BacklogSubscriptionService(elems=1000, size=10)
+
+    assert sub_srv.evaluate(_backlog_sub(), max_batches=3) == [10, 10, 10]
+    assert sub_srv.elems == 970
+    # the sweeper carries on with the rest
+    assert sub_srv.scheduled
+
+    assert len(sub_srv.evaluate(_backlog_sub())) == 10
+    assert sub_srv.elems == 870
+    assert sub_srv.scheduled
+
+
+def test_evaluate_unschedules_drained_backlog():
+    sub_srv = BacklogSubscriptionService(elems=15, size=10, scheduled=True)
+
+    assert sub_srv.evaluate(_backlog_sub()) == [10]
+    assert not sub_srv.scheduled
+
+
+def test_evaluate_schedules_subscription_locked_by_another_transaction():
+    sub_srv = BacklogSubscriptionService(elems=15, size=10)
+    sub_srv._db.locked = True
+
+    assert sub_srv.evaluate(_backlog_sub()) == []
+    assert sub_srv.elems == 15
+    assert sub_srv.scheduled
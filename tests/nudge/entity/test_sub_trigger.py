@@ -0,0 +1,41 @@
+from nudge.core.entity import Subscription
+
+
+def test_threshold_only():
+    trigger = Subscription.Trigger(threshold=50)
+
+    assert trigger.is_ready(50, 1, due=False)
+    assert not trigger.is_ready(49, 1, due=False)
+    assert not trigger.is_ready(0, 0, due=False)
+
+
+def test_no_conditions_batches_every_element():
+    trigger = Subscription.Trigger()
+
+    assert trigger.byte_threshold == 0
+    assert trigger.is_ready(0, 1, due=False)
+    assert not trigger.is_ready(0, 0, due=True)
+
+
+def test_max_age_and_max_count():
+    trigger = Subscription.Trigger(max_age=60, max_count=3)
+
+    # without a threshold the bytes available never create a batch
+    assert trigger.byte_threshold is None
+    assert not trigger.is_ready(10 ** 9, 2, due=False)
+    assert trigger.is_ready(0, 3, due=False)
+    assert trigger.is_ready(0, 1, due=True)
+
+
+def test_serialization():
+    trigger = Subscription.Trigger(threshold=50, max_age=60)
+
+    assert trigger.serialize() == {
+        'Endpoint': None,
+        'Threshold': 50,
+        'MaxAge': 60,
+        'MaxCount': None,
+        'MaxBatchBytes': None,
+        'MaxBatchElements': None,
+        'Custom': None,
+    }
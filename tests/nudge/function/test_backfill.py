@@ -0,0 +1,122 @@
+from nudge.core.entity import Subscription, SubscriptionService
+from nudge.core.function import Backfill
+
+
+class FakeDb:
+
+    def commit(self):
+        pass
+
+
+class FakeSubscriptionService:
+
+    matches = staticmethod(SubscriptionService.matches)
+
+    def __init__(self, sub):
+        self.sub = sub
+        self.rows = []
+        self.evaluated = []
+
+    def get_subscription(self, sub_id):
+        return self.sub
+
+    def lock_subscription(self, sub_id):
+        return self.sub
+
+    def bulk_add_elements(self, sub, rows):
+        self.rows.extend(key for _, key, _, _ in rows)
+        return [elem_id for elem_id, _, _, _ in rows]
+
+    def notify_changed(self, sub):
+        pass
+
+    def evaluate(self, sub):
+        self.evaluated.append(sub)
+
+
+class FakeS3:
+
+    def __init__(self, keys):
+        self._keys = sorted(keys)
+
+    def list_objects_v2(self, Bucket, Prefix, MaxKeys, Delimiter=None, ContinuationToken=None):
+        start = int(ContinuationToken or 0)
+        contents, prefixes = [], []
+        for key in [k for k in self._keys if k.startswith(Prefix)]:
+            if (Delimiter is not None) and (Delimiter in key[len(Prefix):]):
+                common = key[:key.index(Delimiter, len(Prefix)) + 1]
+                if common not in prefixes:
+                    prefixes.append(common)
+            else:
+                contents.append({'Key': key, 'Size': 1, 'LastModified': None})
+
+        r = {
+            'Contents': contents[start:start + 2],
+            'CommonPrefixes': [{'Prefix': p} for p in prefixes],
+            'IsTruncated': start + 2 < len(contents),
+        }
+        if r['IsTruncated']:
+            r['NextContinuationToken'] = str(start + 2)
+
+        return r
+
+
+class FakeDeferral:
+
+    def __init__(self):
+        self.calls = []
+
+    def send_call(self, func, sub_id, **kwargs):
+        self.calls.append(kwargs)
+
+
+def _run(keys, delimiter):
+    sub = Subscription(id='s', state=Subscription.State.BACKFILLING, bucket='b', prefix='p/', data={})
+    sub_srv = FakeSubscriptionService(sub)
+    deferral = FakeDeferral()
+    backfill = Backfill(None, FakeDb(), sub_srv, FakeS3(keys), deferral)
+
+    completions = [backfill(sub.id, delimiter=delimiter)[1]]
+    # deferred calls are handled in order, as by a single deferral worker
+    while deferral.calls:
+        completions.append(backfill(sub.id, **deferral.calls.pop(0))[1])
+
+    return sub, sub_srv, completions
+
+
+def test_sequential_backfill():
+    keys = [f'p/{i}' for i in range(5)] + ['q/0']
+    sub, sub_srv, completions = _run(keys, delimiter=None)
+
+    assert sorted(sub_srv.rows) == keys[:5]
+    assert completions == [False, False, True]
+    assert sub.state is Subscription.State.ACTIVE
+    assert sub_srv.evaluated == [sub]
+
+
+def test_partitioned_backfill():
+    keys = ['p/0', 'p/a/0', 'p/a/1', 'p/a/2', 'p/b/0', 'p/b/c/0']
+    sub, sub_srv, completions = _run(keys, delimiter='/')
+
+    assert sorted(sub_srv.rows) == keys
+    # the root listing, then partitions a and b, with a listed over two pages
+    assert completions == [False, False, False, True]
+    assert sub.state is Subscription.State.ACTIVE
+    assert sub.data['Backfill']['Pending'] == []
+    assert sorted(sub.data['Backfill']['Done']) == ['p/', 'p/a/', 'p/b/']
+    assert sub_srv.evaluated == [sub]
+
+
+def test_retried_listing_does_not_restart_partitions():
+    keys = ['p/a/0', 'p/b/0']
+    sub = Subscription(id='s', state=Subscription.State.BACKFILLING, bucket='b', prefix='p/', data={})
+    sub_srv = FakeSubscriptionService(sub)
+    deferral = FakeDeferral()
+    backfill = Backfill(None, FakeDb(), sub_srv, FakeS3(keys), deferral)
+
+    backfill(sub.id, delimiter='/')
+    backfill(sub.id, partition='p/a/')
+    backfill(sub.id, delimiter='/')
+
+    assert deferral.calls == [{'partition': 'p/a/'}, {'partition': 'p/b/'}]
+    assert sub.data['Backfill'] == {'Pending': ['p/b/'], 'Done': ['p/', 'p/a/']}
@@ -0,0 +1,138 @@
+import datetime as dt
+
+from nudge.core.entity import Batch, Subscription, SubscriptionService
+from nudge.core.entity.element import Element
+from nudge.core.function import HandleObjectsCreated
+
+
+class FakeDb:
+
+    def __init__(self):
+        self.commits = 0
+
+    def commit(self):
+        self.commits += 1
+
+
+class FakeSubscriptionService:
+
+    def __init__(self, subs, threshold):
+        self.subs = subs
+        self.threshold = threshold
+        self.keys = {sub.id: set() for sub in subs}
+        self.available = {sub.id: [] for sub in subs}
+        self.counted = []
+        self.evaluated = []
+
+    def find_matching_subscriptions(self, bucket, key):
+        return [sub for sub in self.subs if SubscriptionService.matches(sub, bucket, key)]
+
+    def add_elements(self, sub, elems):
+        self.counted.append(sub.id)
+        added = []
+        for elem in elems:
+            if elem.key in self.keys[sub.id]:
+                continue
+
+            self.keys[sub.id].add(elem.key)
+            elem.id = f'{sub.id}-{elem.key}'
+            elem.state = Element.State.AVAILABLE
+            added.append(elem)
+
+        self.available[sub.id].extend(added)
+        return added
+
+    def evaluate(self, sub):
+        self.evaluated.append(sub.id)
+
+        elems = self.available[sub.id]
+        if sum(elem.size for elem in elems) < self.threshold:
+            return []
+
+        batch = Batch(id=f'{sub.id}-batch-{len(self.evaluated)}', sub_id=sub.id)
+        for elem in elems:
+            elem.batch_id = batch.id
+            elem.state = Element.State.BATCHED
+
+        self.available[sub.id] = []
+        return [batch]
+
+
+def _obj(key, hour):
+    return HandleObjectsCreated.Object(
+        bucket='b',
+        key=key,
+        size=25,
+        created=dt.datetime(2017, 5, 15, hour),
+    )
+
+
+def _handle(sub_srv, objects):
+    db = FakeDb()
+    results = HandleObjectsCreated(None, db, sub_srv, None, None)(objects)
+    assert db.commits == 1
+    return results
+
+
+def test_objects_are_batched_after_every_object_is_added():
+    sub = Subscription(id='s', bucket='b', prefix='a/')
+    sub_srv = FakeSubscriptionService([sub], threshold=50)
+
+    results = _handle(sub_srv, [_obj(f'a/{i}', i) for i in range(3)] + [_obj('c/0', 4)])
+
+    assert len(results) == 4
+    assert results[3] == []
+
+    # the subscription is evaluated once, so every new element is in the same batch
+    assert sub_srv.evaluated == ['s']
+    (batch,) = {batch for ((elem, batch),) in results[:3]}
+    assert isinstance(batch, Batch)
+    assert all(elem.sub_id == 's' for ((elem, _),) in results[:3])
+
+
+def test_each_matching_subscription_is_evaluated_once():
+    subs = [Subscription(id='s2', bucket='b', prefix='a/'), Subscription(id='s1', bucket='b', prefix='a/b/')]
+    sub_srv = FakeSubscriptionService(subs, threshold=100)
+
+    results = _handle(sub_srv, [_obj('a/0', 0), _obj('a/b/0', 1), _obj('a/b/1', 2)])
+
+    assert [sorted(elem.sub_id for elem, _ in obj_results) for obj_results in results] == [
+        ['s2'],
+        ['s1', 's2'],
+        ['s1', 's2'],
+    ]
+    assert sorted(sub_srv.evaluated) == ['s1', 's2']
+    assert all(batch is None for obj_results in results for _, batch in obj_results)
+
+
+def test_subscriptions_are_updated_in_id_order():
+    subs = [Subscription(id=sub_id, bucket='b', prefix='a/') for sub_id in ['s3', 's1', 's2']]
+    sub_srv = FakeSubscriptionService(subs, threshold=100)
+
+    _handle(sub_srv, [_obj('a/0', 0), _obj('a/1', 1)])
+
+    assert sub_srv.counted == ['s1', 's2', 's3']
+    assert sub_srv.evaluated == ['s1', 's2', 's3']
+
+
+def test_redelivered_objects_are_left_out():
+    sub = Subscription(id='s', bucket='b', prefix='a/')
+    sub_srv = FakeSubscriptionService([sub], threshold=100)
+
+    _handle(sub_srv, [_obj('a/0', 0)])
+    results = _handle(sub_srv, [_obj('a/0', 0), _obj('a/1', 1)])
+
+    assert results[0] == []
+    assert [elem.key for elem, _ in results[1]] == ['a/1']
+    assert sub_srv.evaluated == ['s', 's']
+
+
+def test_subscriptions_without_new_elements_are_not_evaluated():
+    sub = Subscription(id='s', bucket='b', prefix='a/')
+    sub_srv = FakeSubscriptionService([sub], threshold=100)
+
+    _handle(sub_srv, [_obj('a/0', 0)])
+    results = _handle(sub_srv, [_obj('a/0', 0)])
+
+    assert results == [[]]
+    assert sub_srv.evaluated == ['s']
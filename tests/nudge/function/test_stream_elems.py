@@ -0,0 +1,47 @@
+import datetime as dt
+
+from nudge.core.function import StreamBatchElements, StreamSubscriptionElements
+
+
+class FakeElementService:
+    """Streams rows following the sort key of a continuation token."""
+
+    def __init__(self, rows):
+        self._rows = rows
+        self.afters = []
+
+    def _stream(self, after):
+        self.afters.append(after)
+        return iter([row for row in self._rows if (after is None) or ((row[4], row[0]) > after)])
+
+    def stream_batch_elems(self, sub_id, batch_id, after):
+        return self._stream(after)
+
+    def stream_sub_elems(self, sub_id, state, after):
+        return self._stream(after)
+
+
+_ROWS = [
+    (f'e{i}', 'b', f'a/{i}', 10, dt.datetime(2017, 5, 15, 12, 0, 0, 250000))
+    for i in range(3)
+]
+
+
+def _check_resumes(stream):
+    records = list(stream({}))
+    assert [r['Id'] for r in records] == ['e0', 'e1', 'e2']
+    assert records[0]['Created'] == '2017-05-15 12:00:00'
+
+    # every element shares its second, so the token must keep the microseconds and the id
+    resumed = list(stream({'ContinuationToken': records[0]['ContinuationToken']}))
+    assert [r['Id'] for r in resumed] == ['e1', 'e2']
+
+
+def test_stream_batch_elements_resumes_from_any_element():
+    f = StreamBatchElements(None, FakeElementService(_ROWS), None)
+    _check_resumes(lambda request: f.handle_request({'SubscriptionId': 's', 'BatchId': 'b', **request}))
+
+
+def test_stream_sub_elements_resumes_from_any_element():
+    f = StreamSubscriptionElements(None, FakeElementService(_ROWS), None)
+    _check_resumes(lambda request: f.handle_request({'SubscriptionId': 's', **request}))
@@ -0,0 +1,48 @@
+from nudge.core.entity import Batch, Subscription
+from nudge.core.function import Sweep
+
+
+class FakeDb:
+
+    def __init__(self, log):
+        self._log = log
+
+    def commit(self):
+        self._log.append('commit')
+
+
+class FakeSubscriptionService:
+
+    def __init__(self, log, due):
+        self._log = log
+        self._due = due
+
+    def find_due_subscriptions(self, limit):
+        return self._due[:limit]
+
+    def evaluate(self, sub):
+        self._log.append(sub.id)
+        return [Batch(id=f'{sub.id}-batch', sub_id=sub.id)]
+
+
+def _sweep(due, limit):
+    log = []
+    subs, batches = Sweep(None, FakeDb(log), FakeSubscriptionService(log, due))(limit=limit)
+    return log, subs, batches
+
+
+def test_sweep_commits_each_subscription():
+    due = [Subscription(id=sub_id) for sub_id in ['s1', 's2', 's3']]
+
+    log, subs, batches = _sweep(due, limit=2)
+
+    assert subs == due[:2]
+    assert [batch.id for batch in batches] == ['s1-batch', 's2-batch']
+    assert log[:4] == ['s1', 'commit', 's2', 'commit']
+
+
+def test_sweep_without_due_subscriptions():
+    log, subs, batches = _sweep([], limit=100)
+
+    assert (subs, batches) == ([], [])
+    assert 'commit' in log
@@ -0,0 +1,55 @@
+from nudge.worker.prefilter import SubscriptionFilter
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def _response(*subs):
+    return {
+        'Subscriptions': [
+            {'Id': str(i), 'State': 'ACTIVE', 'Bucket': bucket, 'Prefix': prefix, 'Regex': regex}
+            for i, (bucket, prefix, regex) in enumerate(subs)
+        ],
+    }
+
+
+def test_matches():
+    f = SubscriptionFilter(lambda: _response(
+        ('b', 'a/b/', None),
+        ('b', 'c/', r'.*\.csv'),
+        ('other', None, None),
+    ), ttl=60)
+
+    assert f.matches('b', 'a/b/file.txt')
+    assert f.matches('b', 'c/d/file.csv')
+    assert f.matches('other', 'anything')
+
+    assert not f.matches('b', 'a/file.txt')
+    assert not f.matches('b', 'c/d/file.txt')
+    assert not f.matches('unknown', 'a/b/file.txt')
+
+
+def test_snapshot_is_refreshed_after_ttl():
+    clock = FakeClock()
+    responses = [_response(), _response(('b', 'a/', None))]
+    f = SubscriptionFilter(lambda: responses.pop(0), ttl=60, clock=clock)
+
+    assert not f.matches('b', 'a/file.txt')
+
+    clock.now = 60
+    assert f.matches('b', 'a/file.txt')
+
+
+def test_allows_everything_until_loaded():
+    def load():
+        raise Exception('Unavailable')
+
+    f = SubscriptionFilter(load, ttl=60)
+
+    assert f.matches('b', 'a/file.txt')
@@ -0,0 +1,59 @@
+import json
+
+import revolio.worker.worker
+
+from nudge.worker.sweeper import SweeperWorker
+
+
+class FakeNudgeClient:
+
+    def __init__(self, *results):
+        self._results = list(results)
+
+    def sweep(self, Limit):
+        sub_ids, batch_ids = self._results.pop(0)
+        return {'SubscriptionIds': sub_ids[:Limit], 'BatchIds': batch_ids}
+
+
+class FakeMetricsServer:
+
+    started = []
+
+    def __init__(self, metrics, port):
+        self._metrics = metrics
+
+    def start(self):
+        FakeMetricsServer.started.append(self._metrics)
+
+
+def _worker(monkeypatch, client):
+    monkeypatch.setenv('NDG_WRK_SWP_LIMIT', json.dumps(2))
+    worker = SweeperWorker()
+    worker.__dict__['_nudge_client'] = client
+    # a full sweep is repeated without waiting
+    worker._sleep = lambda seconds: worker.slept.append(seconds)
+    worker.slept = []
+    return worker
+
+
+def test_sweeps_are_counted(monkeypatch):
+    worker = _worker(monkeypatch, FakeNudgeClient((['s1', 's2'], ['b1']), (['s3'], ['b2', 'b3'])))
+
+    worker._task()
+    assert worker.slept == []
+    worker._task()
+    assert worker.slept == [60]
+
+    rendered = worker.metrics.render()
+    assert 'worker_subscriptions_swept_total 3' in rendered
+    assert 'worker_batches_created_total 3' in rendered
+
+
+def test_metrics_are_served(monkeypatch):
+    monkeypatch.setenv('NDG_WRK_SWP_METRICS_PORT', json.dumps(9100))
+    monkeypatch.setattr(revolio.worker.worker, 'MetricsServer', FakeMetricsServer)
+    worker = _worker(monkeypatch, FakeNudgeClient())
+
+    worker._start_metrics()
+
+    assert FakeMetricsServer.started == [worker.metrics]
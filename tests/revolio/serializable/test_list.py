@@ -0,0 +1,43 @@
+import pytest
+
+import revolio as rv
+import revolio.serializable
+
+
+class ItemSerializable(rv.serializable.Serializable):
+
+    foo_bar = rv.serializable.fields.Str()
+
+
+class ListSerializable(rv.serializable.Serializable):
+
+    items = rv.serializable.fields.List(rv.serializable.fields.Nested(ItemSerializable))
+
+
+def test_list_deserialize():
+    s = ListSerializable.deserialize({
+        'Items': [
+            {'FooBar': 'a'},
+            {'FooBar': 'b'},
+        ],
+    })
+
+    assert [item.foo_bar for item in s.items] == ['a', 'b']
+
+
+def test_list_serialize():
+    s = ListSerializable(items=[ItemSerializable(foo_bar='a')])
+
+    assert s.serialize() == {'Items': [{'FooBar': 'a'}]}
+
+
+def test_list_deserialize_invalid():
+    with pytest.raises(Exception):
+        ListSerializable.deserialize({
+            'Items': [{'FooBar': 3}],
+        })
+
+    with pytest.raises(Exception):
+        ListSerializable.deserialize({
+            'Items': {'FooBar': 'a'},
+        })
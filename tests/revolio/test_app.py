@@ -0,0 +1,87 @@
+import json
+
+import revolio as rv
+import revolio.app
+import revolio.function
+
+
+class FakeContext:
+    config = {'Web': {'Version': 1}}
+
+
+class FakeDb:
+
+    def init_app(self, app):
+        pass
+
+
+class Count(rv.function.StreamingFunction):
+
+    closed = []
+
+    def format_request(self, n, *, fail_at=None):
+        return {'N': n, 'FailAt': fail_at}
+
+    def handle_request(self, request):
+        if request['N'] < 0:
+            raise Exception('Invalid count')
+
+        return self(request['N'], fail_at=request['FailAt'])
+
+    def __call__(self, n, *, fail_at=None):
+        for i in range(n):
+            if i == fail_at:
+                raise Exception('Count failure')
+
+            yield {'I': i}
+
+    def close_stream(self):
+        Count.closed.append(True)
+
+
+class CountApp(rv.app.App):
+
+    @property
+    def _functions(self):
+        return [Count(self._ctx)]
+
+
+def _post(n, fail_at=None):
+    Count.closed.clear()
+    client = CountApp({'TESTING': True}, FakeDb(), FakeContext()).flask_app.test_client()
+    r = client.post('/api/1/call/Count', data=json.dumps({'N': n, 'FailAt': fail_at}))
+    records = [json.loads(line) for line in r.get_data(as_text=True).splitlines()]
+
+    # closed once the response has been sent
+    assert Count.closed == [True]
+    return r.status_code, r.mimetype, records
+
+
+def test_streaming_response():
+    assert _post(3) == (200, 'application/x-ndjson', [{'I': 0}, {'I': 1}, {'I': 2}])
+
+
+def test_error_before_streaming():
+    code, _, (result,) = _post(-1)
+
+    assert code == 500
+    assert 'Invalid count' in result['Traceback'][-2]
+
+
+def test_error_in_first_record():
+    code, _, (result,) = _post(3, fail_at=0)
+
+    assert code == 500
+    assert 'Count failure' in result['Traceback'][-2]
+
+
+def test_empty_stream():
+    assert _post(0) == (200, 'application/x-ndjson', [])
+
+
+def test_error_while_streaming():
+    code, _, records = _post(3, fail_at=2)
+
+    assert code == 200
+    assert records[:2] == [{'I': 0}, {'I': 1}]
+    assert 'Count failure' in records[2]['Traceback'][-2]
@@ -0,0 +1,116 @@
+import json
+
+import revolio as rv
+import revolio.worker
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def test_visibility_timeout():
+    clock = FakeClock()
+    queue = rv.worker.MemoryBackend(visibility_timeout=30, clock=clock)
+    queue.send('a')
+
+    (msg,) = queue.receive(max_messages=10, wait_seconds=0)
+    assert msg['Body'] == 'a'
+    assert msg['Attributes']['ApproximateReceiveCount'] == '1'
+    assert queue.receive(max_messages=10, wait_seconds=0) == []
+
+    clock.now = 30
+    (msg,) = queue.receive(max_messages=10, wait_seconds=0)
+    assert msg['Attributes']['ApproximateReceiveCount'] == '2'
+
+
+def test_stale_receipt_is_invalid():
+    clock = FakeClock()
+    queue = rv.worker.MemoryBackend(visibility_timeout=30, clock=clock)
+    queue.send('a')
+
+    (first,) = queue.receive(max_messages=1, wait_seconds=0)
+    clock.now = 30
+    (second,) = queue.receive(max_messages=1, wait_seconds=0)
+
+    assert queue.delete([first['ReceiptHandle']]) == {first['ReceiptHandle']: 'ReceiptHandleIsInvalid'}
+    assert queue.delete([second['ReceiptHandle']]) == {}
+    assert len(queue) == 0
+
+
+def test_change_visibility():
+    clock = FakeClock()
+    queue = rv.worker.MemoryBackend(visibility_timeout=30, clock=clock)
+    queue.send('a')
+
+    (msg,) = queue.receive(max_messages=1, wait_seconds=0)
+    queue.change_visibility([msg['ReceiptHandle']], 0)
+
+    assert queue.visible_count == 1
+
+
+class FakeSqsClient:
+
+    def __init__(self):
+        self.sent = []
+
+    def send_message(self, QueueUrl, MessageBody, MessageAttributes):
+        self.sent.append(MessageAttributes)
+        return {'MessageId': 'm'}
+
+
+def test_quarantine_attributes():
+    msg = {'MessageId': 'm0', 'Body': 'a', 'Attributes': {'ApproximateReceiveCount': '3'}}
+    client = FakeSqsClient()
+    queue = rv.worker.MemoryBackend()
+
+    rv.worker.QueueQuarantineSink(rv.worker.SqsBackend(client, 'quarantine')).put(msg, 'error')
+    rv.worker.QueueQuarantineSink(queue).put(msg, 'error')
+
+    (quarantined,) = queue.receive(max_messages=1, wait_seconds=0)
+    for attributes in [client.sent[0], quarantined['MessageAttributes']]:
+        assert attributes == {
+            'SourceMessageId': {'DataType': 'String', 'StringValue': 'm0'},
+            'ReceiveCount': {'DataType': 'Number', 'StringValue': '3'},
+            'Error': {'DataType': 'String', 'StringValue': 'error'},
+        }
+
+
+class EchoWorker(rv.worker.SqsWorker):
+
+    ENV_VAR_PREFIX = 'TEST_BACKEND_WRK'
+
+    def __init__(self, queue):
+        super().__init__('tests', queue=queue)
+        self.handled = []
+
+    def _handle_message(self, msg):
+        if msg.get('Fail'):
+            raise Exception('Handler failure')
+
+        self.handled.append(msg['N'])
+
+
+def test_worker_with_memory_backend(monkeypatch):
+    monkeypatch.setenv('TEST_BACKEND_WRK_BATCH_SIZE', json.dumps(10))
+    clock = FakeClock()
+    queue = rv.worker.MemoryBackend(visibility_timeout=30, clock=clock)
+    for n in range(15):
+        queue.send(json.dumps({'N': n}))
+    queue.send(json.dumps({'Fail': True}))
+
+    worker = EchoWorker(queue)
+    worker._task()
+    worker._task()
+
+    assert worker.handled == list(range(15))
+    # the failed message is hidden for the first backoff period
+    assert len(queue) == 1
+    assert queue.visible_count == 0
+
+    clock.now = 5
+    assert queue.visible_count == 1
@@ -0,0 +1,20 @@
+import datetime as dt
+
+import pytest
+
+import revolio as rv
+import revolio.util.cursor
+
+
+def test_round_trip():
+    created = dt.datetime(2017, 5, 15, 1, 2, 3, 456789)
+
+    token = rv.util.cursor.encode(created, 'id')
+
+    assert rv.util.cursor.decode(token) == (created, 'id')
+
+
+@pytest.mark.parametrize('token', ['', 'not a token', rv.util.cursor.base64.urlsafe_b64encode(b'[1]').decode()])
+def test_invalid_token(token):
+    with pytest.raises(Exception, match='Invalid continuation token'):
+        rv.util.cursor.decode(token)
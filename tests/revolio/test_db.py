@@ -0,0 +1,127 @@
+import flask
+
+import sqlalchemy as sa
+import sqlalchemy.dialects.postgresql
+import sqlalchemy.ext.declarative
+
+import revolio as rv
+import revolio.db
+
+
+class RecordingDatabase(rv.db.Database):
+
+    def __init__(self):
+        super().__init__('postgresql://', None)
+        self.statements = []
+
+    def execute(self, statement, params=None):
+        self.statements.append(statement)
+        return [(1,)]
+
+
+_table = sa.Table(
+    'thing', sa.MetaData(),
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('name', sa.String),
+)
+
+
+def test_bulk_insert_pages():
+    db = RecordingDatabase()
+
+    db.bulk_insert(_table, ['id', 'name'], [(i, f'n{i}') for i in range(5)], page_size=2)
+
+    params = [s.compile().params for s in db.statements]
+    assert len(params) == 3
+    assert params[0] == {'id_m0': 0, 'name_m0': 'n0', 'id_m1': 1, 'name_m1': 'n1'}
+    assert params[2] == {'id_m0': 4, 'name_m0': 'n4'}
+
+
+def test_bulk_insert_nothing():
+    db = RecordingDatabase()
+
+    db.bulk_insert(_table, ['id', 'name'], [])
+
+    assert db.statements == []
+
+
+def test_bulk_insert_skipping_conflicts():
+    db = RecordingDatabase()
+
+    inserted = db.bulk_insert(_table, ['id', 'name'], [(1, 'a'), (1, 'b')], skip_conflicts=True, returning=['id'])
+
+    (statement,) = db.statements
+    sql = str(statement.compile(dialect=sa.dialects.postgresql.dialect()))
+    assert sql.endswith('ON CONFLICT DO NOTHING RETURNING thing.id')
+    assert inserted == [(1,)]
+
+
+def _sqlite_database():
+    app = flask.Flask(__name__)
+    db = rv.db.Database('sqlite://', None)
+    db.init_app(app)
+    return app, db
+
+
+def test_after_commit():
+    app, db = _sqlite_database()
+    calls = []
+
+    with app.app_context():
+        db.after_commit(lambda: calls.append('commit'))
+        db.after_rollback(lambda: calls.append('rollback'))
+        db.execute(sa.text('SELECT 1'))
+        assert calls == []
+
+        db.commit()
+        assert calls == ['commit']
+
+        # callbacks only apply to the transaction they were added in
+        db.execute(sa.text('SELECT 1'))
+        db.commit()
+        assert calls == ['commit']
+
+
+def test_after_rollback():
+    app, db = _sqlite_database()
+    calls = []
+
+    with app.app_context():
+        db.after_commit(lambda: calls.append('commit'))
+        db.after_rollback(lambda: calls.append('rollback'))
+        db.execute(sa.text('SELECT 1'))
+        db.rollback()
+        assert calls == ['rollback']
+
+        db.execute(sa.text('SELECT 1'))
+        db.commit()
+        assert calls == ['rollback']
+
+
+_Base = sa.ext.declarative.declarative_base()
+
+
+class _Thing(_Base):
+    __tablename__ = 'thing'
+
+    id = sa.Column(sa.Integer, primary_key=True)
+    name = sa.Column(sa.String)
+
+
+def test_set_loaded():
+    app, db = _sqlite_database()
+
+    with app.app_context():
+        _Base.metadata.create_all(bind=db._engine)
+        db.add(_Thing(id=1, name='a'))
+        db.add(_Thing(id=2, name='a'))
+        db.commit()
+
+        thing = db.query(_Thing).get(1)
+        db.execute(_Thing.__table__.update().values(name='b'))
+        db.set_loaded(_Thing, [1, 2, 3], name='b')
+
+        # the loaded entity is updated without being reloaded or flushed again
+        assert thing.name == 'b'
+        assert thing not in db._session.dirty
+        assert 'name' in sa.inspect(thing).dict
@@ -0,0 +1,41 @@
+import re
+
+import revolio as rv
+import revolio.util.regex
+
+
+def test_combined_regex_matches_like_re_match():
+    patterns = {
+        'csv': r'.*\.csv',
+        'dated': r'\d{4}/\d{2}/',
+        'either': r'a|b',
+        'empty': r'x*',
+        'grouped': r'(\d+)/(.*)',
+        'any': None,
+    }
+    combined = rv.util.regex.CombinedRegex(patterns)
+
+    for string in ['2017/05/file.csv', 'a.txt', 'b', 'c', '12/x', '']:
+        expected = sorted(
+            key for key, pattern in patterns.items()
+            if (pattern is None) or re.match(pattern, string)
+        )
+        assert sorted(combined.match(string)) == expected
+
+
+def test_unsafe_patterns_are_matched_separately():
+    patterns = {
+        'backref': r'(a)\1',
+        'named': r'(?P<x>a)(?P=x)',
+        'named_again': r'(?P<x>b)',
+        'flags': r'(?i)A',
+        'plain': r'a',
+    }
+    combined = rv.util.regex.CombinedRegex(patterns)
+
+    assert sorted(combined.match('aa')) == ['backref', 'flags', 'named', 'plain']
+    assert sorted(combined.match('b')) == ['named_again']
+
+
+def test_compile_is_shared():
+    assert rv.util.regex.compile(r'a.*') is rv.util.regex.compile(r'a.*')
@@ -0,0 +1,521 @@
+import asyncio
+import json
+import os
+import signal
+import threading
+import time
+
+import pytest
+
+import revolio as rv
+import revolio.worker
+
+
+class FakeSqsClient:
+
+    def __init__(self, bodies, *, failed_delete_ids=(), receive_count=1):
+        self.messages = [
+            {
+                'MessageId': f'm{i}',
+                'ReceiptHandle': f'r{i}',
+                'Body': json.dumps(body),
+                'Attributes': {'ApproximateReceiveCount': str(receive_count)},
+            }
+            for i, body in enumerate(bodies)
+        ]
+        self.deleted = []
+        self.released = []
+        self.visibility = {}
+        self.sent = []
+        self.batch_calls = 0
+        self._failed_delete_ids = set(failed_delete_ids)
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages, WaitTimeSeconds, AttributeNames):
+        msgs = self.messages[:MaxNumberOfMessages]
+        self.messages = self.messages[MaxNumberOfMessages:]
+        return {'Messages': msgs}
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        self.batch_calls += 1
+        failed = []
+        for entry in Entries:
+            if entry['ReceiptHandle'] in self._failed_delete_ids:
+                self._failed_delete_ids.remove(entry['ReceiptHandle'])
+                failed.append({'Id': entry['Id'], 'Code': 'InternalError', 'SenderFault': False})
+            else:
+                self.deleted.append(entry['ReceiptHandle'])
+
+        return {'Failed': failed}
+
+    def delete_message(self, QueueUrl, ReceiptHandle):
+        self.deleted.append(ReceiptHandle)
+
+    def send_message(self, QueueUrl, MessageBody, MessageAttributes):
+        self.sent.append((QueueUrl, json.loads(MessageBody)))
+        return {'MessageId': f'sent{len(self.sent)}'}
+
+    def change_message_visibility_batch(self, QueueUrl, Entries):
+        for e in Entries:
+            self.visibility[e['ReceiptHandle']] = e['VisibilityTimeout']
+        self.released.extend(e['ReceiptHandle'] for e in Entries if e['VisibilityTimeout'] == 0)
+        return {'Failed': []}
+
+
+class DummyWorker(rv.worker.SqsWorker):
+
+    ENV_VAR_PREFIX = 'TEST_WRK'
+
+    def __init__(self, client):
+        super().__init__('tests')
+        self.__dict__['_sqs_client'] = client
+        self.handled = []
+        self.transaction_ids = []
+        self.blocked = threading.Event()
+        self.unblock = threading.Event()
+
+    def _handle_message(self, msg):
+        if msg.get('Fail'):
+            raise Exception('Handler failure')
+
+        if msg.get('Block'):
+            self.blocked.set()
+            self.unblock.wait()
+
+        self.handled.append(msg['N'])
+        self.transaction_ids.append(self.transaction_id)
+
+        if msg.get('Stop'):
+            self._signal_received.value = True
+
+
+@pytest.fixture
+def env(monkeypatch):
+    monkeypatch.setenv('TEST_WRK_QUEUE_URL', json.dumps('https://sqs.us-east-1.amazonaws.com/1/test'))
+    monkeypatch.setenv('TEST_WRK_BATCH_SIZE', json.dumps(10))
+
+
+def test_batched_receive_and_delete(env):
+    client = FakeSqsClient([{'N': n} for n in range(10)])
+    worker = DummyWorker(client)
+
+    worker._task()
+
+    assert worker.handled == list(range(10))
+    assert client.deleted == [f'r{i}' for i in range(10)]
+    assert client.batch_calls == 1
+
+
+def test_failed_messages_are_not_deleted(env):
+    client = FakeSqsClient([{'N': 0}, {'Fail': True}, {'N': 2}])
+    worker = DummyWorker(client)
+
+    worker._task()
+
+    assert worker.handled == [0, 2]
+    assert client.deleted == ['r0', 'r2']
+
+
+def test_partial_delete_failure_is_retried(env):
+    client = FakeSqsClient([{'N': 0}, {'N': 1}], failed_delete_ids=['r1'])
+    worker = DummyWorker(client)
+
+    worker._task()
+
+    assert sorted(client.deleted) == ['r0', 'r1']
+
+
+def test_batch_size_defaults_to_one(monkeypatch):
+    monkeypatch.setenv('TEST_WRK_QUEUE_URL', json.dumps('https://sqs.us-east-1.amazonaws.com/1/test'))
+    monkeypatch.delenv('TEST_WRK_BATCH_SIZE', raising=False)
+    client = FakeSqsClient([{'N': 0}, {'N': 1}])
+    worker = DummyWorker(client)
+
+    worker._task()
+
+    assert worker.handled == [0]
+
+
+def test_concurrent_handling(env, monkeypatch):
+    monkeypatch.setenv('TEST_WRK_CONCURRENCY', json.dumps(4))
+    client = FakeSqsClient([{'N': n} for n in range(25)])
+    worker = DummyWorker(client)
+
+    while len(worker.handled) < 25:
+        worker._task()
+    worker._shutdown()
+
+    assert sorted(worker.handled) == list(range(25))
+    assert sorted(client.deleted) == sorted(f'r{i}' for i in range(25))
+    # every message is logged under its own transaction
+    assert len(set(worker.transaction_ids)) == 25
+    assert len(worker._in_flight) == 0
+
+
+def test_stop_releases_unprocessed_batch(env):
+    client = FakeSqsClient([{'N': 0}, {'N': 1, 'Stop': True}, {'N': 2}, {'N': 3}])
+    worker = DummyWorker(client)
+
+    worker._task()
+
+    assert worker.handled == [0, 1]
+    assert client.deleted == ['r0', 'r1']
+    assert client.released == ['r2', 'r3']
+
+
+def test_concurrent_drain_releases_pending_messages(env, monkeypatch):
+    monkeypatch.setenv('TEST_WRK_CONCURRENCY', json.dumps(2))
+    monkeypatch.setenv('TEST_WRK_DRAIN_TIMEOUT', json.dumps(5))
+    client = FakeSqsClient([{'N': n, 'Block': True} for n in range(6)])
+    worker = DummyWorker(client)
+
+    worker._task()
+    # both threads are blocked on a message
+    while len(worker._in_flight._started) < 2:
+        pass
+
+    threading.Timer(0.1, worker.unblock.set).start()
+    worker._shutdown()
+
+    assert len(worker.handled) == 2
+    assert sorted(client.deleted + client.released) == sorted(f'r{i}' for i in range(6))
+    assert len(client.released) == 4
+
+
+def test_concurrent_drain_releases_messages_at_deadline(env, monkeypatch):
+    monkeypatch.setenv('TEST_WRK_CONCURRENCY', json.dumps(2))
+    monkeypatch.setenv('TEST_WRK_DRAIN_TIMEOUT', json.dumps(0.1))
+    client = FakeSqsClient([{'N': n, 'Block': True} for n in range(6)])
+    worker = DummyWorker(client)
+
+    worker._task()
+    while len(worker._in_flight._started) < 2:
+        pass
+
+    worker._shutdown()
+    assert sorted(client.released) == sorted(f'r{i}' for i in range(6))
+
+    # handlers that finish after the deadline do not delete their released messages
+    worker.unblock.set()
+    worker._executor.shutdown(wait=True)
+    worker._delete_messages(worker._in_flight.pop_completed())
+    assert len(worker.handled) == 2
+    assert client.deleted == []
+
+
+def test_concurrent_stop_at_capacity_does_not_receive(env, monkeypatch):
+    monkeypatch.setenv('TEST_WRK_CONCURRENCY', json.dumps(2))
+    monkeypatch.setenv('TEST_WRK_MAX_IN_FLIGHT', json.dumps(2))
+    monkeypatch.setenv('TEST_WRK_DRAIN_TIMEOUT', json.dumps(5))
+    client = FakeSqsClient([{'N': n, 'Block': True} for n in range(4)])
+    worker = DummyWorker(client)
+
+    worker._task()
+    while len(worker._in_flight._started) < 2:
+        pass
+
+    # the next task waits for capacity until the signal arrives
+    task = threading.Thread(target=worker._task)
+    task.start()
+    worker._signal_received.value = True
+    task.join(timeout=5)
+
+    worker.unblock.set()
+    worker._shutdown()
+
+    assert not task.is_alive()
+    assert len(client.messages) == 2
+    assert sorted(client.deleted) == ['r0', 'r1']
+    assert client.released == []
+
+
+def test_serial_handling_releases_messages_at_deadline(env, monkeypatch):
+    monkeypatch.setenv('TEST_WRK_DRAIN_TIMEOUT', json.dumps(0))
+    client = FakeSqsClient([{'N': 0, 'Block': True}, {'N': 1}])
+    worker = DummyWorker(client)
+
+    task = threading.Thread(target=worker._task)
+    task.start()
+    worker.blocked.wait()
+    worker._signal_received.value = True
+
+    deadline = time.monotonic() + 10
+    while (client.released != ['r0', 'r1']) and (time.monotonic() < deadline):
+        time.sleep(0.01)
+
+    worker.unblock.set()
+    task.join()
+
+    assert worker.handled == [0]
+    assert client.deleted == []
+    assert client.released == ['r0', 'r1']
+
+
+def test_failed_message_backoff(env):
+    client = FakeSqsClient([{'Fail': True}], receive_count=2)
+    worker = DummyWorker(client)
+
+    worker._task()
+
+    assert client.deleted == []
+    # second attempt doubles the 5 second base
+    assert client.visibility == {'r0': 10}
+
+
+def test_exhausted_message_is_quarantined(env, monkeypatch):
+    monkeypatch.setenv('TEST_WRK_QUARANTINE_QUEUE_URL', json.dumps('quarantine'))
+    client = FakeSqsClient([{'Fail': True}], receive_count=3)
+    worker = DummyWorker(client)
+
+    worker._task()
+
+    assert client.sent == [('quarantine', {'Fail': True})]
+    assert client.deleted == ['r0']
+
+
+def test_message_is_quarantined_before_redrive(env, monkeypatch):
+    monkeypatch.setenv('TEST_WRK_QUARANTINE_QUEUE_URL', json.dumps('quarantine'))
+    # below the queues' redrive limit of 3 receives
+    client = FakeSqsClient([{'Fail': True}], receive_count=2)
+    worker = DummyWorker(client)
+
+    worker._task()
+
+    assert client.sent == [('quarantine', {'Fail': True})]
+
+
+def test_breaker_opens_after_repeated_failures(env, monkeypatch):
+    monkeypatch.setenv('TEST_WRK_BREAKER_THRESHOLD', json.dumps(3))
+    client = FakeSqsClient([{'Fail': True}] * 3)
+    worker = DummyWorker(client)
+
+    worker._task()
+
+    assert worker._breaker.open_for() > 0
+
+    worker._breaker.record_success()
+    assert worker._breaker.open_for() == 0
+
+
+class DummyBatchWorker(DummyWorker):
+
+    def __init__(self, client):
+        super().__init__(client)
+        self.batches = []
+
+    def _handle_batch(self, msgs):
+        if any(msg.get('Fail') for msg in msgs):
+            raise Exception('Batch failure')
+
+        self.batches.append([msg['N'] for msg in msgs])
+
+
+def test_batch_handling(env):
+    client = FakeSqsClient([{'N': n} for n in range(3)])
+    worker = DummyBatchWorker(client)
+
+    worker._task()
+
+    assert worker.batches == [[0, 1, 2]]
+    assert worker.handled == []
+    assert client.deleted == ['r0', 'r1', 'r2']
+
+
+def test_failed_batch_is_handled_individually(env):
+    client = FakeSqsClient([{'N': 0}, {'Fail': True}, {'N': 2}])
+    worker = DummyBatchWorker(client)
+
+    worker._task()
+
+    assert worker.batches == []
+    assert worker.handled == [0, 2]
+    assert client.deleted == ['r0', 'r2']
+
+
+def test_metrics(env):
+    client = FakeSqsClient([{'N': 0}, {'Fail': True}, {'N': 2}])
+    worker = DummyWorker(client)
+
+    worker._task()
+    worker._task()
+
+    metrics = worker.metrics
+    assert metrics.polls.value == 2
+    assert metrics.empty_polls.value == 1
+    assert metrics.empty_poll_ratio == 0.5
+    assert metrics.received.value == 3
+    assert metrics.handled.value == 2
+    assert metrics.failed.value == 1
+    assert metrics.deleted.value == 2
+    assert metrics.handle_seconds.count == 3
+
+    rendered = metrics.render()
+    assert 'worker_messages_handled_total 2' in rendered
+    assert 'worker_handle_seconds_bucket{le="+Inf"} 3' in rendered
+
+
+class DummyAsyncWorker(rv.worker.AsyncSqsWorker):
+
+    ENV_VAR_PREFIX = 'TEST_WRK'
+
+    def __init__(self, client, stop_after):
+        super().__init__('tests')
+        self.__dict__['_sqs_client'] = client
+        self.handled = []
+        self.transaction_ids = []
+        self._stop_after = stop_after
+
+    async def _handle_message(self, msg):
+        transaction_id = self.transaction_id
+        # yield so handlers interleave
+        await asyncio.sleep(0)
+
+        self.handled.append(msg['N'])
+        self.transaction_ids.append(transaction_id)
+        assert self.transaction_id == transaction_id
+
+        if len(self.handled) == self._stop_after:
+            os.kill(os.getpid(), signal.SIGTERM)
+
+
+def test_async_worker(env, monkeypatch):
+    monkeypatch.setenv('TEST_WRK_CONCURRENCY', json.dumps(4))
+    client = FakeSqsClient([{'N': n} for n in range(25)])
+    worker = DummyAsyncWorker(client, stop_after=25)
+
+    worker.run()
+
+    assert sorted(worker.handled) == list(range(25))
+    assert sorted(client.deleted) == sorted(f'r{i}' for i in range(25))
+    assert len(set(worker.transaction_ids)) == 25
+
+
+class SlowAsyncWorker(DummyAsyncWorker):
+    """Sleeps in each handler and signals itself once every handler has started."""
+
+    def __init__(self, client, *, signals=1):
+        super().__init__(client, stop_after=None)
+        self.cancelled = []
+        self._started = 0
+        self._signals = signals
+
+    async def _handle_message(self, msg):
+        self._started += 1
+        if self._started == self._concurrency:
+            os.kill(os.getpid(), signal.SIGTERM)
+            if self._signals > 1:
+                asyncio.get_event_loop().call_later(0.1, os.kill, os.getpid(), signal.SIGTERM)
+
+        try:
+            await asyncio.sleep(msg['Sleep'])
+        except asyncio.CancelledError:
+            self.cancelled.append(msg['N'])
+            raise
+
+        self.handled.append(msg['N'])
+
+
+def _run_slow_async_worker(monkeypatch, sleep, drain_timeout, *, signals=1):
+    monkeypatch.setenv('TEST_WRK_CONCURRENCY', json.dumps(2))
+    monkeypatch.setenv('TEST_WRK_DRAIN_TIMEOUT', json.dumps(drain_timeout))
+    client = FakeSqsClient([{'N': n, 'Sleep': sleep} for n in range(4)])
+    worker = SlowAsyncWorker(client, signals=signals)
+
+    start = time.monotonic()
+    worker.run()
+    assert time.monotonic() - start < 10
+
+    return worker, client
+
+
+def test_async_worker_drains_in_flight_messages(env, monkeypatch):
+    worker, client = _run_slow_async_worker(monkeypatch, sleep=0.2, drain_timeout=5)
+
+    # started handlers finish, and messages waiting for a handler are released
+    assert sorted(worker.handled) == [0, 1]
+    assert worker.cancelled == []
+    assert sorted(client.deleted) == ['r0', 'r1']
+    assert sorted(client.released) == ['r2', 'r3']
+
+
+def test_async_worker_cancels_handlers_at_drain_deadline(env, monkeypatch):
+    worker, client = _run_slow_async_worker(monkeypatch, sleep=3600, drain_timeout=0.1)
+
+    assert worker.handled == []
+    assert sorted(worker.cancelled) == [0, 1]
+    assert client.deleted == []
+    assert sorted(client.released) == ['r0', 'r1', 'r2', 'r3']
+
+
+def test_async_worker_cancels_handlers_on_second_signal(env, monkeypatch):
+    worker, client = _run_slow_async_worker(monkeypatch, sleep=3600, drain_timeout=3600, signals=2)
+
+    assert worker.handled == []
+    assert sorted(worker.cancelled) == [0, 1]
+    assert client.deleted == []
+    assert sorted(client.released) == ['r0', 'r1', 'r2', 'r3']
+
+
+class FailingWorker:
+    """Records each run in a file and exits unexpectedly."""
+
+    def __init__(self, path):
+        self._path = path
+
+    def run(self):
+        with open(self._path, 'a') as f:
+            f.write(f'{os.getpid()}\n')
+
+        raise Exception('Worker failure')
+
+
+def _start_supervisor(path, restart_delay):
+    pid = os.fork()
+    if pid != 0:
+        return pid
+
+    code = 1
+    try:
+        rv.worker.Supervisor(FailingWorker(path), processes=1, restart_delay=restart_delay).run()
+        code = 0
+    finally:
+        os._exit(code)
+
+
+def _runs(path):
+    return len(path.read_text().splitlines()) if path.exists() else 0
+
+
+def _wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'Timed out'
+        time.sleep(0.01)
+
+
+def _stop_supervisor(pid):
+    os.kill(pid, signal.SIGTERM)
+
+    status = []
+    _wait_for(lambda: status.append(os.waitpid(pid, os.WNOHANG)) or status[-1][0] == pid)
+    return status[-1][1]
+
+
+def test_supervisor_restarts_exited_workers(tmp_path):
+    path = tmp_path / 'runs'
+    pid = _start_supervisor(path, restart_delay=0.01)
+
+    _wait_for(lambda: _runs(path) >= 3)
+
+    assert _stop_supervisor(pid) == 0
+
+
+def test_supervisor_does_not_restart_after_signal_while_waiting(tmp_path):
+    path = tmp_path / 'runs'
+    pid = _start_supervisor(path, restart_delay=1)
+
+    _wait_for(lambda: _runs(path) == 1)
+    # the worker has exited and the supervisor is waiting to restart it
+    time.sleep(0.2)
+
+    assert _stop_supervisor(pid) == 0
+    assert _runs(path) == 1